@@ -0,0 +1,72 @@
+# AI（Gemini）呼び出しの記録
+# 1回の呼び出しごとに、トークン数・かかった時間・キャッシュを使ったか・JSONとして読めたか などを残す。
+# 記録はセッション（ブラウザのタブ）ごと。サイドバーの診断パネルで見たり、JSON Lines で保存したりする。
+import json
+import threading
+import time
+
+
+def usage_counts(usage):
+    # usage_metadata から (プロンプトのトークン数, 応答のトークン数) を取り出す（無いときは 0）
+    if usage is None:
+        return 0, 0
+    return (getattr(usage, "prompt_token_count", 0) or 0,
+            getattr(usage, "candidates_token_count", 0) or 0)
+
+
+class CallLog:
+    """
+    1セッション分のAI呼び出しの記録。別スレッド（領域別の同時作成）からも書き込めるようにロックを使う。
+    max_records を超えたら古い順に捨てる。
+    """
+    def __init__(self, max_records=500):
+        self.max_records = max_records
+        self.records = []
+        self._lock = threading.Lock()
+
+    def record(self, **fields):
+        fields.setdefault("time", time.strftime("%Y-%m-%d %H:%M:%S"))
+        with self._lock:
+            self.records.append(fields)
+            del self.records[:-self.max_records]
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.records)
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
+
+    def summary(self):
+        recs = self.snapshot()
+        api = [r for r in recs if not r.get("cached")]
+        return {
+            "calls": len(recs),
+            "api_calls": len(api),
+            "cache_hits": len(recs) - len(api),
+            "prompt_tokens": sum(r.get("prompt_tokens", 0) for r in recs),
+            "response_tokens": sum(r.get("response_tokens", 0) for r in recs),
+            "avg_latency": sum(r["latency"] for r in api) / len(api) if api else 0.0,
+            "avg_queue_wait": sum(r.get("queue_wait", 0.0) for r in api) / len(api) if api else 0.0,
+            "parse_failures": sum(1 for r in recs if r.get("parse_ok") is False),
+            "retries": sum(1 for r in recs if r.get("attempt", 0) > 0),
+            "api_retries": sum(r.get("api_retries", 0) for r in recs),
+            "errors": sum(1 for r in recs if r.get("error")),
+        }
+
+    def by_tag(self, key="doc_type"):
+        # 書類の種類などごとに集計した行のリスト（表示用）
+        groups = {}
+        for r in self.snapshot():
+            g = groups.setdefault(r.get(key) or "-", {key: r.get(key) or "-", "calls": 0, "cache_hits": 0,
+                                                       "prompt_tokens": 0, "response_tokens": 0, "max_latency": 0.0})
+            g["calls"] += 1
+            g["cache_hits"] += 1 if r.get("cached") else 0
+            g["prompt_tokens"] += r.get("prompt_tokens", 0)
+            g["response_tokens"] += r.get("response_tokens", 0)
+            g["max_latency"] = max(g["max_latency"], r["latency"])
+        return list(groups.values())
+
+    def to_jsonl(self):
+        return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in self.snapshot())
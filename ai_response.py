@@ -0,0 +1,314 @@
+# Gemini の応答（JSON）を読み取るための処理
+import json
+import re
+
+
+class JsonFieldStream:
+    """
+    ストリーミングで少しずつ届く JSON テキストを読み、文字列の値が1つ完成するたびに
+    (キーのパス, 値) を返す。例: (("edu", "health", "aim"), "…")
+    最初の { より前（```json や前置きの文章）と、一番外側の } より後ろは読み飛ばす。
+    前置きの文章の中の {…}（文字列の値が1つもないもの）は JSON の始まりとみなさず、次の { を待つ。
+    “ ” で囲んだキーや値も読み、値と値の間のカンマが抜けていても次のキーとして読む。
+    """
+    def __init__(self):
+        self._stack = []        # [種類("obj"/"arr"), 今のキー or 番号]
+        self._started = False
+        self.done = False
+        self._in_str = False
+        self._close = '"'           # 今の文字列を閉じる引用符（“ で始まったら ”）
+        self._esc = False
+        self._buf = []
+        self._expect_key = False
+        self._after_value = False   # 直前に値（文字列・{…}・[…]）が終わったところ
+        self._found_any = False
+
+    def _path(self):
+        return tuple(frame[1] for frame in self._stack)
+
+    def feed(self, text):
+        found = []
+        for ch in text:
+            if self.done:
+                break
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._stack.append(["obj", None])
+                    self._expect_key = True
+                continue
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                    self._buf.append(ch)
+                elif ch == "\\":
+                    self._esc = True
+                    self._buf.append(ch)
+                elif ch == self._close:
+                    self._in_str = False
+                    value = _decode_string("".join(self._buf))
+                    self._buf = []
+                    top = self._stack[-1]
+                    if top[0] == "obj" and self._expect_key:
+                        top[1] = value
+                        self._after_value = False
+                    else:
+                        found.append((self._path(), value))
+                        self._found_any = True
+                        self._after_value = True
+                else:
+                    self._buf.append(ch)
+                continue
+            if ch in '"“{[' and self._after_value:
+                # カンマが抜けている: 次のキー（配列なら次の要素）として読む
+                self._next_item()
+            if ch in '"“':
+                self._in_str = True
+                self._close = '"' if ch == '"' else "”"
+            elif ch == "{":
+                self._stack.append(["obj", None])
+                self._expect_key = True
+            elif ch == "[":
+                self._stack.append(["arr", 0])
+                self._expect_key = False
+            elif ch in "}]":
+                self._stack.pop()
+                self._expect_key = False
+                self._after_value = True
+                if not self._stack:
+                    if self._found_any:
+                        self.done = True
+                    else:
+                        # 前置きの文章の {…} だった。次の { から読み直す
+                        self._started = False
+                        self._after_value = False
+            elif ch == ":":
+                self._expect_key = False
+            elif ch == ",":
+                self._next_item()
+        return found
+
+    def _next_item(self):
+        self._after_value = False
+        top = self._stack[-1]
+        if top[0] == "obj":
+            self._expect_key = True
+        else:
+            top[1] += 1
+
+
+def _decode_string(raw):
+    # 文字列の中に改行がそのまま入っていても読めるよう strict=False。壊れたエスケープはそのまま返す
+    try:
+        return json.loads(f'"{raw}"', strict=False)
+    except ValueError:
+        return raw
+
+
+# --- 応答テキストから JSON を取り出す ---
+class PlanParseError(ValueError):
+    pass
+
+
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*\n(.*?)```", re.DOTALL)
+# 文字列リテラル（中身は正規表現でまとめて読み飛ばす）か括弧1文字
+_TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"?|[{}\[\]]', re.DOTALL)
+_DECODER = json.JSONDecoder(strict=False)
+_STRING_RE = re.compile(r'"(?:[^"\\]|\\.)*"', re.DOTALL)
+
+
+def extract_json(text, start=0):
+    """
+    text の start 以降で最初の { から、対応する } までを取り出す（文字列の中の括弧は数えない）。
+    1回なめるだけなので長い応答でも速い。最後まで閉じていなければ（途中で切れた応答）残り全部を返す。
+    { がなければ None。
+    """
+    begin = text.find("{", start)
+    if begin < 0:
+        return None
+    depth = 0
+    for m in _TOKEN_RE.finditer(text, begin):
+        tok = m.group(0)
+        if tok in "{[":
+            depth += 1
+        elif tok in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[begin:m.end()]
+    return text[begin:]
+
+
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+def repair_json(s):
+    """
+    LLM がよく出す壊れた JSON を直す。
+    ・“ ” のカギ括弧っぽい引用符 ・末尾の余計なカンマ ・抜けたカンマ ・// コメント
+    ・True/False/None ・途中で切れて閉じていない文字列や括弧
+    """
+    s = s.replace("“", '"').replace("”", '"')
+    out = []
+    stack = []
+    last = ""  # 文字列の外で最後に出力した記号（カンマの要・不要の判断に使う）
+    i = 0
+    n = len(s)
+    while i < n:
+        ch = s[i]
+        if ch == "/" and s.startswith("//", i):
+            end = s.find("\n", i)
+            i = n if end < 0 else end
+            continue
+        if ch in '"{[' or ch.isdigit() or ch == "-" or ch.isalpha():
+            # 値の直後に次の値が始まっていたらカンマが抜けている
+            if last in ('"', "}", "]", "v"):
+                out.append(",")
+            if ch == '"':
+                m = _STRING_RE.match(s, i)
+                if m is None:
+                    # 途中で切れた文字列は閉じておく（最後の \ は消す）
+                    tail = s[i:]
+                    if (len(tail) - len(tail.rstrip("\\"))) % 2:
+                        tail = tail[:-1]
+                    out.append(tail + '"')
+                    i = n
+                else:
+                    out.append(m.group(0))
+                    i = m.end()
+                last = '"'
+                continue
+            if ch in "{[":
+                stack.append("}" if ch == "{" else "]")
+                out.append(ch)
+                last = ch
+                i += 1
+                continue
+            j = i + 1
+            while j < n and (s[j].isalnum() or s[j] in ".+-_"):
+                j += 1
+            word = s[i:j]
+            out.append(_LITERALS.get(word, word))
+            last = "v"
+            i = j
+            continue
+        if ch in "}]":
+            _drop_trailing_comma(out)
+            if stack:
+                out.append(stack.pop())
+            last = ch
+        elif ch in ",:":
+            out.append(ch)
+            last = ch
+        else:
+            out.append(ch)
+        i += 1
+    _drop_trailing_comma(out)
+    while stack:
+        out.append(stack.pop())
+    return "".join(out)
+
+
+def _drop_trailing_comma(out):
+    k = len(out) - 1
+    while k >= 0 and out[k].isspace():
+        k -= 1
+    if k >= 0 and out[k] == ",":
+        del out[k]
+
+
+def parse_plan(text, max_candidates=3):
+    """
+    AI の応答テキストから計画の JSON を dict で取り出す。
+    ```json のコードブロックがあればその中を優先する。まず { の位置から json の標準デコーダで
+    読み（後ろに文章が続いていてもよい）、だめなら対応する } までを切り出して repair_json で直して読み直す。
+    前置きの文章に { が混じっていても、次の { から max_candidates 個まで試す。
+    どうしても読めないときは PlanParseError。
+    """
+    fence = _FENCE_RE.search(text)
+    sources = [fence.group(1), text] if fence else [text]
+    for src in sources:
+        pos = src.find("{")
+        for _ in range(max_candidates):
+            if pos < 0:
+                break
+            try:
+                data = _DECODER.raw_decode(src, pos)[0]
+                if isinstance(data, dict):
+                    return data
+            except ValueError:
+                pass
+            try:
+                data = json.loads(repair_json(extract_json(src, pos)), strict=False)
+                if isinstance(data, dict):
+                    return data
+            except ValueError:
+                pass
+            pos = src.find("{", pos + 1)
+    raise PlanParseError("AIの応答からJSONを読み取れませんでした")
+
+
+# --- 書類ごとの JSON の形（足りないキーのチェック用） ---
+_FOUR = {"aim": str, "env": str, "act": str, "care": str}
+DOMAIN_SECTION_KEYS = {
+    "yogo": ["life", "emo"],
+    "edu": ["health", "rel", "env", "lang", "exp"],
+    "others": ["food", "safety", "parent"],
+}
+
+
+def plan_schema(doc_type, num_weeks=5):
+    """
+    doc_type: "週案" / "月案_週構成" / "月案_領域別" / 領域別の分割セクション名（"yogo" など）
+    戻り値はキー → str（文字列の欄） or 入れ子の dict。
+    """
+    if doc_type == "週案":
+        schema = {"weekly_aim_sentence": str}
+        for day in ["月", "火", "水", "木", "金", "土"]:
+            schema[day] = {"activity": str, "care": str, "tool": str}
+        return schema
+    if doc_type == "月案_週構成":
+        schema = {"monthly_aim_sentence": str}
+        for w in range(1, num_weeks + 1):
+            schema[str(w)] = {"aim": str, "activity": str, "care": str}
+        return schema
+    if doc_type == "月案_領域別":
+        schema = {"target_goal": str, "child_status": str}
+        for sec, subs in DOMAIN_SECTION_KEYS.items():
+            schema[sec] = {k: _FOUR for k in subs}
+        return schema
+    schema = {doc_type: {k: _FOUR for k in DOMAIN_SECTION_KEYS[doc_type]}}
+    if doc_type == "yogo":
+        schema.update(target_goal=str, child_status=str)
+    return schema
+
+
+def missing_keys(data, schema, prefix=""):
+    # schema にあって data にないキーを "edu.health.act" の形で返す
+    missing = []
+    for key, sub in schema.items():
+        path = f"{prefix}{key}"
+        value = data.get(key) if isinstance(data, dict) else None
+        if isinstance(sub, dict):
+            if isinstance(value, dict):
+                missing += missing_keys(value, sub, path + ".")
+            else:
+                missing.append(path)
+        elif value is None:
+            missing.append(path)
+    return missing
+
+
+def to_response_schema(schema, labels=None):
+    """
+    plan_schema の形を Gemini の response_schema（OpenAPI 形式の dict）に変換する。
+    labels: {キー: 日本語の見出し} を渡すと各項目の description に入れる（AIへの説明になる）
+    """
+    labels = labels or {}
+    if not isinstance(schema, dict):
+        return {"type": "string"}
+    props = {}
+    for key, sub in schema.items():
+        props[key] = to_response_schema(sub, labels)
+        if key in labels:
+            props[key]["description"] = labels[key]
+    return {"type": "object", "properties": props, "required": list(schema)}
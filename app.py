@@ -1,693 +1,728 @@
 import streamlit as st
-import streamlit.components.v1 as components
-import openpyxl
-from openpyxl.styles import Alignment, Border, Side, Font, PatternFill
-from io import BytesIO
-import pandas as pd
-import datetime
-import json
-import re
-import google.generativeai as genai
-
-# --- 1. 広告データの準備エリア ---
-
-# 【サイドバー用】はらぺこあおむし
-ad_sidebar = """<table border="0" cellpadding="0" cellspacing="0"><tr><td><div style="border:1px solid #95A5A6;border-radius:.75rem;background-color:#FFFFFF;width:280px;margin:0px;padding:5px;text-align:center;overflow:hidden;"><table><tr><td style="width:128px"><a href="https://hb.afl.rakuten.co.jp/ichiba/13f1038a.0b9b3333.13f1038b.1111a3c1/?pc=https%3A%2F%2Fitem.rakuten.co.jp%2Fbook%2F921996%2F&link_type=picttext&ut=eyJwYWdlIjoiaXRlbSIsInR5cGUiOiJwaWN0dGV4dCIsInNpemUiOiIxMjh4MTI4IiwibmFtIjoxLCJuYW1wIjoicmlnaHQiLCJjb20iOjEsImNvbXAiOiJkb3duIiwicHJpY2UiOjEsImJvciI6MSwiY29sIjoxLCJiYnRuIjoxLCJwcm9kIjowLCJhbXAiOmZhbHNlfQ%3D%3D" target="_blank" rel="nofollow sponsored noopener" style="word-wrap:break-word;"><img src="https://hbb.afl.rakuten.co.jp/hgb/13f1038a.0b9b3333.13f1038b.1111a3c1/?me_id=1213310&item_id=10661727&pc=https%3A%2F%2Fthumbnail.image.rakuten.co.jp%2F%400_mall%2Fbook%2Fcabinet%2F1109%2F9784032371109.jpg%3F_ex%3D128x128&s=128x128&t=picttext" border="0" style="margin:2px" alt="[商品価格に関しましては、リンクが作成された時点と現時点で情報が変更されている場合がございます。]" title="[商品価格に関しましては、リンクが作成された時点と現時点で情報が変更されている場合がございます。]"></a></td><td style="vertical-align:top;width:136px;display: block;"><p style="font-size:12px;line-height:1.4em;text-align:left;margin:0px;padding:2px 6px;word-wrap:break-word"><a href="https://hb.afl.rakuten.co.jp/ichiba/13f1038a.0b9b3333.13f1038b.1111a3c1/?pc=https%3A%2F%2Fitem.rakuten.co.jp%2Fbook%2F921996%2F&link_type=picttext&ut=eyJwYWdlIjoiaXRlbSIsInR5cGUiOiJwaWN0dGV4dCIsInNpemUiOiIxMjh4MTI4IiwibmFtIjoxLCJuYW1wIjoicmlnaHQiLCJjb20iOjEsImNvbXAiOiJkb3duIiwicHJpY2UiOjEsImJvciI6MSwiY29sIjoxLCJiYnRuIjoxLCJwcm9kIjowLCJhbXAiOmZhbHNlfQ%3D%3D" target="_blank" rel="nofollow sponsored noopener" style="word-wrap:break-word;">ボードブック はらぺこあおむし （偕成社・ボードブック） [ エリック・カール ]</a><br><span >価格：990円（税込、送料無料)</span> <span style="color:#BBB">(2026/4/5時点)</span></p></td></tr></table></div><br><p style="color:#000000;font-size:12px;line-height:1.4em;margin:5px;word-wrap:break-word"></p></td></tr></table>"""
-
-# 【メイン画面用】別の広告（例：ねないこだれだ、あるいは別の商品）
-ad_main = """<a href="https://hb.afl.rakuten.co.jp/ichiba/528b128b.af77c180.528b128c.41d15f48/?pc=https%3A%2F%2Fitem.rakuten.co.jp%2Fnishiki%2F52203058all%2F&link_type=pict&ut=eyJwYWdlIjoiaXRlbSIsInR5cGUiOiJwaWN0Iiwic2l6ZSI6IjEyOHgxMjgiLCJuYW0iOjEsIm5hbXAiOiJyaWdodCIsImNvbSI6MSwiY29tcCI6ImRvd24iLCJwcmljZSI6MSwiYm9yIjoxLCJjb2wiOjEsImJidG4iOjEsInByb2QiOjAsImFtcCI6ZmFsc2V9" target="_blank" rel="nofollow sponsored noopener" style="word-wrap:break-word;"><img src="https://hbb.afl.rakuten.co.jp/hgb/528b128b.af77c180.528b128c.41d15f48/?me_id=1214820&item_id=10033910&pc=https%3A%2F%2Fthumbnail.image.rakuten.co.jp%2F%400_mall%2Fnishiki%2Fcabinet%2Fapron2%2F26614167all_0.jpg%3F_ex%3D128x128&s=128x128&t=pict" border="0" style="margin:2px" alt="" title=""></a>"""
-
-# SecretsからAPIキーを読み込む（設定されていない場合のエラー回避付き）
-if "GEMINI_API_KEY" in st.secrets:
-    genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
-    has_api_key = True
-else:
-    has_api_key = False
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import tempfile
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from gemini_cache import ResponseCache
+from ai_response import JsonFieldStream, PlanParseError, parse_plan, plan_schema, missing_keys, to_response_schema
+from ai_metrics import CallLog, usage_counts
+from rate_limit import RateLimiter, call_with_retry
+from jobs import JobRunner
+from teikei_search import TemplateIndex
+from teikei import all_templates, get_templates, loaded_packs, templates_version
+from plan_store import PlanStore, Autosaver
+from plan_model import Plan, plan_defaults, TERMS
+# google.generativeai・openpyxl（excel_builder）・pandas は読み込みに時間がかかるので、ここでは import しない。
+# 最初にAIを呼ぶとき・Excel を作るとき・表を出すときに読み込む（起動が速くなる。benchmarks/import_time.py で確認）
+from gsheets_sync import SheetSync, open_plan_worksheet
+from plan_prompts import (
+    FIELD_LABELS, DOMAIN_SECTIONS, domain_values, monthly_weekly_prompt, domain_plan_prompt,
+    weekly_plan_prompt, domain_section_prompt, aim_prompt,
+)
+from ads import ad_sidebar, ad_main
+from rerun_probe import RerunTimer
+from plan_preview import grid_html, layout_html, print_page_html
+from plan_layouts import layout_annual, plan_layout
+
+# 今回の実行の開始時刻（最後にサイドバーへ処理時間を出す。import は2回目から一瞬なので、ここから測れば十分）
+RERUN_STARTED = time.perf_counter()
+
+# SecretsにAPIキーがあるか（genai の設定は get_gemini_model() でまとめて行う）
+has_api_key = "GEMINI_API_KEY" in st.secrets
+NO_API_KEY_MESSAGE = "AIを使うには、Secrets に GEMINI_API_KEY を設定してください。"
 # --- 0. ページ設定 ---
 st.set_page_config(page_title="保育指導計画システム", layout="wide", page_icon="📛")
 
 # --- 1. 定数・データ定義 ---
-TERMS = ["1期(4-5月)", "2期(6-8月)", "3期(9-12月)", "4期(1-3月)"]
-
-# 定型文データ
-TEIKEI_DATA = {
-    "0歳児": {
-        "健康": [
-            "一人ひとりの生活リズムに合わせて心地よく過ごし、生理的欲求を満たす。",
-            "離乳食を喜んで食べ、自分で手づかみ食べをしようとする。",
-            "腹ばいやハイハイ、つかまり立ちをして、十分に体を動かそうとする。",
-            "保育者にゆったりと抱かれ、安心して入眠する。",
-            "沐浴や清拭を通して、体の清潔に保たれる心地よさを感じる。",
-            "身の回りの物に興味を持ち、手を伸ばして掴もうとする。",
-            "保育者と触れ合い遊びを楽しみ、声を出して笑う。",
-            "戸外の空気に触れ、外の刺激を心地よく感じる。",
-            "睡眠や食事の時間を一定に保ち、健康的な生活習慣を身につける。",
-            "自分の手足を見つめたり動かしたりして、体の存在を認識する。"
-        ],
-        "人間関係": [
-            "特定の保育者との関わりの中で、安心感と信頼感を持つ。",
-            "あやされると笑ったり、声を出し返したりして応答を楽しむ。",
-            "保育者の顔をじっと見つめ、表情を模倣しようとする。",
-            "身近な大人に親しみを持ち、後追いや抱っこを求める。",
-            "友達の存在に気づき、じっと見つめたり触れようとしたりする。",
-            "自分の思いを泣き声やしぐさで保育者に伝えようとする。",
-            "他児の泣き声に反応し、顔を覗き込もうとする。",
-            "保育者の仲立ちによって、友達と同じ空間で過ごすことを楽しむ。",
-            "名前を呼ばれると、振り向いたり笑顔を見せたりして応える。",
-            "人見知りを経験しながら、特定の大人との絆を深めていく。"
-        ],
-        "環境": [
-            "身近にある玩具に興味を持ち、舐める、叩く、振るなどして確かめる。",
-            "音の鳴る玩具に反応し、自ら音を出して楽しもうとする。",
-            "散歩中に見える草木や空の色など、自然の変化をじっと見つめる。",
-            "動くものに興味を示し、目で追ったり手を伸ばしたりする。",
-            "水の感触や土の匂いなど、五感を通して周囲の環境を感じる。",
-            "身近な大人の持ち物に興味を持ち、触れようとする。",
-            "鏡に映る自分の姿を見つめ、不思議そうに触れようとする。",
-            "いないいないばあ等の遊びを通して、物の永続性に気づき始める。",
-            "室内にある仕掛け玩具に触れ、繰り返し遊ぼうとする。",
-            "戸外で鳥の声や風の音など、周囲の音に耳を傾ける。"
-        ],
-        "言葉": [
-            "「アー」「ウー」などの喃語を発し、保育者とのやり取りを楽しむ。",
-            "保育者の優しい語り掛けに耳を傾け、心地よさを感じる。",
-            "絵本の絵を指差したり、保育者の読む声に反応したりする。",
-            "自分の要求を声のトーンや強弱で使い分け、伝えようとする。",
-            "音楽のリズムに合わせて、体を揺らしたり声を出したりする。",
-            "「バイバイ」などの簡単な言葉と動作を、真似しようとする。",
-            "身近な物の名前を聞いて、そちらの方を見ようとする。",
-            "保育者の表情や声の調子から、相手の気持ちを感じ取ろうとする。",
-            "一語文（「マンマ」「ブーブー」等）を話し、思いを伝えようとする。",
-            "手遊び歌に合わせて、自分なりに手を動かそうとする。"
-        ],
-        "表現": [
-            "保育者の歌声に合わせて、手足をバタバタさせて喜ぶ。",
-            "シーツブランコや抱っこでの揺れを、全身で味わい表現する。",
-            "いろいろな感触の布や紙に触れ、握ったり破いたりして遊ぶ。",
-            "色のついた物や光るものに興味を持ち、じっと見つめる。",
-            "砂を握ったり放したりして、その感触を自分なりに楽しむ。",
-            "クレヨンなどを握り、紙に偶然色がつくことを喜ぶ。",
-            "玩具を打ち鳴らし、リズムの面白さを感じようとする。",
-            "食事中に食べ物を手で捏ねたり広げたりして、感触を確かめる。",
-            "保育者のしぐさを真似て、パチパチやバイバイをする。",
-            "周囲のいろいろな音に対し、自分なりの反応を見せる。"
-        ]
-    },
-    "1歳児": {
-        # 前回の回答の1歳児分を入れてください
-    },
-    "2歳児": {
-        "健康": [
-            "走る、跳ぶ、登るなどの運動を楽しみ、活発に体を動かす。",
-            "保育者に見守られながら、自分で衣服を脱ごうとする。",
-            "食事の前後には、保育者と一緒に手洗いをしようとする。",
-            "スプーンやフォークを使って、自分で食べようとする意欲を持つ。",
-            "尿意を意識し始め、保育者に伝えたりトイレに行こうとする。",
-            "簡単な衣服の着脱（ズボンを上げる等）を自分で行おうとする。",
-            "戸外で探索活動を楽しみ、体力を養う。",
-            "鼻水が出ると保育者に知らせたり、自分で拭こうとしたりする。",
-            "遊びと休息の切り替えをスムーズに行い、規則正しく過ごす。",
-            "身の回りの危険なものに気づき、保育者の言葉に従って避ける。"
-        ],
-        "人間関係": [
-            "保育者との安定した関係の中で、自分の思いを強く主張する。",
-            "友達の持っている玩具を欲しがり、関わりを持とうとする。",
-            "「貸して」「いいよ」などの言葉を使い、友達と遊ぼうとする。",
-            "簡単なルールのある遊びを通して、友達と同じ目的を楽しむ。",
-            "自分の好きな友達ができ、名前を呼んで一緒に遊ぼうとする。",
-            "大人の真似をして、友達とおままごとやごっこ遊びを楽しむ。",
-            "友達が困っている時に、心配そうに見つめたり近寄ったりする。",
-            "集団での活動（手遊びやダンス等）を、友達と一緒に楽しむ。",
-            "自分の持ち物を認識し、大切にしようとする気持ちが芽生える。",
-            "保育者の助けを借りながら、順番を待とうとする。"
-        ],
-        "環境": [
-            "動植物への興味が深まり、じっくり観察したり触れたりする。",
-            "身近な自然物（どんぐりや石）を集め、自分なりに並べて遊ぶ。",
-            "砂場や水遊びで、道具を使って形を作ったり運んだりする。",
-            "身の回りの物の色や形の違いに気づき、分類しようとする。",
-            "簡単な道具（糊やシール）を使い、自分なりに形にしようとする。",
-            "散歩で見かける信号機や標識に興味を持ち、意味を知ろうとする。",
-            "生活の中にある数（1、2、3等）に興味を持ち、数えようとする。",
-            "身近な自然現象（雨、風、雷）に気づき、驚きや発見を共有する。",
-            "自分のロッカーや靴箱の場所を覚え、進んで片付けようとする。",
-            "積み木を高く積み上げたり、横に並べたりして構成を楽しむ。"
-        ],
-        "言葉": [
-            "二語文や三語文を使い、自分の体験を保育者に話そうとする。",
-            "「これ何？」と名前を尋ね、言葉の語彙を増やそうとする。",
-            "簡単な絵本のストーリーを理解し、次の展開を期待して聞く。",
-            "保育者や友達の問いかけに、自分の言葉で応答しようとする。",
-            "自分の名前だけでなく、友達や保育者の名前も言おうとする。",
-            "劇遊びの真似をして、役になりきった言葉を発しようとする。",
-            "生活習慣に関する言葉（「いただきます」等）を自ら言う。",
-            "保育者の歌う歌に合わせて、歌詞を口ずさむことを楽しむ。",
-            "相手の言葉を聞き、自分の思いとの違いに気づき始める。",
-            "好きな絵本を繰り返し読み、言葉の響きやリズムを楽しむ。"
-        ],
-        "表現": [
-            "音楽に合わせて、動物の模倣をしたり自由な動きを楽しんだりする。",
-            "クレヨンで丸や線を描き、それを何かに見立てて話そうとする。",
-            "粘土を丸める、伸ばす、ちぎるなどの変化を楽しみ制作する。",
-            "自分の経験したことを、絵や造形で表現しようとする。",
-            "いろいろな色の絵の具を使い、色が混ざる面白さを味わう。",
-            "空き箱を繋げたり色を塗ったりして、好きなものを作ろうとする。",
-            "手遊びやダンスを覚え、友達と一緒に踊ることを喜ぶ。",
-            "身近な大人やキャラクターになりきり、ごっこ遊びを広げる。",
-            "スタンプ遊びを楽しみ、紙に模様ができる不思議さを感じる。",
-            "出来上がった作品を、保育者や友達に嬉しそうに見せようとする。"
-        ]
-    },
-    "3歳児": {
-        "健康": [
-            "運動遊びを通して、自分の体を思い切り動かすことを楽しむ。",
-            "排泄を自立させ、自分から進んでトイレに行こうとする。",
-            "衣服の着脱をほぼ一人で行い、脱いだものを畳もうとする。",
-            "箸の使い方に興味を持ち、正しく持とうと意識する。",
-            "食事の際、好き嫌いせずに何でも食べようとする意欲を持つ。",
-            "手洗いやうがいの大切さを理解し、習慣化しようとする。",
-            "健康への関心を持ち、自分の体の調子を保育者に伝える。",
-            "戸外で活発に遊び、体力や持久力がついてくる。",
-            "身の回りを清潔に保つ心地よさを感じ、進んで整理整頓する。",
-            "午睡などで体を休める大切さを知り、静かに休息しようとする。"
-        ],
-        "人間関係": [
-            "友達と共通の目的を持って、協力して遊ぼうとする。",
-            "自分の思いを言葉で伝え、友達と折り合いをつけようとする。",
-            "集団生活のルールを守り、順番や交代を意識して遊ぶ。",
-            "困っている友達を助けたり、励ましたりする優しさが芽生える。",
-            "保育者との関わりを楽しみつつ、友達同士の遊びを優先する。",
-            "自分の気持ちをコントロールし、我慢したり譲ったりしようとする。",
-            "友達と刺激し合いながら、新しい遊びに挑戦しようとする。",
-            "クラスの一員であることを意識し、当番活動を頑張ろうとする。",
-            "友達の良さに気づき、褒めたり認めたりしようとする。",
-            "異年齢児との関わりを楽しみ、優しく接しようとする。"
-        ],
-        "環境": [
-            "自然の不思議さに関心を持ち、図鑑などで調べようとする。",
-            "栽培活動を通して、植物の生長を期待し世話を楽しもうとする。",
-            "身の回りの物の性質（重い、軽い、浮く等）に興味を持つ。",
-            "数や図形、文字に関心を持ち、生活の中で探そうとする。",
-            "カレンダーや時計に興味を持ち、時間の流れを感じようとする。",
-            "地域の施設（公園、図書館等）に親しみを持って利用する。",
-            "廃材などを工夫して組み合わせ、自分のイメージを形にする。",
-            "季節の行事の意味を知り、伝統的な遊びを体験しようとする。",
-            "ゴミの分別に関心を持ち、身の回りを綺麗に保とうとする。",
-            "散歩先で見つけた生き物の飼育に興味を持ち、観察を楽しむ。"
-        ],
-        "言葉": [
-            "自分の経験したことや考えを、順序立てて話そうとする。",
-            "相手の話を最後まで聞き、理解しようとする態度を持つ。",
-            "新しい言葉や表現を使い、豊かな会話を楽しもうとする。",
-            "文字に興味を持ち、自分の名前を読んだり書こうとしたりする。",
-            "絵本のストーリーを記憶し、友達に読み聞かせようとする。",
-            "「なぜ？」「どうして？」と質問を繰り返し、知識を広げる。",
-            "友達とのトラブルを、言葉を使って解決しようと努める。",
-            "劇遊びなどで、役に応じた言葉遣いを工夫して話す。",
-            "しりとりや言葉遊びを楽しみ、言葉の響きに関心を深める。",
-            "保育者の読み聞かせを静かに聞き、イメージを膨らませる。"
-        ],
-        "表現": [
-            "音楽を聴いて、感じたことを体全体でダイナミックに表現する。",
-            "自分の描きたいものを決め、形や色を工夫して描こうとする。",
-            "ハサミや糊などの道具を正しく使い、複雑な制作に挑戦する。",
-            "友達とイメージを共有し、役割を決めてごっこ遊びを展開する。",
-            "いろいろな楽器に触れ、音色を楽しみながら合奏に親しむ。",
-            "身近な素材を工夫し、役に必要な小道具を自作しようとする。",
-            "発表会など、人前で表現することに自信と喜びを感じる。",
-            "粘土や木切れなどを使い、立体的な作品を作ろうとする。",
-            "色の濃淡や混色を楽しみ、自分の意図した色を作ろうとする。",
-            "友達の表現した作品の良さに気づき、認め合おうとする。"
-        ]
-    },
-    "4歳児": {
-        "健康": [
-            "ルールのある集団遊びを通して、力いっぱい体を動かす。",
-            "自分の体の健康に関心を持ち、健康的な生活習慣を意識する。",
-            "自分の体格に合った運動用具を使い、技術を身につけようとする。",
-            "食事の栄養バランスに関心を持ち、進んで何でも食べる。",
-            "身の回りの危険を予測し、安全な遊び方を自ら考える。",
-            "避難訓練の重要性を理解し、迅速かつ冷静に行動しようとする。",
-            "衣服の整理や始末を丁寧に行い、生活環境を整える。",
-            "手洗い、うがい、換気などの感染予防を自ら進んで行う。",
-            "休息と活動のバランスを自分で調整しようと意識する。",
-            "体の仕組み（骨、筋肉等）に興味を持ち、大切にしようとする。"
-        ],
-        "人間関係": [
-            "友達と意見を出し合い、共通の目標に向かって協力する。",
-            "集団の中での自分の役割を理解し、責任を持って当番活動を行う。",
-            "友達とのトラブルを、自分たちで話し合って解決しようとする。",
-            "公共の場でのルールやマナーを守り、規律ある行動をとる。",
-            "友達の失敗を許したり、励まし合ったりする仲間意識を持つ。",
-            "異年齢の子供に対して思いやりを持ち、お世話を楽しもうとする。",
-            "社会の仕組みや様々な職業の人に興味を持ち、敬意を払う。",
-            "自分と他者の考えの違いを認め、相手を尊重しようとする。",
-            "伝統的な行事に親しみ、地域社会との繋がりを感じる。",
-            "家族の温かさを感じ、感謝の気持ちを言葉で表そうとする。"
-        ],
-        "環境": [
-            "自然環境の保全に関心を持ち、自分にできることを考え行動する。",
-            "動植物の命の尊さに気づき、愛情を持って育てようとする。",
-            "数や量の概念を理解し、生活の中で測定や比較を楽しむ。",
-            "文字や標識の機能に興味を持ち、情報として活用しようとする。",
-            "科学的な事象（電気、磁石等）に触れ、その性質を探求する。",
-            "地図や地球儀に興味を持ち、広い世界に関心を広げる。",
-            "道具の安全な使い方を習得し、目的に合わせて正しく使う。",
-            "カレンダーや時計を読み、計画的に活動を進めようとする。",
-            "季節の変化を五感で捉え、美しさや不思議さを分かち合う。",
-            "リサイクル活動に興味を持ち、物を大切に使い切ろうとする。"
-        ],
-        "言葉": [
-            "相手の意図を汲み取り、状況に応じた言葉遣いを使い分ける。",
-            "自分の意見を論理的に説明し、説得力を持って伝えようとする。",
-            "読書を楽しみ、物語の世界に浸って多様な言葉を習得する。",
-            "文字を読み書きすることに喜びを感じ、手紙交換等を楽しむ。",
-            "言葉の響きや面白さを楽しみ、詩や物語を創作しようとする。",
-            "話し合いの場において、司会や記録などの役割を経験する。",
-            "分からない言葉を自分で調べたり、大人に聞いたりして解決する。",
-            "言葉による自己表現を深め、自分の気持ちを正確に伝える。",
-            "ユーモアのある表現を使い、会話を豊かに盛り上げる。",
-            "他言語への関心を持ち、異なる文化の言葉に触れようとする。"
-        ],
-        "表現": [
-            "多様な表現技法（スパッタリング、デカルコマニー等）を楽しむ。",
-            "音楽の強弱やリズムを捉え、意図を持って楽器を演奏する。",
-            "友達と協力して大型の制作物を作り、達成感を共有する。",
-            "劇遊びにおいて、登場人物の心情を考えながら演じようとする。",
-            "自分の経験や空想を、絵や文章を組み合わせて表現する。",
-            "廃材を工夫して使い、動きのある動く玩具を作ろうとする。",
-            "伝統的な芸術作品（絵画、陶芸等）に触れ、感性を磨く。",
-            "自分の表現した作品の意図を、言葉で発表しようとする。",
-            "友達の作品の良いところを具体的に指摘し、批評し合う。",
-            "表現することを通して、自分自身の個性を発揮しようとする。"
-        ]
-    },
-    "5歳児": {
-        "健康": [
-            "自分の健康を自分で守る意識を持ち、進んで健康管理を行う。",
-            "集団生活の中で規律を保ち、健康的な生活リズムを自ら作る。",
-            "難しい運動（縄跳び、跳び箱等）に粘り強く挑戦し、達成感を味わう。",
-            "食事の礼儀作法を身につけ、感謝して食事を楽しもうとする。",
-            "安全に対する判断力を養い、周囲の状況を見て適切に行動する。",
-            "病気や怪我の予防について学び、自分や友達を労る。",
-            "身の回りの整理整頓を徹底し、美しく整える習慣を身につける。",
-            "心身の成長を自覚し、小学生になることへの期待を持つ。",
-            "自分の体力を知り、活動の強度を調節しようとする。",
-            "環境の変化に適応し、心身の安定を保とうと努める。"
-        ],
-        "人間関係": [
-            "友達と力を合わせ、より大きな目的の達成を目指して行動する。",
-            "民主的な話し合いを通して、集団のルールを自分たちで決める。",
-            "互いの個性を認め合い、尊重し合う深い絆を築く。",
-            "最高学年としての自覚を持ち、園全体のために進んで活動する。",
-            "社会の決まりや公共心を理解し、責任ある行動を心がける。",
-            "友達を信頼し、自分の弱みや悩みも打ち明けることができる。",
-            "異なる意見を持つ相手とも対話し、合意形成を目指す。",
-            "地域の人々やボランティアの方々と積極的に関わりを深める。",
-            "命の尊厳や平和について考え、思いやりのある行動をとる。",
-            "卒園に向けて感謝の気持ちを持ち、仲間との思い出を大切にする。"
-        ],
-        "環境": [
-            "地球規模の環境問題に関心を持ち、環境保護意識を高める。",
-            "生物のライフサイクルを理解し、命のつながりを感じ取る。",
-            "論理的な思考を深め、予測を立てて実験や観察を楽しむ。",
-            "文字や数を生活の便利な道具として、自在に使いこなす。",
-            "世界の文化や歴史に興味を持ち、多様な価値観を学ぶ。",
-            "IT機器やメディアの適切な活用法に触れ、情報を得る。",
-            "時計を見て計画的に行動し、時間の管理を自分で行う。",
-            "日本の伝統文化（茶道、書道等）に親しみ、その精神に触れる。",
-            "数的な推論を楽しみ、図形の構成や分割を工夫する。",
-            "身近な自然を科学的な視点で見つめ、発見を深める。"
-        ],
-        "言葉": [
-            "豊かな語彙を使いこなし、ニュアンスの違う表現を楽しむ。",
-            "長編の物語を読み、登場人物の心情や背景を深く理解する。",
-            "話し合いにおいて、論点を整理し建設的な意見を述べる。",
-            "自分の思いや考えを文章で綴り、自己表現を楽しむ。",
-            "他者の話を共感を持って聞き、適切なアドバイスや助言をする。",
-            "敬語などの丁寧な言葉遣いを、時と場合に応じて使い分ける。",
-            "ニュースや時事問題に関心を持ち、言葉を通して世界を広げる。",
-            "発表やスピーチを通して、自分の考えを堂々と人前で伝える。",
-            "ユーモアや比喩を使いこなし、会話の質を高める。",
-            "文字の読み書きをほぼ完成させ、就学に向けた準備を整える。"
-        ],
-        "表現": [
-            "自分の内面や感情を、芸術的な活動を通して深く表現する。",
-            "友達と合奏や合唱を創り上げ、調和する喜びを分かち合う。",
-            "空間を意識した立体的な制作や、複雑な造形表現に挑む。",
-            "劇や音楽発表において、演出や小道具を自分たちで工夫する。",
-            "様々な芸術作品（名画、音楽、舞台）を鑑賞し、感性を養う。",
-            "自分の作品をポートフォリオにまとめ、成長を振り返る。",
-            "素材の特性を活かしきり、実用的な作品を完成させる。",
-            "即興で踊ったり歌ったりして、自己を解放し表現を楽しむ。",
-            "伝統工芸や郷土玩具の制作に触れ、手仕事の美しさを知る。",
-            "自分自身の個性を確立し、オリジナリティ溢れる表現を追求する。"
-        ]
-    }
-}
+AGES = ["0歳児", "1歳児", "2歳児", "3歳児", "4歳児", "5歳児"]
+# サイドバーの「作成する書類」。画面の切り替えもこの定数と比べる（表示名を変えても分岐がずれないように）
+MODE_MONTHLY = "月案（月間指導計画）"
+MODE_WEEKLY = "週案"
+MODE_ANNUAL = "年間指導計画（整備中）"
+
+# 定型文データは data/teikei.json（園ごとの追加は data/teikei_packs/）。teikei.get_templates() で読む
 DEFAULT_TEXTS = ["（定型文を選択、または直接入力）", "自分で入力する"]
 
 
+@st.cache_resource(max_entries=1)
+def get_template_index(version):
+    # 定型文の検索インデックスはサーバープロセスで1回だけ作る（パックが変わったら version が変わって作り直す）
+    return TemplateIndex(all_templates())
 
 
+@st.cache_data(max_entries=100, show_spinner=False)
+def annual_preview_html(rows):
+    # 年間計画のプレビューの表。rows: ((項目, (1期の文, 2期の文, ...)), ...)。同じ入力内容ならキャッシュから返す
+    return grid_html("項目 / 期", TERMS, rows)
 
-# --- 3. Excel作成関数群 (前と同じなので省略せず記述) ---
 
-def create_annual_excel(age, config, orientation):
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = f"年間指導計画({age})"
-    thin = Side(style='thin')
-    border = Border(top=thin, bottom=thin, left=thin, right=thin)
-    header_fill = PatternFill(start_color="F2F2F2", fill_type="solid")
-    center_align = Alignment(horizontal='center', vertical='center', wrap_text=True)
-    top_left_align = Alignment(horizontal='left', vertical='top', wrap_text=True)
-    ws.page_setup.paperSize = ws.PAPERSIZE_A4
-    ws.page_setup.orientation = ws.ORIENTATION_LANDSCAPE if orientation == "横" else ws.ORIENTATION_PORTRAIT
-    ws.page_setup.fitToPage = True
-    ws.page_setup.fitToWidth = 1
-    
-    # (レイアウト詳細は省略せず実装)
-    ws.merge_cells("A1:C1")
-    ws['A1'] = f"年間指導計画 ({age})"
-    ws['A1'].font = Font(bold=True, size=16)
-    
-    row = 3
-    fixed_items = [("年間目標", "年間目標"), ("健康・安全", "健康・安全")]
-    for label, key in fixed_items:
-        ws.merge_cells(f"A{row}:A{row+1}")
-        ws.cell(row=row, column=1, value=label).fill = header_fill
-        ws.cell(row=row, column=1).border = border
-        ws.cell(row=row+1, column=1).border = border
-        ws.merge_cells(f"B{row}:E{row+1}")
-        c = ws.cell(row=row, column=2, value=config['values'].get(key, ""))
-        c.alignment = top_left_align
-        c.border = border
-        row += 2
-
-    # 4期メイン
-    ws.cell(row=row, column=1, value="項目 / 期").fill = header_fill
-    ws.cell(row=row, column=1).border = border
-    for i, t_name in enumerate(TERMS):
-        c = ws.cell(row=row, column=i+2, value=t_name)
-        c.fill = header_fill
-        c.border = border
-    row += 1
-
-    for item in config['mid_items']:
-        ws.cell(row=row, column=1, value=item).fill = header_fill
-        ws.cell(row=row, column=1).border = border
-        for i, t_name in enumerate(TERMS):
-            c = ws.cell(row=row, column=i+2, value=config['values'].get(f"{item}_{t_name}", ""))
-            c.alignment = top_left_align
-            c.border = border
-        row += 1
-
-    output = BytesIO()
-    wb.save(output)
-    return output.getvalue()
-
-
-
-from openpyxl import Workbook
-from openpyxl.styles import Alignment, Border, Side, Font, PatternFill
-from openpyxl.utils import get_column_letter
-
-def create_weekly_excel(age, config, orient="P"):
+@st.cache_data(max_entries=200, show_spinner=False)
+def layout_preview_html(layout, page=False):
+    # 印刷イメージ（Excel と同じレイアウト記述から作る HTML）。レイアウトの中身が同じならキャッシュから返す
+    # page=True ならブラウザで開いて印刷できる1枚の HTML
+    return print_page_html(layout) if page else layout_html(layout)
+
+
+def excel():
+    # Excel 作成（excel_builder / openpyxl）は最初に Excel を作るときに読み込む。2回目からは import 済みのものが返る
+    import excel_builder
+    return excel_builder
+
+
+# --- 計画の保存（SQLite） ---
+@st.cache_resource
+def get_plan_saver():
+    # 保存先はサーバープロセスで1つ。書き込みは Autosaver がまとめて行う
+    store = PlanStore(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data", "plans.sqlite3"))
+    return Autosaver(store, delay=2.0)
+
+
+def get_workspace():
+    # 保存先ID。URL の ?plan=... に入れておくので、再読み込みやブックマークで同じ計画を開ける（URL を共有すれば同僚とも）
+    workspace = st.query_params.get("plan")
+    if not workspace:
+        workspace = uuid.uuid4().hex[:12]
+        st.query_params["plan"] = workspace
+    return workspace
+
+
+# 書類の種類 → 画面側で入れておく場所（st.session_state のキー）
+PLAN_STORES = {"月案_週構成": "monthly_data", "月案_領域別": "monthly_data", "週案": "weekly_data"}
+
+
+def load_saved_plans():
+    # 保存してある計画を1回の問い合わせで全部読み、monthly_data / weekly_data[年齢][期間] に入れる
+    saver = get_plan_saver()
+    workspace = get_workspace()
+    plans = saver.store.load_all(workspace)
+    saver.remember(workspace, plans)
+    for name in set(PLAN_STORES.values()):
+        st.session_state[name] = {}
+    for (age, doc_type, period), values in plans.items():
+        if doc_type in PLAN_STORES:
+            st.session_state[PLAN_STORES[doc_type]].setdefault(age, {}).setdefault(period, {}).update(values)
+
+
+def autosave(doc_type, age, period, values):
+    # 変わった欄だけ、少し間をおいてまとめて保存する
+    get_plan_saver().schedule(get_workspace(), age, doc_type, period, values)
+
+
+# スプレッドシート連携（secrets に [connections.gsheets] があるときだけ使う）
+GSHEETS_WORKSHEET = "plans"
+GSHEETS_TTL = 300  # シートの内容を手元に持っておく秒数
+NUMBER_FIELDS = {"num_weeks"}  # シートからは文字列で返ってくるので数値に戻す欄
+
+
+def sheets_configured():
+    return "gsheets" in st.secrets.get("connections", {})
+
+
+@st.cache_resource
+def get_sheet_sync():
+    # 接続に失敗したときの例外はキャッシュされない（connect_sheet で受け止める）
+    from streamlit_gsheets import GSheetsConnection
+    conn = st.connection("gsheets", type=GSheetsConnection)
+    return SheetSync(open_plan_worksheet(conn, GSHEETS_WORKSHEET), ttl=GSHEETS_TTL)
+
+
+def connect_sheet():
     """
-    添付の週案フォーマット（A4縦）に合わせてExcelを作成する関数
+    get_sheet_sync() を呼び、接続できなければエラーを出して None を返す（画面のほかの部分は動かす）。
+    失敗したことはセッションに覚えておき、「接続し直す」を押すまで再実行のたびに接続し直さない。
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "週案"
-# ▼▼▼ ステップ1：ここからコピーして、ファイルの上の方（def create_monthly_excelがあった場所）に貼る ▼▼▼
-
-# 1. 週案形式（A4縦）のExcelを作る関数
-def create_monthly_excel_weekly(age, config):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "月案_週構成"
-    ws.page_setup.paperSize = ws.PAPERSIZE_A4
-    ws.page_setup.orientation = ws.ORIENTATION_PORTRAIT
-    ws.page_setup.fitToWidth = 1
-    ws.page_setup.fitToHeight = 1
-
-    font_std = Font(name="Meiryo UI", size=10)
-    font_bold = Font(name="Meiryo UI", size=11, bold=True)
-    font_title = Font(name="Meiryo UI", size=14, bold=True)
-    border_all = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-    align_center = Alignment(horizontal="center", vertical="center", wrap_text=True)
-    align_left = Alignment(horizontal="left", vertical="top", wrap_text=True)
-
-    ws.column_dimensions['A'].width = 6
-    ws.column_dimensions['B'].width = 20
-    ws.column_dimensions['C'].width = 30
-    ws.column_dimensions['D'].width = 25
-
-    month_str = config.get('month', '○月')
-    ws.merge_cells('A1:D1')
-    ws["A1"] = f"【{age}】 {month_str} 月案（週構成）"
-    ws["A1"].font = font_title
-    ws["A1"].alignment = align_center
-
-    ws.merge_cells('A2:D2')
-    ws["A2"] = "■ 今月のねらい"
-    ws["A2"].font = font_bold
-    ws["A2"].fill = PatternFill(patternType='solid', fgColor='E2EFDA')
-    ws["A2"].border = border_all
-    ws.merge_cells('A3:D6')
-    ws["A3"] = config.get('monthly_aim', '')
-    ws["A3"].alignment = align_left
-    ws["A3"].border = border_all
-    ws["A3"].font = font_std
-
-    headers = ["週", "週のねらい", "活動内容", "環境・配慮"]
-    for i, h in enumerate(headers, 1):
-        c = ws.cell(row=7, column=i, value=h)
-        c.font = font_bold
-        c.alignment = align_center
-        c.border = border_all
-        c.fill = PatternFill(patternType='solid', fgColor='D9E1F2')
-
-    current_row = 8
-    num_weeks = config.get('num_weeks', 5)
-    vals = config.get('values', {})
+    error = st.session_state.get("gsheets_error")
+    if error is None:
+        try:
+            return get_sheet_sync()
+        except Exception as e:
+            error = st.session_state["gsheets_error"] = f"{type(e).__name__}: {e}"
+    st.error(f"スプレッドシートに接続できませんでした（{error}）")
+    if st.button("🔄 接続し直す"):
+        del st.session_state["gsheets_error"]
+        st.rerun()
+    return None
+
+
+def pull_from_sheet(sync, force=False):
+    # シートの計画をこのセッションに入れて、SQLite にも保存する。戻り値: 読み込んだ計画の数
+    plans = sync.pull(force)
+    for (age, doc_type, period), values in plans.items():
+        if doc_type not in PLAN_STORES:
+            continue
+        values = {k: int(v) if k in NUMBER_FIELDS and v.isdigit() else v for k, v in values.items()}
+        st.session_state[PLAN_STORES[doc_type]].setdefault(age, {}).setdefault(period, {}).update(values)
+        autosave(doc_type, age, period, values)
+    # 開いている画面の入力欄も読み込み直させる
+    for marker in ["weekly_month", "domain_month", "weekly_plan_week"]:
+        st.session_state.pop(marker, None)
+    return len(plans)
+
+
+def push_to_sheet(sync):
+    # この保存先IDの計画（SQLite に保存済みのもの）をシートに書く。戻り値: (書き換えた行数, 追加した行数)
+    saver = get_plan_saver()
+    saver.flush()
+    return sync.push(saver.store.load_all(get_workspace()))
+
+
+def sync_month_fields(age, month, defaults, marker, doc_type=None):
+    """
+    月案の入力内容を monthly_data[年齢][月] に保存し、年齢・対象月を切り替えたらその月の内容を読み込み直す。
+    defaults: {キー: 保存データがないときの初期値} / marker: 最後に読み込んだ (年齢, 月) を覚えておくキー
+    doc_type: 指定すると SQLite にも自動保存する。週案なら month に週の開始日を渡す（weekly_data に入る）
+    """
+    month_store = st.session_state[PLAN_STORES.get(doc_type, 'monthly_data')].setdefault(age, {})
+    saved = month_store.get(month, {})
+    changed = st.session_state.get(marker) != (age, month)
+    st.session_state[marker] = (age, month)
+    for k, d in defaults.items():
+        if changed or k not in st.session_state or st.session_state[k] is None:
+            st.session_state[k] = saved.get(k, d)
+    # 週構成と領域別は同じ月の dict を使うので、丸ごと置き換えずに自分のキーだけ更新する
+    current = {k: st.session_state[k] for k in defaults}
+    month_store.setdefault(month, {}).update(current)
+    if doc_type:
+        autosave(doc_type, age, month, current)
+    return month_store
+
+
+def store_fields(doc_type, age, period, keys):
+    # 入力欄の今の値を monthly_data / weekly_data に入れて自動保存する（st.fragment の再実行では sync_month_fields が動かないので）
+    values = {k: st.session_state.get(k) for k in keys}
+    st.session_state[PLAN_STORES[doc_type]].setdefault(age, {}).setdefault(period, {}).update(values)
+    autosave(doc_type, age, period, values)
+
+# --- AI呼び出し共通処理 ---
+GEMINI_MODEL = 'models/gemini-2.5-flash'
+# 生成設定（全部の書類で共通）
+GEMINI_GENERATION_CONFIG = {"candidate_count": 1}
+# API の呼び出し回数の上限（サーバープロセス全体で。プランに合わせて変える）
+GEMINI_RATE_PER_MIN = 10
+GEMINI_BURST = 3
+GEMINI_MAX_QUEUE = 30
+GEMINI_MAX_RETRIES = 4
+
+
+@st.cache_resource
+def get_gemini_model(model_name=GEMINI_MODEL):
+    # APIキーの設定とモデルの作成はサーバープロセスで1回だけ行い、再実行・全セッションで使い回す
+    import google.generativeai as genai
+    genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
+    return genai.GenerativeModel(model_name, generation_config=GEMINI_GENERATION_CONFIG)
 
-    for w in range(1, num_weeks + 1):
-        row_h = 90 if num_weeks == 4 else 75
-        ws.row_dimensions[current_row].height = row_h
-        c1 = ws.cell(row=current_row, column=1, value=f"第{w}週")
-        c1.alignment = align_center
-        c1.font = font_bold
-        c1.border = border_all
-        
-        items = [f"week_aim_{w}", f"week_activity_{w}", f"week_care_{w}"]
-        for idx, key in enumerate(items, 2):
-            cell = ws.cell(row=current_row, column=idx, value=vals.get(key, ""))
-            cell.alignment = align_left
-            cell.font = font_std
-            cell.border = border_all
-        current_row += 1
-
-    from io import BytesIO
-    output = BytesIO()
-    wb.save(output)
-    return output.getvalue()
-
-# 2. 領域別形式（A4横）のExcelを作る関数
-def create_monthly_excel_domain(age, config):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "月案_領域別"
-    ws.page_setup.paperSize = ws.PAPERSIZE_A4
-    ws.page_setup.orientation = ws.ORIENTATION_LANDSCAPE # A4横
-    ws.page_setup.fitToWidth = 1
-    ws.page_setup.fitToHeight = 1
-    ws.page_margins.left = 0.5
-    ws.page_margins.right = 0.5
-
-    font_std = Font(name="Meiryo UI", size=9)
-    font_bold = Font(name="Meiryo UI", size=10, bold=True)
-    font_title = Font(name="Meiryo UI", size=14, bold=True)
-    border_all = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-    align_center = Alignment(horizontal="center", vertical="center", wrap_text=True)
-    align_left = Alignment(horizontal="left", vertical="top", wrap_text=True)
-    fill_head = PatternFill(patternType='solid', fgColor='B4C6E7')
-    fill_sub = PatternFill(patternType='solid', fgColor='D9E1F2')
-
-    ws.column_dimensions['A'].width = 5
-    ws.column_dimensions['B'].width = 8
-    ws.column_dimensions['C'].width = 32
-    ws.column_dimensions['D'].width = 32
-    ws.column_dimensions['E'].width = 32
-    ws.column_dimensions['F'].width = 32
-
-    month_str = config.get('month', '○月')
-    ws.merge_cells('A1:F1')
-    ws["A1"] = f"{month_str}   月間指導計画（領域別）   {age}"
-    ws["A1"].font = font_title
-
-    vals = config.get('values', {})
-
-    ws.merge_cells('A2:A3')
-    ws["A2"] = "保育目標"
-    ws["A2"].font = font_bold
-    ws["A2"].alignment = align_center
-    ws["A2"].border = border_all
-    ws["A2"].fill = fill_head
-    ws.merge_cells('B2:F3')
-    ws["B2"] = vals.get("target_goal", "")
-    ws["B2"].font = font_std
-    ws["B2"].alignment = align_left
-    ws["B2"].border = border_all
-
-    ws.merge_cells('A4:A5')
-    ws["A4"] = "子どもの姿"
-    ws["A4"].font = font_bold
-    ws["A4"].alignment = align_center
-    ws["A4"].border = border_all
-    ws["A4"].fill = fill_head
-    ws.merge_cells('B4:F5')
-    ws["B4"] = vals.get("child_status", "")
-    ws["B4"].font = font_std
-    ws["B4"].alignment = align_left
-    ws["B4"].border = border_all
-
-    headers = ["年間区別", "", "ねらい", "環境・構成", "予想される子どもの活動", "配慮事項"]
-    for i, h in enumerate(headers, 1):
-        c = ws.cell(row=6, column=i, value=h)
-        c.font = font_bold
-        c.alignment = align_center
-        c.border = border_all
-        c.fill = fill_head
-    ws.merge_cells('A6:B6')
-    ws["A6"] = "年間区別"
-
-    current_row = 7
-    
-    # 養護ブロック
-    for label_b, key_prefix in [("生命", "yogo_life"), ("情緒", "yogo_emo")]:
-        ws.row_dimensions[current_row].height = 60
-        cb = ws.cell(row=current_row, column=2, value=label_b)
-        cb.font = font_bold
-        cb.alignment = align_center
-        cb.border = border_all
-        cb.fill = fill_sub
-        cols = [("aim", 3), ("env", 4), ("act", 5), ("care", 6)]
-        for k, idx in cols:
-            val = vals.get(f"{key_prefix}_{k}", "")
-            cc = ws.cell(row=current_row, column=idx, value=val)
-            cc.font = font_std
-            cc.alignment = align_left
-            cc.border = border_all
-        current_row += 1
-    ws.merge_cells(start_row=7, start_column=1, end_row=current_row-1, end_column=1)
-    ca = ws.cell(row=7, column=1, value="養護")
-    ca.font = font_bold
-    ca.alignment = align_center
-    ca.border = border_all
-    ca.fill = fill_head
-
-    # 教育ブロック
-    start_edu = current_row
-    for label_b, key_prefix in [("健康", "edu_health"), ("人間関係", "edu_rel"), ("環境", "edu_env"), ("言葉", "edu_lang"), ("表現", "edu_exp")]:
-        ws.row_dimensions[current_row].height = 60
-        cb = ws.cell(row=current_row, column=2, value=label_b)
-        cb.font = font_bold
-        cb.alignment = align_center
-        cb.border = border_all
-        cb.fill = fill_sub
-        cols = [("aim", 3), ("env", 4), ("act", 5), ("care", 6)]
-        for k, idx in cols:
-            val = vals.get(f"{key_prefix}_{k}", "")
-            cc = ws.cell(row=current_row, column=idx, value=val)
-            cc.font = font_std
-            cc.alignment = align_left
-            cc.border = border_all
-        current_row += 1
-    ws.merge_cells(start_row=start_edu, start_column=1, end_row=current_row-1, end_column=1)
-    ca = ws.cell(row=start_edu, column=1, value="教育")
-    ca.font = font_bold
-    ca.alignment = align_center
-    ca.border = border_all
-    ca.fill = fill_head
-    
-    # その他ブロック
-    others = [("食育", "food"), ("健康・安全", "safety"), ("保護者支援", "parent")]
-    for label, key in others:
-        ws.row_dimensions[current_row].height = 50
-        ca = ws.cell(row=current_row, column=1, value=label)
-        ca.font = font_bold
-        ca.alignment = align_center
-        ca.border = border_all
-        ca.fill = fill_head
-        ws.merge_cells(start_row=current_row, start_column=1, end_row=current_row, end_column=2)
-        cols = [("aim", 3), ("env", 4), ("act", 5), ("care", 6)]
-        for k, idx in cols:
-            val = vals.get(f"{key}_{k}", "")
-            cc = ws.cell(row=current_row, column=idx, value=val)
-            cc.font = font_std
-            cc.alignment = align_left
-            cc.border = border_all
-        current_row += 1
-
-    from io import BytesIO
-    output = BytesIO()
-    wb.save(output)
-    return output.getvalue()
-# ▲▲▲ ステップ1 終わり ▲▲▲
+@st.cache_resource
+def get_response_cache():
+    # 応答キャッシュはサーバープロセスで1つ（全セッション共有）
+    return ResponseCache(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "gemini_responses.sqlite3"))
 
-# ▼▼▼ 修正後の万能AI関数 ▼▼▼
-def ask_gemini_aim(age, keywords, doc_type="月間指導計画"):
-    # SecretsからAPIキーを取得
-    if "GEMINI_API_KEY" not in st.secrets:
-        return "エラー: APIキーがSecretsに設定されていません。"
-    
-    api_key = st.secrets["GEMINI_API_KEY"]
-    genai.configure(api_key=api_key)
-    
+@st.cache_resource
+def get_rate_limiter():
+    # 全セッションで1つの行列に並ぶ（セッションごとに作ると一斉に押されたときに 429 になる）
+    return RateLimiter(GEMINI_RATE_PER_MIN, burst=GEMINI_BURST, max_queue=GEMINI_MAX_QUEUE)
+
+@st.cache_resource
+def get_job_runner():
+    # バックグラウンドのAI作成は全セッションで1つのスレッドプールを使う
+    return JobRunner(max_workers=4)
+
+
+def plan_check(doc_type, num_weeks=5):
+    # 応答をキャッシュしてよいかの判定関数: JSON として読めて、必要なキーがそろっているときだけ
+    schema = plan_schema(doc_type, num_weeks)
+    def check(text):
+        try:
+            return not missing_keys(parse_plan(text), schema)
+        except PlanParseError:
+            return False
+    return check
+
+
+MISSING_WARNING = "AIの応答に足りない欄がありました（{}か所）。その欄は書き換えていないので、確認して必要ならもう一度作成してください。"
+
+
+@st.cache_resource
+def get_rerun_timer():
+    return RerunTimer()
+
+
+def get_call_log():
+    # AI呼び出しの記録はセッションごと（サイドバーの診断パネルで見る）
+    if "ai_call_log" not in st.session_state:
+        st.session_state["ai_call_log"] = CallLog()
+    return st.session_state["ai_call_log"]
+
+
+def generate_text(prompt, check=None, on_field=None, use_cache=None, response_schema=None, tags=None, log=None, on_wait=None):
+    """
+    Gemini に prompt を送って応答テキストを返す。同じプロンプトはキャッシュから返す（APIを使わない）。
+    check: 応答をキャッシュしてよいか判定する関数（壊れたJSONなどを保存しないため）
+    on_field: (キーのパス, 値) を受け取る関数。指定するとストリーミングで生成し、
+              JSON の値が1つ完成するたびに呼ぶ（キャッシュから返すときはまとめて呼ぶ）
+    use_cache: キャッシュを使うか。None ならサイドバーの「キャッシュを使わない」に従う
+               （st.session_state を読めない別スレッドから呼ぶときは必ず指定する）
+    response_schema: plan_schema の形。指定すると JSON だけを返す構造化出力モードで生成する
+    tags: 記録に付ける情報（doc_type, age, mode, attempt など）
+    log: 記録先の CallLog。None ならこのセッションの記録（別スレッドから呼ぶときは必ず指定する）
+    on_wait: 混雑して順番待ちになったときに (前に並んでいる件数) で呼ぶ（queue_status() を渡す）
+    """
+    cache = get_response_cache()
+    if use_cache is None:
+        use_cache = not st.session_state.get("ai_cache_bypass", False)
+    if log is None:
+        log = get_call_log()
+    rec = dict(tags or {}, stream=on_field is not None, structured=response_schema is not None,
+               prompt_chars=len(prompt), prompt_tokens=0, response_tokens=0)
+    start = time.perf_counter()
+    if use_cache:
+        cached = cache.get(prompt, GEMINI_MODEL)
+        if cached is not None:
+            if on_field:
+                for path, value in JsonFieldStream().feed(cached):
+                    on_field(path, value)
+            log.record(**rec, cached=True, latency=time.perf_counter() - start, response_chars=len(cached))
+            return cached
+    options = {}
+    if response_schema is not None:
+        options["generation_config"] = {
+            **GEMINI_GENERATION_CONFIG,
+            "response_mime_type": "application/json",
+            "response_schema": to_response_schema(response_schema, FIELD_LABELS),
+        }
+    def on_retry(n, delay, e):
+        rec["api_retries"] = n
+    def on_acquire(waited):
+        rec["queue_wait"] = rec.get("queue_wait", 0.0) + waited
+    def send(**kw):
+        # 順番を待ってから送る。429 / 5xx は間隔を空けてやり直す
+        # （ストリーミングは最初の応答が来るまでにエラーになるので、途中まで表示してからのやり直しはない）
+        return call_with_retry(lambda: get_gemini_model().generate_content(prompt, **options, **kw),
+                               limiter=get_rate_limiter(), on_wait=on_wait,
+                               max_retries=GEMINI_MAX_RETRIES, on_retry=on_retry, on_acquire=on_acquire)
     try:
-        # モデル指定（2.5-flash）
-        model = genai.GenerativeModel('models/gemini-2.5-flash')
-        
-        # 書類タイプによって命令文を変える
-        if doc_type == "年間指導計画":
-            target_desc = "1年間を通した長期的な「年間目標」"
-        elif doc_type == "週案":
-            target_desc = "1週間（月〜土）の短期的な「週のねらい」"
+        if on_field is None:
+            response = send()
+            text = response.text
+            usage = getattr(response, "usage_metadata", None)
         else:
-            target_desc = "1ヶ月間の「月間ねらい」"
+            parser = JsonFieldStream()
+            parts = []
+            usage = None
+            for chunk in send(stream=True):
+                if not parts:
+                    rec["first_chunk"] = time.perf_counter() - start
+                parts.append(chunk.text)
+                # トークン数は最後のチャンクに入ってくる
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                for path, value in parser.feed(chunk.text):
+                    on_field(path, value)
+            text = "".join(parts)
+    except Exception as e:
+        log.record(**rec, cached=False, latency=time.perf_counter() - start, error=f"{type(e).__name__}: {e}")
+        raise
+    rec["prompt_tokens"], rec["response_tokens"] = usage_counts(usage)
+    ok = check is None or check(text)
+    if check is not None:
+        rec["parse_ok"] = ok  # JSON として読めて、必要な欄がそろっていたか
+    log.record(**rec, cached=False, latency=time.perf_counter() - start, response_chars=len(text))
+    if ok:
+        cache.put(prompt, GEMINI_MODEL, text)
+    return text
+
+
+def queue_status():
+    """
+    混雑して順番待ちになったとき、待ち状況を画面（スピナーの下）に出す関数を返す（generate_text の on_wait に渡す）。
+    """
+    box = st.empty()
+    def on_wait(ahead):
+        if ahead is None:
+            box.empty()
+        elif ahead:
+            box.info(f"⏳ AIが混み合っています。順番待ち中…（前に {ahead} 件）")
+        else:
+            box.info("⏳ AIが混み合っています。まもなく作成を始めます…")
+    return on_wait
 
-        prompt = f"""
-        あなたはベテラン保育士です。
-        以下の条件で、{doc_type}における{target_desc}の文章を1つ作成してください。
-        
-        【条件】
-        ・対象年齢: {age}
-        ・キーワード: {keywords}
-        ・文体: 保育の専門用語を用い、最後は「〜する。」などの言い切りで終える。
-        ・文字数: 100文字〜150文字程度
-        """
-        
-        response = model.generate_content(prompt)
-        return response.text.strip()
+
+def live_preview():
+    """
+    AIの文章を、完成した欄から順に画面へ出すための関数を返す（generate_text の on_field に渡す）。
+    サイドバーでストリーミング表示をオフにしているときは None。
+    """
+    if not st.session_state.get("ai_streaming", True):
+        return None
+    box = st.empty()
+    lines = []
+    def on_field(path, value):
+        labels = []
+        for p in path:
+            p = str(p)
+            if p.isdigit():
+                labels.append(f"第{p}週")
+            elif p in "月火水木金土":
+                labels.append(f"{p}曜日")
+            else:
+                labels.append(FIELD_LABELS.get(p, p))
+        lines.append(f"- **{' / '.join(labels)}**: {value}")
+        box.markdown("\n".join(lines))
+    return on_field
+
+
+def _generate_domain_section(age, month, keyword, section, use_cache, structured, log, attempt, on_field=None, on_wait=None):
+    # 別スレッドで動くので st.* は使わない（on_field / on_wait は generate_domain_parallel がロックで包んだもの）
+    prompt = domain_section_prompt(age, month, keyword, section, structured)
+    schema = plan_schema(section) if structured else None
+    tags = {"doc_type": "月案_領域別", "section": section, "age": age, "month": month, "mode": "並列", "attempt": attempt}
+    text = generate_text(prompt, check=plan_check(section), use_cache=use_cache, response_schema=schema, tags=tags, log=log,
+                         on_field=on_field, on_wait=on_wait)
+    part = parse_plan(text)
+    missing = missing_keys(part, plan_schema(section))
+    if missing:
+        raise PlanParseError(f"{section} の欄が足りません: {missing}")
+    return part
+
+
+def generate_domain_parallel(age, month, keyword, max_retries=2, on_section=None, use_cache=None, structured=None, log=None,
+                             on_field=None, on_wait=None):
+    """
+    領域別の月案を 養護・教育・その他 の3リクエストに分けて同時に作り、1つの dict にまとめて返す。
+    失敗したセクションだけを max_retries 回まで作り直す。
+    戻り値: (data, 最後まで作れなかったセクション名のリスト)
+    on_section: セクションが1つできるたびに (セクション名) で呼ぶ（画面の進み具合の表示用）
+    use_cache / structured / log: None ならサイドバーの設定・このセッションの記録を使う
+    on_field / on_wait: generate_text と同じ。3つのスレッドから呼ばれるので、1つずつ順に呼ぶ
+    """
+    if use_cache is None:
+        use_cache = not st.session_state.get("ai_cache_bypass", False)
+    if structured is None:
+        structured = st.session_state.get("ai_structured", True)
+    if log is None:
+        log = get_call_log()
+    get_response_cache(); get_gemini_model()  # 共有リソースはスレッドを立てる前に作っておく
+    lock = threading.Lock()
+    def locked(fn):
+        if fn is None:
+            return None
+        def call(*args):
+            with lock:
+                fn(*args)
+        return call
+    on_field, on_wait = locked(on_field), locked(on_wait)
+    # 画面の表示（live_preview / queue_status）を section のスレッドから書けるよう、今の実行のコンテキストを渡す
+    # （バックグラウンドのジョブから呼ぶときは ctx が None で、何もしない）
+    ctx = get_script_run_ctx(suppress_warning=True)
+    init = (add_script_run_ctx, (None, ctx)) if ctx is not None else (None, ())
+    data = {}
+    pending = list(DOMAIN_SECTIONS)
+    for attempt in range(max_retries + 1):
+        if not pending:
+            break
+        failed = []
+        with ThreadPoolExecutor(max_workers=len(pending), initializer=init[0], initargs=init[1]) as pool:
+            futures = {pool.submit(_generate_domain_section, age, month, keyword, sec, use_cache, structured, log, attempt,
+                                   on_field, on_wait): sec for sec in pending}
+            for fut in as_completed(futures):
+                sec = futures[fut]
+                try:
+                    data.update(fut.result())
+                    if on_section:
+                        on_section(sec)
+                except Exception:
+                    failed.append(sec)
+        pending = failed
+    return data, pending
+
+
+def aim_examples(age, keywords, k=3):
+    # キーワードに近い定型文を k 件選んで、AIに文体の参考として渡す（サイドバーでオフにできる）
+    if not st.session_state.get("ai_examples", True):
+        return []
+    return [hit.text for hit in get_template_index(templates_version()).similar(keywords, k, age)]
+
+
+def count_generation(*target):
+    # 同じ書類（target）を何回作ったか数える。2回目からは「作り直し」（結果に満足しなかった）とみなす
+    counts = st.session_state.setdefault("ai_generations", {})
+    counts[target] = counts.get(target, 0) + 1
+
+
+def regeneration_stats():
+    # (作った書類の数, 作り直しの回数)
+    counts = st.session_state.get("ai_generations", {})
+    return len(counts), sum(n - 1 for n in counts.values())
+
+
+# ▼▼▼ 修正後の万能AI関数 ▼▼▼
+def ask_gemini_aim(age, keywords, doc_type="月間指導計画", examples=()):
+    if not has_api_key:
+        return f"エラー: {NO_API_KEY_MESSAGE}"
+    
+    try:
+        prompt = aim_prompt(age, keywords, doc_type, examples)
+        return generate_text(prompt, tags={"doc_type": doc_type, "age": age, "mode": "ねらい"}, on_wait=queue_status()).strip()
             
     except Exception as e:
         return f"接続エラー: {str(e)}"
 # ▲▲▲ 修正ここまで ▲▲▲
 
 
+# --- 書類ごとのAI作成 ---
+# どれも (入力欄のキー → 値, 注意メッセージ or None) を返す。st.* は使わないので、バックグラウンドのスレッドからも呼べる。
+# opts は generate_text にそのまま渡す（use_cache, log, on_wait, on_field）
+def generate_monthly_weekly(age, month, keyword, num_weeks, structured=True, **opts):
+    prompt = monthly_weekly_prompt(age, month, keyword, num_weeks, structured)
+    schema = plan_schema("月案_週構成", num_weeks)
+    text = generate_text(prompt, check=plan_check("月案_週構成", num_weeks), response_schema=schema if structured else None,
+                         tags={"doc_type": "月案_週構成", "age": age, "month": month, "mode": "週構成"}, **opts)
+    data = parse_plan(text)
+    if not data:
+        return {}, None
+    # 応答にない欄は入れない（入力済みの文章を "" で消さないため）
+    values = {}
+    if data.get("monthly_aim_sentence") is not None:
+        values["monthly_aim_area"] = str(data["monthly_aim_sentence"])
+    for w in range(1, num_weeks + 1):
+        w_str = str(w)
+        if w_str in data:
+            values[f"week_aim_{w}"] = str(data[w_str].get("aim") or "")
+            values[f"week_activity_{w}"] = str(data[w_str].get("activity") or "")
+            values[f"week_care_{w}"] = str(data[w_str].get("care") or "")
+    missing = missing_keys(data, schema)
+    return values, MISSING_WARNING.format(len(missing)) if missing else None
+
+
+def generate_domain_plan(age, month, keyword, parallel=True, structured=True, on_section=None, use_cache=None, log=None, **opts):
+    if parallel:
+        data, failed = generate_domain_parallel(age, month, keyword, on_section=on_section, use_cache=use_cache,
+                                                structured=structured, log=log, **opts)
+        missing = []
+    else:
+        failed = []
+        prompt = domain_plan_prompt(age, month, keyword, structured)
+        schema = plan_schema("月案_領域別")
+        text = generate_text(prompt, check=plan_check("月案_領域別"), response_schema=schema if structured else None,
+                             tags={"doc_type": "月案_領域別", "age": age, "month": month, "mode": "一括"},
+                             use_cache=use_cache, log=log, **opts)
+        data = parse_plan(text)
+        missing = missing_keys(data, schema)
+    if not data:
+        return {}, None
+    if failed:
+        return domain_values(data), "次の欄は作成できませんでした（入力済みの内容はそのままです。もう一度お試しください）: " + "、".join(DOMAIN_SECTIONS[f][0] for f in failed)
+    return domain_values(data), MISSING_WARNING.format(len(missing)) if missing else None
+
+
+def generate_weekly_plan(age, keyword, structured=True, **opts):
+    prompt = weekly_plan_prompt(age, keyword, structured)
+    schema = plan_schema("週案")
+    text = generate_text(prompt, check=plan_check("週案"), response_schema=schema if structured else None,
+                         tags={"doc_type": "週案", "age": age, "mode": "週案"}, **opts)
+    data = parse_plan(text)
+    if not data:
+        return {}, None
+    values = {}
+    if "weekly_aim_sentence" in data:
+        values["final_aim_area"] = data["weekly_aim_sentence"]
+    for day in "月火水木金土":
+        if day in data:
+            values[f"activity_{day}"] = data[day].get("activity", "")
+            values[f"care_{day}"] = data[day].get("care", "")
+            values[f"tool_{day}"] = data[day].get("tool", "")
+    missing = missing_keys(data, schema)
+    return values, MISSING_WARNING.format(len(missing)) if missing else None
+
+
+def generate_annual_aim(age, keywords, examples=(), structured=None, **opts):
+    # 年間目標は文章なので structured は使わない
+    text = generate_text(aim_prompt(age, keywords, "年間指導計画", examples),
+                         tags={"doc_type": "年間指導計画", "age": age, "mode": "ねらい"}, **opts)
+    return {"年間目標": text.strip()}, None
+
+
+# --- バックグラウンドでのAI作成 ---
+def ai_settings():
+    # サイドバーのAI設定。スレッドの中では st.session_state を読めないので、ボタンを押したときに読んでおく
+    return {"use_cache": not st.session_state.get("ai_cache_bypass", False),
+            "structured": st.session_state.get("ai_structured", True),
+            "log": get_call_log()}
+
+
+def _run_plan_job(job, generate, *args, **kwargs):
+    # バックグラウンドのスレッドで動く（st.* は使わない）。途中経過は job.progress に書く
+    count = []
+    def on_field(path, value):
+        count.append(path)
+        job.progress = f"{len(count)} 欄できました"
+    def on_wait(ahead):
+        job.progress = "" if ahead is None else f"順番待ち（前に {ahead} 件）"
+    return generate(*args, on_field=on_field, on_wait=on_wait, **kwargs)
+
+
+def ai_button(label):
+    # AI作成のボタン。APIキーがなければ押せないようにして、理由をヒントに出す
+    return st.button(label, disabled=not has_api_key, help=None if has_api_key else NO_API_KEY_MESSAGE)
+
+
+def start_job(label, generate, *args, target=None, **kwargs):
+    """
+    AI作成をバックグラウンドで始めて、このセッションのジョブ一覧に加える。
+    generate: 上の generate_* のどれか / target: (書類の種類, 年齢, 期間, sync_month_fields の marker)。
+    結果は monthly_data / weekly_data のその期間に入れて保存する（None なら入力欄に直接入れる）
+    """
+    if not has_api_key:
+        st.error(NO_API_KEY_MESSAGE)
+        return None
+    runner = get_job_runner()
+    for job_id in st.session_state.get("ai_jobs", []):
+        job = runner.get(job_id)
+        if job is not None and job.label == label and not job.finished:
+            st.warning(f"「{label}」はいま作成中です。終わるまでお待ちください。")
+            return None
+    job = runner.submit(label, _run_plan_job, generate, *args, meta={"target": target}, **kwargs, **ai_settings())
+    st.session_state.setdefault("ai_jobs", []).append(job.id)
+    st.info(f"「{label}」をバックグラウンドで作成しています。ほかのクラスや月に切り替えても大丈夫です（サイドバーで進み具合を確認できます）。")
+    return job
+
+
+def apply_finished_jobs():
+    """
+    終わったバックグラウンドのAI作成を入力欄・monthly_data などに入れて保存する。
+    入力欄（ウィジェット）を描く前に呼ぶこと（描いた後だとキーを書き換えられない）。
+    """
+    runner = get_job_runner()
+    running = []
+    for job_id in st.session_state.get("ai_jobs", []):
+        job = runner.get(job_id)
+        if job is None:
+            continue
+        if not job.finished:
+            running.append(job_id)
+            continue
+        runner.discard(job_id)
+        if job.error is not None:
+            st.toast(f"❌ {job.label}: {job.error}")
+            continue
+        values, problem = job.result
+        target = job.meta.get("target")
+        if target:
+            doc_type, t_age, period, marker = target
+            st.session_state[PLAN_STORES[doc_type]].setdefault(t_age, {}).setdefault(period, {}).update(values)
+            autosave(doc_type, t_age, period, values)
+            # いまその期間を開いているなら、入力欄にもそのまま入れる
+            if st.session_state.get(marker) == (t_age, period):
+                st.session_state.update(values)
+        else:
+            st.session_state.update(values)
+        st.toast(f"⚠️ {job.label}: {problem}" if problem else f"✅ {job.label} ができました")
+    st.session_state["ai_jobs"] = running
+
+
+def job_panel():
+    # サイドバーのジョブ一覧。st.fragment で数秒ごとにここだけ再実行し、終わったものがあれば全体を再実行して反映する
+    runner = get_job_runner()
+    jobs = [j for j in (runner.get(i) for i in st.session_state.get("ai_jobs", [])) if j is not None]
+    if any(j.finished for j in jobs):
+        st.rerun()
+    for j in jobs:
+        st.caption(f"⏳ {j.label}: {j.status} {j.progress}（{j.elapsed():.0f} 秒）")
+
+
+# --- 入力欄のまとまり（st.fragment） ---
+# 欄を編集したときは、そのまとまりだけを再実行する（ページ全体・広告・ほかのタブは作り直さない）。
+# 編集した欄はまとまりごとに保存し、プレビューは preview（ページ側で作った枠に書く関数）で該当部分だけ書き直す。
+def _section_done(name, started, keys, doc_type, age, period, preview):
+    store_fields(doc_type, age, period, keys)
+    if preview:
+        preview()
+    get_rerun_timer().record(f"{name}（欄のまとまりだけ）", time.perf_counter() - started)
+
+
+@st.fragment
+def fields_section(doc_type, age, period, fields, preview=None):
+    # fields: [(見出し, 入力欄のキー, 高さ or None)] を縦に並べる
+    started = time.perf_counter()
+    for label, key, height in fields:
+        if st.session_state.get(key) is None: st.session_state[key] = ""
+        st.text_area(label, key=key, height=height)
+    _section_done(doc_type, started, [k for _, k, _ in fields], doc_type, age, period, preview)
+
+
+@st.fragment
+def domain_rows_section(age, month, rows, height=None, preview=None):
+    # 領域別の1つのタブ。rows: [(見出し, キーの頭)] ごとに ねらい・環境・活動・配慮 を横に並べる
+    started = time.perf_counter()
+    keys = []
+    for lbl, pf in rows:
+        st.markdown(f"**{lbl}**")
+        for col, (name, k) in zip(st.columns(4), [("ねらい", "aim"), ("環境", "env"), ("活動", "act"), ("配慮", "care")]):
+            col.text_area(name, key=f"{pf}_{k}", height=height)
+            keys.append(f"{pf}_{k}")
+    _section_done("月案_領域別", started, keys, "月案_領域別", age, month, preview)
+
+
+@st.fragment
+def week_section(age, month, w, preview=None):
+    # 月案（週構成）の1週分
+    started = time.perf_counter()
+    keys = [f"week_aim_{w}", f"week_activity_{w}", f"week_care_{w}"]
+    with st.expander(f"第{w}週の計画", expanded=True):
+        # 表示直前チェック
+        for k in keys:
+            if st.session_state.get(k) is None: st.session_state[k] = ""
+        c1, c2, c3 = st.columns(3)
+        c1.text_area("週ねらい", key=keys[0], height=100)
+        c2.text_area("活動", key=keys[1], height=100)
+        c3.text_area("配慮", key=keys[2], height=100)
+    _section_done("月案_週構成", started, keys, "月案_週構成", age, month, preview)
+
+
+@st.fragment
+def weekday_section(age, week_id, day, preview=None):
+    # 週案の1曜日分
+    started = time.perf_counter()
+    st.markdown(f"**{day}曜日**")
+    st.text_area("活動", key=f"activity_{day}", height=100)
+    st.text_area("配慮", key=f"care_{day}", height=120)
+    st.text_area("準備", key=f"tool_{day}", height=60)
+    _section_done("週案", started, [f"activity_{day}", f"care_{day}", f"tool_{day}"], "週案", age, week_id, preview)
+
+
+@st.fragment
+def print_preview(key, make_layout, filename):
+    """
+    Excel と同じレイアウトの印刷イメージ。make_layout() でレイアウト記述を作り、Workbook は作らずに HTML で見せる。
+    開く・閉じる・最新にするときはこの部分だけ再実行する（入力欄を直したあとは 🔄 で最新の内容になる）。
+    """
+    c1, c2 = st.columns([4, 1])
+    show = c1.toggle("🖨 印刷イメージを見る（Excel と同じレイアウト）", key=f"print_{key}")
+    if not show:
+        return
+    c2.button("🔄 最新にする", key=f"print_refresh_{key}")
+    layout = make_layout()
+    with st.container(border=True):
+        st.html(layout_preview_html(layout))
+    st.download_button("🖨 印刷用ページ（HTML）", layout_preview_html(layout, page=True), filename,
+                       mime="text/html", key=f"print_download_{key}")
+
+
 # --- 4. メイン画面構築 ---
 # メイン画面の最上部に別の広告を出す
 st.caption("PR: 新年度、新しいエプロンで気持ちを入れ替えませんか？")
-components.html(ad_main, height=150) # メイン用の変数（ad_main）を使う
+# 広告は iframe（components.html）ではなく st.html で出す。iframe は再実行のたびに中の文書を作り直すが、
+# st.html は中身が同じなら画面側でそのまま残るので、画像も読み込み直さない
+st.html(ad_main) # メイン用の変数（ad_main）を使う
 
 # ロゴとタイトルの表示
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logo.png")
 col1, col2 = st.columns([1, 5])
 with col1:
-    try:
-        st.image("logo.png", width=80) # ロゴ画像があれば表示
-    except:
+    if os.path.exists(LOGO_PATH):
+        st.image(LOGO_PATH, width=80) # ロゴ画像があれば表示
+    else:
         st.write("📛") # 画像がない場合の代わり
 with col2:
     st.title("保育指導計画システム")
@@ -695,36 +730,138 @@ with col2:
 
 # セッション初期化
 if 'annual_data' not in st.session_state: st.session_state['annual_data'] = {}
-if 'monthly_data' not in st.session_state: st.session_state['monthly_data'] = {}
+# 月案・週案は保存してあるものを読み込む（URL の保存先IDごと）
+if 'monthly_data' not in st.session_state: load_saved_plans()
+if 'annual_configs' not in st.session_state: st.session_state['annual_configs'] = {}
+# バックグラウンドで終わったAI作成の結果を、入力欄を描く前に反映する
+apply_finished_jobs()
 
 # サイドバー設定
 # ▼▼▼ ②ここから下をサイドバーの一番下に追加 ▼▼▼
 with st.sidebar:
     st.caption("PR: 新年度におすすめの絵本")
     # 「st.sidebar.」を消して、インデント（字下げ）して書くのが正解です
-    components.html(ad_sidebar, height=300) 
+    st.html(ad_sidebar)
     st.divider()
     # ▲▲▲ ここまで ▲▲▲
 st.sidebar.header("⚙️ 設定")
 
 
 st.sidebar.divider() # 区切り線を入れてから、入力項目へ
-age = st.sidebar.selectbox("対象年齢", ["0歳児", "1歳児", "2歳児", "3歳児", "4歳児", "5歳児"])
-mode = st.sidebar.radio("作成する書類", [ "月案（月間指導計画）", "週案","年間指導計画（整備中）"])
+age = st.sidebar.selectbox("対象年齢", AGES)
+mode = st.sidebar.radio("作成する書類", [MODE_MONTHLY, MODE_WEEKLY, MODE_ANNUAL])
+page = mode  # 処理時間の記録での画面の名前（月案は書式ごとに分ける）
 orient = st.sidebar.radio("用紙向き", ["横", "縦"])
 
+# AI応答キャッシュ（同じ条件での再作成はAPIを使わずに即座に返す）
+st.sidebar.checkbox("AIキャッシュを使わない（毎回新しく作成）", key="ai_cache_bypass")
+st.sidebar.checkbox("AIの文章をできた欄から順に表示（ストリーミング）", value=True, key="ai_streaming")
+st.sidebar.checkbox("AIにJSONの形を直接指定する（構造化出力）", value=True, key="ai_structured")
+st.sidebar.checkbox("バックグラウンドで作成する（作成中も画面を操作できる）", value=True, key="ai_background")
+st.sidebar.checkbox("キーワードに近い定型文をAIに見本として渡す", value=True, key="ai_examples")
+if st.session_state.get("ai_jobs"):
+    with st.sidebar:
+        st.fragment(job_panel, run_every=2)()
+cache_stats = get_response_cache().stats()
+st.sidebar.caption(f"AIキャッシュ: ヒット {cache_stats['hits']} / ミス {cache_stats['misses']}（保存 {cache_stats['entries']} 件）")
+
+# AI呼び出しの診断（このセッションのトークン数・時間・失敗の記録）
+with st.sidebar.expander("📊 AI呼び出しの記録"):
+    call_log = get_call_log()
+    summ = call_log.summary()
+    if summ["calls"] == 0:
+        st.caption("まだAIを呼び出していません。")
+    else:
+        c1, c2 = st.columns(2)
+        c1.metric("呼び出し", summ["calls"], help=f"うちキャッシュ {summ['cache_hits']} 回")
+        c2.metric("平均時間(API)", f"{summ['avg_latency']:.1f} 秒", help=f"うち順番待ち 平均 {summ['avg_queue_wait']:.1f} 秒")
+        c1.metric("入力トークン", summ["prompt_tokens"])
+        c2.metric("出力トークン", summ["response_tokens"])
+        st.caption(f"JSON読み取り失敗 {summ['parse_failures']} / 作り直し {summ['retries']} / 混雑で再送 {summ['api_retries']} / エラー {summ['errors']}")
+        n_docs, n_regen = regeneration_stats()
+        if n_docs:
+            st.caption(f"ボタンでの作り直し: {n_regen} 回（{n_docs} 件の書類、1件あたり {n_regen / n_docs:.1f} 回）")
+        if summ["calls"]:
+            import pandas as pd  # 表を出すときに初めて読み込む
+            st.dataframe(pd.DataFrame(call_log.by_tag("doc_type")), hide_index=True)
+            slow = sorted((r for r in call_log.snapshot() if not r.get("cached")), key=lambda r: r["latency"], reverse=True)[:5]
+            if slow:
+                st.caption("時間がかかった呼び出し")
+                st.dataframe(pd.DataFrame(slow).reindex(columns=["doc_type", "section", "mode", "latency", "queue_wait", "prompt_tokens", "response_tokens"]), hide_index=True)
+        st.download_button("記録を保存（JSON Lines）", call_log.to_jsonl(), file_name="ai_calls.jsonl", mime="application/x-ndjson")
+        if st.button("記録を消す"):
+            call_log.clear()
+            st.rerun()
+
+# 入力した月案・週案は自動で保存される（保存先IDはURLに入っている）
+st.sidebar.caption(f"💾 自動保存中（保存先ID: {get_workspace()}）。このページのURLをブックマークすると、次回も続きから開けます。")
+
+# 画面の処理時間（中身はスクリプトの最後で入れる）
+rerun_slot = st.sidebar.empty()
+
+# スプレッドシートとの同期（設定してあるときだけ表示）
+if sheets_configured():
+    with st.sidebar.expander("📊 スプレッドシート連携"):
+        sheet_sync = connect_sheet()
+        if sheet_sync is not None:
+            c1, c2 = st.columns(2)
+            if c1.button("⬇️ 読み込み"):
+                try:
+                    n = pull_from_sheet(sheet_sync, force=True)
+                    st.toast(f"スプレッドシートから {n} 件の計画を読み込みました")
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"読み込みに失敗しました: {e}")
+            if c2.button("⬆️ 書き出し"):
+                try:
+                    updated, added = push_to_sheet(sheet_sync)
+                    st.success(f"書き出しました（変更 {updated} 行・追加 {added} 行）")
+                except Exception as e:
+                    st.error(f"書き出しに失敗しました: {e}")
+
+# 定型文をキーワードで探す（全年齢・全領域から）
+with st.sidebar.expander("🔎 定型文を探す"):
+    query = st.text_input("キーワード", placeholder="例：泥遊び 絵本", key="teikei_query")
+    only_age = st.checkbox(f"{age}だけ", key="teikei_only_age")
+    if query:
+        hits = get_template_index(templates_version()).search(query, limit=10, age=age if only_age else None)
+        if not hits:
+            st.caption("見つかりませんでした。")
+        for hit in hits:
+            st.caption(f"{hit.age}・{hit.domain}")
+            st.code(hit.text, language=None, wrap_lines=True)  # 右上のボタンでコピーできる
+    packs, pack_errors = loaded_packs()
+    st.caption("読み込んだ定型文: " + "、".join(f"{name} {ver}".strip() for name, ver in packs))
+    for err in pack_errors:
+        st.warning(f"読み込めなかったパック: {err}")
+
 # 掲示板へのリンク
 st.sidebar.markdown("---")
 st.sidebar.link_button("☕ 掲示板（休憩室）へ", "https://hoiku-bbs-ez5sr2ocp4ni2r4ypxuqx6.streamlit.app")
 st.sidebar.markdown("---")
 
+# 全年齢 × 全月（週構成・領域別）＋年間計画を1つのZIPにまとめて出力
+with st.sidebar.expander("📦 全クラス一括出力（ZIP）"):
+    st.caption("0歳児〜5歳児の4月〜3月の月案（週構成・領域別）と年間計画をまとめて作成します。")
+    if st.button("📦 一括作成"):
+        jobs = excel().collect_batch_jobs(AGES, st.session_state['monthly_data'], st.session_state['annual_configs'])
+        bar = st.progress(0.0, text="準備中...")
+        def show_progress(done, total):
+            bar.progress(done / total, text=f"{done} / {total} ファイル作成済み")
+        # 作成は別プロセスで行う（サーバーのプロセスから直接プロセスプールを作らない）
+        with tempfile.TemporaryDirectory() as tmp:
+            zip_path = os.path.join(tmp, "batch.zip")
+            excel().run_batch_export(jobs, zip_path, progress=show_progress)
+            with open(zip_path, "rb") as f:
+                st.download_button("📥 ZIPダウンロード", f.read(), "指導計画_一括.zip", mime="application/zip")
+
 
 
 
 # ==========================================
 # モードA：年間指導計画（修正版）
 # ==========================================
-if mode == "年間指導計画":
+if mode == MODE_ANNUAL:
     st.header(f"📅 {age} 年間指導計画")
 
     # ▼ AIアシスタント（年間用）
@@ -733,15 +870,22 @@ if mode == "年間指導計画":
         with c_ai1:
             ai_keywords = st.text_input("キーワード", placeholder="例：基本的生活習慣 信頼関係 自然との触れ合い")
         with c_ai2:
-            if st.button("✨ 年間目標作成"):
+            if ai_button("✨ 年間目標作成"):
                 if ai_keywords:
+                    count_generation("年間目標", age)
+                if ai_keywords and st.session_state.get("ai_background", True):
+                    start_job(f"{age} 年間目標", generate_annual_aim, age, ai_keywords, aim_examples(age, ai_keywords))
+                elif ai_keywords:
                     with st.spinner("AIが思考中..."):
                         # doc_type="年間指導計画" を指定
-                        gen_text = ask_gemini_aim(age, ai_keywords, doc_type="年間指導計画")
+                        gen_text = ask_gemini_aim(age, ai_keywords, doc_type="年間指導計画", examples=aim_examples(age, ai_keywords))
                         st.session_state["年間目標"] = gen_text # 保存用キーに直接入れる
                         st.success("作成しました！下の「年間目標」を確認してください。")
                 else:
                     st.error("キーワードを入れてください")
+            n_docs, n_regen = regeneration_stats()
+            if n_regen:
+                st.caption(f"作り直し {n_regen} 回")
 
     default_items = "園児の姿\nねらい\n養護（生命・情緒）\n教育（5領域）\n環境構成・援助\n保護者支援\n行事"
     mid_item_list = st.text_area("項目設定（改行区切り）", default_items).split('\n')
@@ -757,12 +901,12 @@ if mode == "年間指導計画":
 
     with t2:
         # ▼ ここからプルダウン化の処理
-        # 注意: TEIKEI_DATAにデータがないと選択肢が出ないので、
+        # 注意: 定型文データにないと選択肢が出ないので、
         # まだデータがない項目のために「自由入力」を必ず追加しています。
         cols = st.columns(4)
         
         # その年齢の定型文データを取得
-        age_data = TEIKEI_DATA.get(age, {})
+        age_data = get_templates(age)
         
         for i, term in enumerate(TERMS):
             with cols[i]:
@@ -788,10 +932,15 @@ if mode == "年間指導計画":
 
    
 
+    # 一括出力（ZIP）用に、この年齢の年間計画の設定を覚えておく
+    st.session_state['annual_configs'][age] = {'mid_items': mid_item_list, 'values': user_values, 'orientation': orient}
+
     if st.button("🚀 Excel作成"):
         config = {'mid_items': mid_item_list, 'values': user_values}
-        data = create_annual_excel(age, config, orient)
+        data = excel().create_annual_excel(age, config, orient)
         st.download_button("📥 ダウンロード", data, f"年間計画_{age}.xlsx")
+    print_preview("annual", lambda: layout_annual(age, {'mid_items': mid_item_list, 'values': user_values}, orient),
+                  f"年間計画_{age}.html")
         # ▼▼▼ プレビュー機能 ▼▼▼
     st.markdown("---")
     st.subheader("👀 仕上がりプレビュー")
@@ -799,29 +948,17 @@ if mode == "年間指導計画":
     with st.container(border=True):
         st.markdown("### 📅 年間指導計画表")
         
-        # データを表形式（DataFrame）に変換して表示
-        import pandas as pd
-        
-        # プレビュー用のデータを作る
-        preview_data = {}
-        for term in TERMS: # 1期, 2期...
-            term_values = []
-            for item in mid_item_list: # ねらい, 養護...
-                # 入力された値を取り出す
-                val = st.session_state.get('annual_data', {}).get(term, {}).get(item, "")
-                term_values.append(val)
-            preview_data[term] = term_values
-            
-        # 表を作成
-        df_preview = pd.DataFrame(preview_data, index=mid_item_list)
-        st.dataframe(df_preview, use_container_width=True)
+        # 入力された値を 項目（行）× 期（列）の表にして表示（HTML はデータが変わったときだけ作り直す）
+        annual_data = st.session_state.get('annual_data', {})
+        rows = tuple((item, tuple(annual_data.get(term, {}).get(item, "") for term in TERMS)) for item in mid_item_list)
+        st.html(annual_preview_html(rows))
     # ▲▲▲ プレビューここまで ▲▲▲
 
 # ==========================================
 # モードB：月案（ハイブリッド版）
 # ==========================================
 # ▼▼▼ 月案（完全決定版・全エラー修正済み）：ここからコピーして上書きしてください ▼▼▼
-elif "月案" in mode:
+elif mode == MODE_MONTHLY:
     st.header(f"🌙 {age} 月案作成")
     
     col_main1, col_main2 = st.columns([1, 2])
@@ -833,6 +970,7 @@ elif "月案" in mode:
         plan_type = st.radio("書式選択", 
                              ["週案形式（A4縦）", "領域別形式（A4横・5領域）"],
                              horizontal=True)
+        page = f"月案・{plan_type}"
 
     st.divider()
 
@@ -841,244 +979,161 @@ elif "月案" in mode:
     # ==========================================
     if "週案形式" in plan_type:
         st.caption("📅 週ごとのねらい・活動を積み上げる形式")
-        num_weeks = st.radio("今月の週数", [4, 5], horizontal=True)
+        # キー初期化（None対策）＋月ごとの保存・読み込み
+        sync_month_fields(age, selected_month, plan_defaults("月案_週構成"), "weekly_month", doc_type="月案_週構成")
+
+        num_weeks = st.radio("今月の週数", [4, 5], horizontal=True, key="num_weeks")
         target_weeks = list(range(1, num_weeks + 1))
-        
-        # キー初期化（None対策）
-        if "monthly_aim_area" not in st.session_state: st.session_state["monthly_aim_area"] = ""
-        for w in target_weeks:
-            for k in ["week_aim", "week_activity", "week_care"]:
-                if f"{k}_{w}" not in st.session_state or st.session_state[f"{k}_{w}"] is None:
-                    st.session_state[f"{k}_{w}"] = ""
 
         # AI生成エリア（週案）
         with st.container(border=True):
             st.subheader("🤖 AI週案作成")
             keyword = st.text_input("テーマ・キーワード", key="kw_weekly")
-            if st.button("✨ 作成開始（週案）"):
-                with st.spinner("週ごとの計画を構成中..."):
-                    try:
-                        prompt = f"""
-                        年齢:{age}, 月:{selected_month}, キーワード:{keyword}, 週数:{num_weeks}
-                        週ごとの月案(JSON)を作成せよ。
-                        
-                        【重要：絶対に空データ(null)にしないこと】
-                        値がない場合でも空文字 "" を入れること。
-                        
-                        キー構造: 
-                        {{
-                            "monthly_aim_sentence": "今月のねらい", 
-                            "1":{{"aim":"...", "activity":"...", "care":"..."}}, 
-                            ... 
-                        }}
-                        """
-                        model = genai.GenerativeModel('models/gemini-2.5-flash')
-                        res = model.generate_content(prompt)
-                        match = re.search(r'\{.*\}', res.text, re.DOTALL)
-                        if match:
-                            data = json.loads(match.group(0))
-                            # ★修正ポイント：Noneが来ても str(... or "") で空文字に変換
-                            st.session_state["monthly_aim_area"] = str(data.get("monthly_aim_sentence") or "")
-                            for w in target_weeks:
-                                w_str = str(w)
-                                if w_str in data:
-                                    st.session_state[f"week_aim_{w}"] = str(data[w_str].get("aim") or "")
-                                    st.session_state[f"week_activity_{w}"] = str(data[w_str].get("activity") or "")
-                                    st.session_state[f"week_care_{w}"] = str(data[w_str].get("care") or "")
-                            st.success("作成完了！")
-                            st.rerun()
-                    except Exception as e: st.error(f"Error: {e}")
-
-        # 入力エリア（週案）
-        # 表示直前にも念のためNoneチェック
-        if st.session_state.get("monthly_aim_area") is None: st.session_state["monthly_aim_area"] = ""
-        st.text_area("■ 今月のねらい", key="monthly_aim_area")
-        
-        for w in target_weeks:
-            with st.expander(f"第{w}週の計画", expanded=True):
-                # 表示直前チェック
-                for k in ["week_aim", "week_activity", "week_care"]:
-                    if st.session_state.get(f"{k}_{w}") is None: st.session_state[f"{k}_{w}"] = ""
-                
-                c1, c2, c3 = st.columns(3)
-                c1.text_area("週ねらい", key=f"week_aim_{w}", height=100)
-                c2.text_area("活動", key=f"week_activity_{w}", height=100)
-                c3.text_area("配慮", key=f"week_care_{w}", height=100)
+            if ai_button("✨ 作成開始（週案）"):
+                count_generation("月案_週構成", age, selected_month)
+                if st.session_state.get("ai_background", True):
+                    start_job(f"{age} {selected_month} 月案（週構成）", generate_monthly_weekly, age, selected_month, keyword, num_weeks,
+                              target=("月案_週構成", age, selected_month, "weekly_month"))
+                else:
+                    with st.spinner("週ごとの計画を構成中..."):
+                        try:
+                            values, problem = generate_monthly_weekly(age, selected_month, keyword, num_weeks,
+                                                                      on_wait=queue_status(), on_field=live_preview(), **ai_settings())
+                            if values:
+                                st.session_state.update(values)
+                                if problem:
+                                    st.warning(problem)
+                                else:
+                                    st.success("作成完了！")
+                                    st.rerun()
+                        except Exception as e: st.error(f"Error: {e}")
+
+        # 入力エリア（週案）: 1週ずつ st.fragment にする。プレビューは先に枠だけ作り、各週が自分の列を書き直す
+        editor = st.container()
 
         # プレビュー（週案）
         st.markdown("---")
         st.subheader("👀 プレビュー（全体確認）")
         cols = st.columns(num_weeks)
-        for i, w in enumerate(target_weeks):
-            with cols[i]:
-                st.info(f"**第{w}週**")
-                st.markdown(f"**ねらい**: {st.session_state.get(f'week_aim_{w}', '')}")
-                st.markdown(f"**活動**: {st.session_state.get(f'week_activity_{w}', '')}")
+
+        def week_preview(slot, w):
+            def draw():
+                with slot.container():
+                    st.info(f"**第{w}週**")
+                    st.markdown(f"**ねらい**: {st.session_state.get(f'week_aim_{w}', '')}")
+                    st.markdown(f"**活動**: {st.session_state.get(f'week_activity_{w}', '')}")
+            return draw
+
+        with editor:
+            fields_section("月案_週構成", age, selected_month, [("■ 今月のねらい", "monthly_aim_area", None)])
+            for i, w in enumerate(target_weeks):
+                week_section(age, selected_month, w, preview=week_preview(cols[i].empty(), w))
         
         # Excel作成ボタン（週案）
         st.markdown("")
         if st.button("🚀 Excel作成（週案）"):
-            conf = {'month': selected_month, 'num_weeks': num_weeks, 'monthly_aim': st.session_state.get("monthly_aim_area", ""), 'values': {}}
-            for w in target_weeks:
-                conf['values'][f"week_aim_{w}"] = st.session_state.get(f"week_aim_{w}", "")
-                conf['values'][f"week_activity_{w}"] = st.session_state.get(f"week_activity_{w}", "")
-                conf['values'][f"week_care_{w}"] = st.session_state.get(f"week_care_{w}", "")
-            
-            data = create_monthly_excel_weekly(age, conf)
+            data = excel().create_plan_excel(Plan.from_state("月案_週構成", age, selected_month, st.session_state))
             st.download_button("📥 ダウンロード", data, f"月案_{selected_month}_週構成.xlsx")
+        print_preview("monthly_weekly", lambda: plan_layout(Plan.from_state("月案_週構成", age, selected_month, st.session_state)),
+                      f"月案_{selected_month}_週構成.html")
 
     # ==========================================
     # パターンB：領域別形式（全修正済み）
     # ==========================================
     else:
         st.caption("📝 養護・教育（5領域）ごとに細かく計画する形式")
-        # キー初期化
-        keys = ["target_goal", "child_status"]
-        keys += [f"yogo_life_{k}" for k in ["aim", "env", "act", "care"]]
-        keys += [f"yogo_emo_{k}" for k in ["aim", "env", "act", "care"]]
-        for a in ["edu_health", "edu_rel", "edu_env", "edu_lang", "edu_exp"]:
-            keys += [f"{a}_{k}" for k in ["aim", "env", "act", "care"]]
-        for o in ["food", "safety", "parent"]:
-            keys += [f"{o}_{k}" for k in ["aim", "env", "act", "care"]]
-        
-        # None対策付き初期化
-        for k in keys:
-            if k not in st.session_state or st.session_state[k] is None:
-                st.session_state[k] = ""
+        # None対策付き初期化＋月ごとの保存・読み込み
+        month_store = sync_month_fields(age, selected_month, plan_defaults("月案_領域別"), "domain_month", doc_type="月案_領域別")
 
         # AI生成エリア（領域別）
         with st.container(border=True):
             st.subheader("🤖 AI領域別作成")
             keyword = st.text_input("テーマ・様子", key="kw_domain")
-            if st.button("✨ 作成開始（領域別）"):
-                with st.spinner("全部の欄を詳細に考えています..."):
-                    try:
-                        prompt = f"""
-                        あなたは日本の保育士です。月案（領域別）を作成してください。
-                        年齢:{age}, 月:{selected_month}, キーワード:{keyword}
-
-                        【重要：絶対に空欄を作らないこと】
-                        以下のJSON構造のすべての項目（aim, env, act, care）に具体的な内容を記述してください。
-                        特に「教育5領域の活動内容(act)」や、「その他（食育・安全・保護者）の環境(env)・活動(act)」も省略せずに必ず埋めること。
-                        ※保護者支援の活動(act)欄には、保護者の様子や参加内容を記述すること。
-
-                        出力形式(JSONのみ):
-                        {{
-                            "target_goal": "全体の保育目標",
-                            "child_status": "現在の子どもの姿", 
-                            "yogo":{{
-                                "life":{{"aim":"...", "env":"...", "act":"...", "care":"..."}}, 
-                                "emo":{{"aim":"...", "env":"...", "act":"...", "care":"..."}}
-                            }}, 
-                            "edu":{{
-                                "health":{{"aim":"...", "env":"...", "act":"...", "care":"..."}}, 
-                                "rel":{{"aim":"...", "env":"...", "act":"...", "care":"..."}}, 
-                                "env":{{"aim":"...", "env":"...", "act":"...", "care":"..."}}, 
-                                "lang":{{"aim":"...", "env":"...", "act":"...", "care":"..."}}, 
-                                "exp":{{"aim":"...", "env":"...", "act":"...", "care":"..."}}
-                            }}, 
-                            "others":{{
-                                "food":{{"aim":"...", "env":"...", "act":"...", "care":"..."}}, 
-                                "safety":{{"aim":"...", "env":"...", "act":"...", "care":"..."}}, 
-                                "parent":{{"aim":"...", "env":"...", "act":"...", "care":"..."}}
-                            }}
-                        }}
-                        """
-                        model = genai.GenerativeModel('models/gemini-2.5-flash')
-                        res = model.generate_content(prompt)
-                        match = re.search(r'\{.*\}', res.text, re.DOTALL)
-                        if match:
-                            data = json.loads(match.group(0))
-                            st.session_state["target_goal"] = str(data.get("target_goal") or "")
-                            st.session_state["child_status"] = str(data.get("child_status") or "")
-                            
-                            def set_vals_local(cat, p_map):
-                                section = data.get(cat, {})
-                                for sub_k, sub_p in p_map:
-                                    item = section.get(sub_k, {})
-                                    for f in ["aim", "env", "act", "care"]:
-                                        st.session_state[f"{sub_p}_{f}"] = str(item.get(f) or "")
-
-                            set_vals_local("yogo", [("life","yogo_life"),("emo","yogo_emo")])
-                            set_vals_local("edu", [("health","edu_health"),("rel","edu_rel"),("env","edu_env"),("lang","edu_lang"),("exp","edu_exp")])
-                            set_vals_local("others", [("food","food"),("safety","safety"),("parent","parent")])
-                            
-                            st.success("全ての項目を作成しました！")
-                            st.rerun()
-                    except Exception as e: st.error(f"Error: {e}")
-
-        # 入力エリア（領域別）
-        if st.session_state.get("target_goal") is None: st.session_state["target_goal"] = ""
-        st.text_area("保育目標", key="target_goal", height=60)
-        
-        if st.session_state.get("child_status") is None: st.session_state["child_status"] = ""
-        st.text_area("子どもの姿", key="child_status", height=60)
-        
-        t1, t2, t3 = st.tabs(["養護", "教育(5領域)", "その他"])
-        
-        with t1:
-            st.markdown("**生命**")
-            c1,c2,c3,c4=st.columns(4)
-            c1.text_area("ねらい",key="yogo_life_aim");c2.text_area("環境",key="yogo_life_env");c3.text_area("活動",key="yogo_life_act");c4.text_area("配慮",key="yogo_life_care")
-            st.markdown("**情緒**")
-            c1,c2,c3,c4=st.columns(4)
-            c1.text_area("ねらい",key="yogo_emo_aim");c2.text_area("環境",key="yogo_emo_env");c3.text_area("活動",key="yogo_emo_act");c4.text_area("配慮",key="yogo_emo_care")
-
-        with t2:
-            edu_map = [("健康","edu_health"), ("人間関係","edu_rel"), ("環境","edu_env"), ("言葉","edu_lang"), ("表現","edu_exp")]
-            for lbl, pf in edu_map:
-                st.markdown(f"**{lbl}**")
-                c1,c2,c3,c4=st.columns(4)
-                c1.text_area("ねらい",key=f"{pf}_aim",height=70);c2.text_area("環境",key=f"{pf}_env",height=70);c3.text_area("活動",key=f"{pf}_act",height=70);c4.text_area("配慮",key=f"{pf}_care",height=70)
-        
-        with t3:
-            oth_map = [("食育","food"), ("安全","safety"), ("保護者","parent")]
-            for lbl, pf in oth_map:
-                st.markdown(f"**{lbl}**")
-                c1,c2,c3,c4=st.columns(4)
-                c1.text_area("ねらい",key=f"{pf}_aim",height=70);c2.text_area("環境",key=f"{pf}_env",height=70);c3.text_area("活動",key=f"{pf}_act",height=70);c4.text_area("配慮",key=f"{pf}_care",height=70)
+            st.checkbox("養護・教育・その他に分けて同時に作成する（速い）", value=True, key="domain_parallel")
+            if ai_button("✨ 作成開始（領域別）"):
+                count_generation("月案_領域別", age, selected_month)
+                parallel = st.session_state.get("domain_parallel", True)
+                if st.session_state.get("ai_background", True):
+                    start_job(f"{age} {selected_month} 月案（領域別）", generate_domain_plan, age, selected_month, keyword, parallel,
+                              target=("月案_領域別", age, selected_month, "domain_month"))
+                else:
+                    with st.spinner("全部の欄を詳細に考えています..."):
+                        try:
+                            progress = st.empty()
+                            done = []
+                            def show_section(sec):
+                                done.append(DOMAIN_SECTIONS[sec][0])
+                                progress.markdown("\n".join(f"- ✅ {t}" for t in done))
+                            values, problem = generate_domain_plan(age, selected_month, keyword, parallel, on_section=show_section,
+                                                                   on_wait=queue_status(), on_field=live_preview(), **ai_settings())
+                            if values:
+                                # 入力欄はこの下で描画されるので、作れた分はそのまま表示される
+                                st.session_state.update(values)
+                                if problem:
+                                    st.warning(problem)
+                                else:
+                                    st.success("全ての項目を作成しました！")
+                                    st.rerun()
+                        except Exception as e: st.error(f"Error: {e}")
+
+        # 入力エリア（領域別）: 保育目標・養護・教育・その他をそれぞれ st.fragment にする
+        # （1つの欄を直しても、そのタブだけが再実行される）。プレビューは先に枠だけ作り、各タブが自分の行を書き直す
+        editor = st.container()
 
         # プレビュー（領域別）
         st.markdown("---")
         with st.expander("👀 ねらい一覧（プレビュー）", expanded=False):
             st.markdown("**【養護】**")
-            st.write(f"・生命: {st.session_state.get('yogo_life_aim','')}")
-            st.write(f"・情緒: {st.session_state.get('yogo_emo_aim','')}")
+            yogo_preview = st.empty()
             st.markdown("**【教育】**")
-            st.write(f"・健康: {st.session_state.get('edu_health_aim','')}")
-            st.write(f"・人間関係: {st.session_state.get('edu_rel_aim','')}")
-            st.write(f"・環境: {st.session_state.get('edu_env_aim','')}")
-            st.write(f"・言葉: {st.session_state.get('edu_lang_aim','')}")
-            st.write(f"・表現: {st.session_state.get('edu_exp_aim','')}")
+            edu_preview = st.empty()
+
+        def aim_preview(slot, rows):
+            def draw():
+                slot.markdown("  \n".join(f"・{lbl}: {st.session_state.get(f'{pf}_aim', '')}" for lbl, pf in rows))
+            return draw
+
+        yogo_map = [("生命","yogo_life"), ("情緒","yogo_emo")]
+        edu_map = [("健康","edu_health"), ("人間関係","edu_rel"), ("環境","edu_env"), ("言葉","edu_lang"), ("表現","edu_exp")]
+        oth_map = [("食育","food"), ("安全","safety"), ("保護者","parent")]
+        with editor:
+            fields_section("月案_領域別", age, selected_month, [("保育目標", "target_goal", 60), ("子どもの姿", "child_status", 60)])
+            t1, t2, t3 = st.tabs(["養護", "教育(5領域)", "その他"])
+            with t1:
+                domain_rows_section(age, selected_month, yogo_map, preview=aim_preview(yogo_preview, yogo_map))
+            with t2:
+                domain_rows_section(age, selected_month, edu_map, height=70, preview=aim_preview(edu_preview, edu_map))
+            with t3:
+                domain_rows_section(age, selected_month, oth_map, height=70)
 
         # Excel作成ボタン（領域別）
         st.markdown("")
         if st.button("🚀 Excel作成（領域別）"):
-            conf = {'month': selected_month, 'values': {}}
-            for k in st.session_state: conf['values'][k] = st.session_state[k]
-            data = create_monthly_excel_domain(age, conf)
+            # 画面の全部の値ではなく、領域別の欄だけを渡す
+            data = excel().create_plan_excel(Plan.from_state("月案_領域別", age, selected_month, st.session_state))
             st.download_button("📥 ダウンロード", data, f"月案_{selected_month}_領域別.xlsx")
+        print_preview("monthly_domain", lambda: plan_layout(Plan.from_state("月案_領域別", age, selected_month, st.session_state)),
+                      f"月案_{selected_month}_領域別.html")
+
+        if st.button("📚 1年分まとめてExcel作成（4月〜3月）"):
+            plans = {m: Plan.from_state("月案_領域別", age, m, v).values for m, v in month_store.items()}
+            data = excel().create_yearly_excel_domain(age, plans)
+            st.download_button("📥 1年分ダウンロード", data, f"月案_{age}_年間_領域別.xlsx")
 # ▲▲▲ 月案（完全決定版） 終わり ▲▲▲
 
 
 # ==========================================
 # モードC：週案（表示・Excel連携 修正版）
 # ==========================================
-elif mode == "週案":
+elif mode == MODE_WEEKLY:
     st.header(f"📅 {age} 週案")
     start_date = st.date_input("週の開始日")
 
     # セッションステートの初期化（重要！）
-    # ここで final_aim_area（ねらい欄のID）を初期化しておきます
-    if "final_aim_area" not in st.session_state:
-        st.session_state["final_aim_area"] = ""
-    
+    # final_aim_area（ねらい欄のID）と各曜日の欄を、年齢・週ごとに保存・読み込みします
     days = ["月", "火", "水", "木", "金", "土"]
-    for d in days:
-        key_list = [f"activity_{d}", f"care_{d}", f"tool_{d}"]
-        for k in key_list:
-            if k not in st.session_state:
-                st.session_state[k] = ""
+    week_id = start_date.isoformat()
+    sync_month_fields(age, week_id, plan_defaults("週案"), "weekly_plan_week", doc_type="週案")
 
     # ▼ 1. AI設定エリア
     with st.container(border=True):
@@ -1088,60 +1143,27 @@ elif mode == "週案":
                                       placeholder="例：冬 健康 室内遊び",
                                       key="keyword_field")
 
-        if st.button("✨ このキーワードで週案を作成する"):
+        if ai_button("✨ このキーワードで週案を作成する"):
             if not keyword_input:
                 st.error("キーワードを入力してください。")
+            elif st.session_state.get("ai_background", True):
+                count_generation("週案", age)
+                start_job(f"{age} 週案（{start_date:%m/%d}〜）", generate_weekly_plan, age, keyword_input,
+                          target=("週案", age, week_id, "weekly_plan_week"))
             else:
+                count_generation("週案", age)
                 with st.spinner("AIが文章を構成中..."):
                     try:
-                        prompt = f"""
-                        あなたはベテラン保育士です。以下の条件で週案を作成し、JSON形式のみを出力してください。
-                        
-                        【条件】
-                        ・対象年齢: {age}
-                        ・キーワード: {keyword_input}
-                        
-                        【重要：文体の統一】
-                        ・すべての文章（ねらい、活動、配慮、準備）の語尾は、「〜する」「〜である」といった「常体（普通体）」で統一すること。
-                        ・「〜ます」「〜です」といった敬語表現は一切使用しないこと（厳禁）。
-                        
-                        【指示】
-                        1. 「weekly_aim_sentence」には、キーワードを元にした1〜2文の適切な「ねらい」を生成すること。
-                        2. 月〜土の各項目も、キーワードに沿った内容にすること。
-                        3. 【冬】などのタグ、余計な挨拶は一切含めない。
-                        
-                        【出力フォーマット】
-                        {{
-                            "weekly_aim_sentence": "...",
-                            "月": {{"activity": "...", "care": "...", "tool": "..."}},
-                            "火": {{"activity": "...", "care": "...", "tool": "..."}},
-                            "水": {{"activity": "...", "care": "...", "tool": "..."}},
-                            "木": {{"activity": "...", "care": "...", "tool": "..."}},
-                            "金": {{"activity": "...", "care": "...", "tool": "..."}},
-                            "土": {{"activity": "...", "care": "...", "tool": "..."}}
-                        }}
-                        """
-                        model = genai.GenerativeModel('models/gemini-2.5-flash')
-                        response = model.generate_content(prompt)
-                        
-                        match = re.search(r'\{.*\}', response.text, re.DOTALL)
-                        if match:
-                            data = json.loads(match.group(0))
+                        values, problem = generate_weekly_plan(age, keyword_input, on_wait=queue_status(), on_field=live_preview(), **ai_settings())
+                        if values:
+                            # AIの結果を、画面の入力欄のID（final_aim_area, activity_月 など）に直接ねじ込みます
+                            st.session_state.update(values)
                             
-                            # ★★★ ここが修正ポイント ★★★
-                            # AIの結果を、画面の入力欄のID（final_aim_area）に直接ねじ込みます
-                            if "weekly_aim_sentence" in data:
-                                st.session_state["final_aim_area"] = data["weekly_aim_sentence"]
-                            
-                            # 各曜日のデータも同様に直接ねじ込みます
-                            for day in days:
-                                if day in data:
-                                    st.session_state[f"activity_{day}"] = data[day].get("activity", "")
-                                    st.session_state[f"care_{day}"] = data[day].get("care", "")
-                                    st.session_state[f"tool_{day}"] = data[day].get("tool", "")
-                            
-                            st.success("作成しました！下の欄を確認してください。")
-                            st.rerun() # 強制リロードして画面に反映させる
+                            if problem:
+                                st.warning(problem)
+                            else:
+                                st.success("作成しました！下の欄を確認してください。")
+                                st.rerun() # 強制リロードして画面に反映させる
                     except Exception as e:
                         st.error(f"エラー: {e}")
 
@@ -1149,122 +1171,65 @@ elif mode == "週案":
     st.markdown("---")
     st.subheader("📝 計画の確認・編集")
     
-    # ねらいの入力欄
-    # value=... を削除し、session_state経由で自動表示させます
-    final_aim = st.text_area("② 今週のねらい（AI生成・手修正可）", 
-                             key="final_aim_area", # このキーにデータが入っていれば表示されます
-                             height=100)
-
-    # 月〜土の入力欄
-    cols = st.columns(3)
-    for i, day in enumerate(days):
-        with cols[i%3]:
-            st.markdown(f"**{day}曜日**")
-            st.text_area("活動", key=f"activity_{day}", height=100)
-            st.text_area("配慮", key=f"care_{day}", height=120)
-            st.text_area("準備", key=f"tool_{day}", height=60)
+    # ねらいと月〜土の入力欄は、ねらい・1曜日ずつ st.fragment にする（中身は下のプレビューの枠を作ってから描く）
+    editor = st.container()
 
     # ▼ 3. Excel出力
     st.markdown("---")
     if st.button("🚀 Excel作成"):
-        # Excel作成用に現在の画面の値を集める辞書を作ります
-        # ★ここも修正：st.session_stateから確実に値を取ります
-        excel_values = {}
-        excel_values["weekly_aim"] = st.session_state.get("final_aim_area", "")
-        
-        for day in days:
-            excel_values[f"activity_{day}"] = st.session_state.get(f"activity_{day}", "")
-            excel_values[f"care_{day}"] = st.session_state.get(f"care_{day}", "")
-            excel_values[f"tool_{day}"] = st.session_state.get(f"tool_{day}", "")
-
-        config = {'week_range': start_date.strftime('%Y/%m/%d〜'), 'values': excel_values}
-        
-        # A4縦レイアウトの関数呼び出し
-        data = create_weekly_excel(age, config)
+        # 週案の欄（ねらい・各曜日の活動/配慮/準備）だけを集めて、A4縦レイアウトで作る
+        data = excel().create_plan_excel(Plan.from_state("週案", age, week_id, st.session_state))
         st.download_button("📥 ダウンロード", data, f"週案_{age}.xlsx")
+    print_preview("weekly_plan", lambda: plan_layout(Plan.from_state("週案", age, week_id, st.session_state)), f"週案_{age}.html")
                        
                            
        # ▼▼▼ プレビュー機能（修正版） ▼▼▼
     st.markdown("---")
     st.subheader("👀 仕上がりプレビュー")
     
-    # 紙のような白い枠を作る
+    # 紙のような白い枠を作る（中身は上の入力欄のまとまりが、それぞれ自分の分だけ書く）
     with st.container(border=True):
         st.markdown(f"#### 📅 週のねらい")
-        # user_values ではなく、st.session_state から直接値を取るように修正
-        aim_preview = st.session_state.get("final_aim_area", "（未入力）")
-        st.info(aim_preview)
+        aim_slot = st.empty()
         
         st.markdown("#### 📅 日ごとの計画")
         # 3列で表示して見やすくする
         pv_cols = st.columns(3)
-        days = ["月", "火", "水", "木", "金", "土"]
-        
-        for i, day in enumerate(days):
-            with pv_cols[i % 3]:
-                st.markdown(f"**【{day}曜日】**")
-                
-                # ここも st.session_state から取得
-                act = st.session_state.get(f"activity_{day}", "-")
-                care = st.session_state.get(f"care_{day}", "-")
-                tool = st.session_state.get(f"tool_{day}", "-")
-                
-                st.caption("▼活動")
-                st.write(act if act else "（未入力）")
-                
-                st.caption("▼配慮")
-                st.write(care if care else "（未入力）")
-                
-                st.caption("▼準備")
-                st.write(tool if tool else "（未入力）")
-                
-                st.divider() # 区切り線
+        day_slots = {day: pv_cols[i % 3].empty() for i, day in enumerate(days)}
     # ▲▲▲ プレビューここまで ▲▲▲
 
+    def weekly_aim_preview():
+        # user_values ではなく、st.session_state から直接値を取るように修正
+        aim_slot.info(st.session_state.get("final_aim_area", "（未入力）"))
 
+    def day_preview(day):
+        def draw():
+            with day_slots[day].container():
+                st.markdown(f"**【{day}曜日】**")
+                for label, k in [("▼活動", "activity"), ("▼配慮", "care"), ("▼準備", "tool")]:
+                    value = st.session_state.get(f"{k}_{day}", "-")
+                    st.caption(label)
+                    st.write(value if value else "（未入力）")
+                st.divider() # 区切り線
+        return draw
 
+    with editor:
+        # ねらいの入力欄（session_state経由で自動表示させます）
+        fields_section("週案", age, week_id, [("② 今週のねらい（AI生成・手修正可）", "final_aim_area", 100)], preview=weekly_aim_preview)
+        # 月〜土の入力欄
+        cols = st.columns(3)
+        for i, day in enumerate(days):
+            with cols[i%3]:
+                weekday_section(age, week_id, day, preview=day_preview(day))
 
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+# ==========================================
+# 画面の処理時間（今回の実行にかかった時間をサイドバーに出す）
+# ==========================================
+rerun_timer = get_rerun_timer()
+rerun_timer.record(page, time.perf_counter() - RERUN_STARTED)
+with rerun_slot.container():
+    with st.expander("⏱ 画面の処理時間"):
+        st.caption("入力のたびに画面を作り直すのにかかった時間（最新 / 中央値 / 最大・この画面を開いている全員分）")
+        for name, r in sorted(rerun_timer.stats().items()):
+            st.caption(f"{name}: {r['last'] * 1000:.0f} / {r['median'] * 1000:.0f} / {r['max'] * 1000:.0f} ms（{r['count']}回）")
@@ -0,0 +1,239 @@
+# Excel 作成・印刷イメージ（HTML）と AI 応答の読み取りのベンチマーク
+# 使い方: python benchmarks/bench.py [--repeat 5] [--json 結果.json] [--compare 前回の結果.json]
+# 各項目の 時間（中央値・最小）/ ピークメモリ（tracemalloc）/ 出力サイズ を表にする。
+# --cells を付けると、セルの書き込み速度（cells/s）をスタイルの付け方の前後で比べる。
+# Gemini は呼ばない（gemini_responses.json に記録した応答を使う）ので、ネットにつながっていなくても動く。
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ai_response import JsonFieldStream, parse_plan  # noqa: E402
+from io import BytesIO  # noqa: E402
+
+from openpyxl import Workbook  # noqa: E402
+
+from excel_builder import (  # noqa: E402
+    EXCEL_STYLES, ExcelStyler, _layout_cells, _write_layout,
+    create_annual_excel, create_monthly_excel_weekly, create_monthly_excel_domain,
+    create_weekly_excel, create_yearly_excel_domain,
+)
+from plan_model import TERMS, FISCAL_MONTHS  # noqa: E402
+from plan_layouts import layout_annual, layout_monthly_domain, layout_monthly_weekly, layout_weekly_plan  # noqa: E402
+from plan_model import Plan, PLAN_FIELDS  # noqa: E402
+from plan_preview import layout_html  # noqa: E402
+from teikei import all_templates  # noqa: E402
+
+AGE = "3歳児"
+RESPONSES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gemini_responses.json")
+
+
+class LongText:
+    # 定型文をつなげて、実際の計画に近い長さ（1欄 sentences 文）の日本語の文章を作る
+    def __init__(self):
+        self.pool = [t for domains in all_templates().values() for ts in domains.values() for t in ts]
+        self.i = 0
+
+    def __call__(self, sentences=4):
+        out = []
+        for _ in range(sentences):
+            out.append(self.pool[self.i % len(self.pool)])
+            self.i += 1
+        return "".join(out)
+
+
+def plan_values(doc_type, text, sentences):
+    values = {k: text(sentences) for k in PLAN_FIELDS[doc_type]}
+    if "num_weeks" in values:
+        values["num_weeks"] = 5
+    return values
+
+
+def annual_config(text, n_items, sentences):
+    items = [f"項目{i + 1}" for i in range(n_items)]
+    values = {"年間目標": text(sentences), "健康・安全": text(sentences)}
+    for item in items:
+        for t in TERMS:
+            values[f"{item}_{t}"] = text(sentences)
+    return {"values": values, "mid_items": items}
+
+
+def large_response(text, n_items=60, sentences=6):
+    # 長い応答: 年間計画の項目数を増やした形（約 n_items × 4期 の欄）。前置きの文章と ```json 付き
+    data = {"年間目標": text(sentences)}
+    for i in range(n_items):
+        data[f"項目{i + 1}"] = {t: text(sentences) for t in TERMS}
+    body = json.dumps(data, ensure_ascii=False, indent=1)
+    return f"承知しました。以下のとおり作成しました。\n```json\n{body}\n```\n"
+
+
+def broken(response):
+    # 修復が必要な形にする: 末尾の余計なカンマ・“ ” の引用符・最後が途中で切れている
+    return (response.replace('"\n }', '",\n }', 20).replace('"年間目標"', '“年間目標”')
+            [:int(len(response) * 0.9)])
+
+
+def cases():
+    text = LongText()
+    monthly_small = {"月案_週構成": plan_values("月案_週構成", text, 1) | {"num_weeks": 4},
+                     "月案_領域別": plan_values("月案_領域別", text, 1)}
+    monthly_large = {k: plan_values(k, text, 6) for k in ["月案_週構成", "月案_領域別"]}
+    week_small = plan_values("週案", text, 1)
+    week_large = plan_values("週案", text, 6)
+    annual_small = annual_config(text, 5, 1)
+    annual_large = annual_config(text, 40, 4)
+    year = {m: plan_values("月案_領域別", text, 4) for m in FISCAL_MONTHS}
+
+    def weekly_conf(values):
+        return Plan.from_state("月案_週構成", AGE, "4月", values).to_config()
+
+    def domain_conf(values):
+        return Plan.from_state("月案_領域別", AGE, "4月", values).to_config()
+
+    def week_conf(values):
+        return Plan.from_state("週案", AGE, "2025-04-07", values).to_config()
+
+    yield "年間計画 小（5項目）", lambda: create_annual_excel(AGE, annual_small, "横")
+    yield "年間計画 大（40項目）", lambda: create_annual_excel(AGE, annual_large, "横")
+    yield "月案 週構成 小（4週）", lambda: create_monthly_excel_weekly(AGE, weekly_conf(monthly_small["月案_週構成"]))
+    yield "月案 週構成 大（5週・長文）", lambda: create_monthly_excel_weekly(AGE, weekly_conf(monthly_large["月案_週構成"]))
+    yield "月案 領域別 小", lambda: create_monthly_excel_domain(AGE, domain_conf(monthly_small["月案_領域別"]))
+    yield "月案 領域別 大（長文）", lambda: create_monthly_excel_domain(AGE, domain_conf(monthly_large["月案_領域別"]))
+    yield "月案 領域別 大（write_only）", lambda: create_monthly_excel_domain(AGE, domain_conf(monthly_large["月案_領域別"]), write_only=True)
+    yield "月案 領域別 1年分（12シート）", lambda: create_yearly_excel_domain(AGE, year)
+    yield "週案 小", lambda: create_weekly_excel(AGE, week_conf(week_small))
+    yield "週案 大（長文）", lambda: create_weekly_excel(AGE, week_conf(week_large))
+    # 印刷イメージ: 同じレイアウト記述から Workbook を作らずに HTML にする（画面ではさらにキャッシュされる）
+    yield "印刷イメージ 年間計画 大（40項目）", lambda: layout_html(layout_annual(AGE, annual_large, "横")).encode()
+    yield "印刷イメージ 月案 領域別 大（長文）", lambda: layout_html(layout_monthly_domain(AGE, domain_conf(monthly_large["月案_領域別"]))).encode()
+    yield "印刷イメージ 週案 大（長文）", lambda: layout_html(layout_weekly_plan(AGE, week_conf(week_large))).encode()
+
+    with open(RESPONSES, encoding="utf-8") as f:
+        responses = json.load(f)["responses"]
+    for r in responses:
+        yield f"応答の読み取り: {r['name']}", (lambda t=r["text"]: json.dumps(parse_plan(t), ensure_ascii=False).encode())
+    # ストリーミング: 応答を 40 文字ずつ届いたことにして、欄ができるたびに取り出す
+    stream_text = responses[1]["text"]
+    large = large_response(text)
+    large_broken = broken(large)
+    size = f"約{len(large.encode()) // 1024}KB"
+    yield f"応答の読み取り: 大きな応答（{size}）", lambda: json.dumps(parse_plan(large), ensure_ascii=False).encode()
+    yield f"応答の読み取り: 大きな応答（{size}・壊れたJSON）", lambda: json.dumps(parse_plan(large_broken), ensure_ascii=False).encode()
+
+    def stream():
+        parser = JsonFieldStream()
+        fields = []
+        for i in range(0, len(stream_text), 40):
+            fields += parser.feed(stream_text[i:i + 40])
+        return json.dumps(fields, ensure_ascii=False).encode()
+    yield "ストリーミング読み取り（40文字ずつ）", stream
+
+    def stream_large():
+        parser = JsonFieldStream()
+        fields = []
+        for i in range(0, len(large), 40):
+            fields += parser.feed(large[i:i + 40])
+        return json.dumps(fields, ensure_ascii=False).encode()
+    yield f"ストリーミング読み取り: 大きな応答（{size}）", stream_large
+
+
+# --- セルの書き込み速度（cells/s） ---
+def plain_style(cell, name):
+    # 前のやり方: セルごとに Font / Alignment / Border / PatternFill を設定する（openpyxl が毎回登録し直す）
+    font, align, border, fill = EXCEL_STYLES[name]
+    if font is not None: cell.font = font
+    if align is not None: cell.alignment = align
+    if border is not None: cell.border = border
+    if fill is not None: cell.fill = fill
+    return cell
+
+
+def cell_layouts():
+    text = LongText()
+    weekly = Plan.from_state("月案_週構成", AGE, "4月", plan_values("月案_週構成", text, 4)).to_config()
+    domain = Plan.from_state("月案_領域別", AGE, "4月", plan_values("月案_領域別", text, 4)).to_config()
+    yield "年間計画（60項目）", layout_annual(AGE, annual_config(text, 60, 2), "横")
+    yield "月案 週構成（5週）", layout_monthly_weekly(AGE, weekly)
+    yield "月案 領域別", layout_monthly_domain(AGE, domain)
+
+
+def cells_per_second(layout, make_style, save, repeat):
+    n_cells = len(_layout_cells(layout))
+    times = []
+    for _ in range(repeat + 1):
+        t0 = time.perf_counter()
+        wb = Workbook()
+        _write_layout(wb.active, layout, make_style())
+        if save:
+            wb.save(BytesIO())
+        times.append(time.perf_counter() - t0)
+    return n_cells / statistics.median(times[1:])  # 1回目は数えない
+
+
+def cells_report(repeat):
+    stylers = [("前（セルごと）", lambda: plain_style), ("後（ExcelStyler）", ExcelStyler)]
+    print(f"{'項目':<30}{'保存':>6}" + "".join(f"{label:>18}" for label, _ in stylers) + f"{'倍率':>8}")
+    for name, layout in cell_layouts():
+        for save in (False, True):
+            rates = [cells_per_second(layout, make_style, save, repeat) for _, make_style in stylers]
+            print(f"{name:<30}{'あり' if save else 'なし':>6}" + "".join(f"{r:>16,.0f}/s" for r in rates)
+                  + f"{rates[1] / rates[0]:>7.2f}x")
+
+
+def measure(fn, repeat):
+    fn()  # 1回目（import やスタイルの準備）は数えない
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"median_ms": statistics.median(times) * 1000, "min_ms": min(times) * 1000,
+            "peak_kb": peak / 1024, "size_kb": len(out) / 1024 if out else 0.0}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Excel 作成・印刷イメージと AI 応答の読み取りのベンチマーク")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--json", help="結果を JSON で保存する（次回 --compare で比べられる）")
+    ap.add_argument("--compare", help="前回の結果（--json で保存したもの）と時間を比べる")
+    ap.add_argument("-k", default="", help="名前にこの文字を含む項目だけ測る")
+    ap.add_argument("--cells", action="store_true", help="セルの書き込み速度（cells/s）を前後で比べる")
+    args = ap.parse_args()
+
+    if args.cells:
+        cells_report(max(args.repeat, 20))
+        return
+
+    before = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            before = json.load(f)
+
+    results = {}
+    print(f"{'項目':<34}{'中央値ms':>10}{'最小ms':>10}{'ピークKB':>10}{'出力KB':>9}")
+    for name, fn in cases():
+        if args.k not in name:
+            continue
+        r = results[name] = measure(fn, args.repeat)
+        line = f"{name:<34}{r['median_ms']:>10.2f}{r['min_ms']:>10.2f}{r['peak_kb']:>10.0f}{r['size_kb']:>9.1f}"
+        if name in before:
+            line += f"  ({r['median_ms'] / before[name]['median_ms']:.2f}倍)"
+        print(line)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# 起動時（app.py の最初の実行）の import にかかる時間の確認
+# 使い方: python benchmarks/import_time.py [--budget-ms 1500] [--top 15]
+# app.py の一番外側の import だけを `python -X importtime` で読み込み、時間のかかったものを表にする。
+# 重いライブラリ（google.generativeai・openpyxl・pandas）は使うときに読み込む約束なので、
+# 起動時に読み込まれていたら（どこかで一番外側に import を足してしまったら）終了コード 1 で知らせる。
+import argparse
+import ast
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+LAZY_MODULES = ["google.generativeai", "openpyxl", "pandas"]
+_LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def startup_imports(path=APP):
+    # app.py の一番外側（関数の外）にある import のモジュール名
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names += [a.name for a in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            names.append(node.module)
+    return list(dict.fromkeys(names))
+
+
+def import_times(modules):
+    """
+    modules を新しいプロセスで import し、-X importtime の出力を読む。
+    戻り値: [(モジュール名, 自分の時間 us, 下も含めた時間 us, 深さ)]
+    """
+    code = "; ".join(f"import {m}" for m in modules) or "pass"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = _LINE_RE.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2))
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description="起動時の import 時間の確認")
+    ap.add_argument("--budget-ms", type=float, help="起動時の import の合計がこれを超えたら終了コード 1")
+    ap.add_argument("--top", type=int, default=15, help="表に出す数")
+    args = ap.parse_args()
+
+    modules = startup_imports()
+    rows = import_times(modules)
+    # Python 自体の起動で読み込まれるもの（site など）は数えない
+    python_startup = {r[0] for r in import_times([])}
+    top_level = [r for r in rows if r[3] == 0 and r[0] not in python_startup]
+    total_ms = sum(r[2] for r in top_level) / 1000
+
+    print(f"app.py の起動時の import: {len(modules)} 個 / 合計 {total_ms:.0f} ms")
+    for name, _, cumulative, _ in sorted(top_level, key=lambda r: -r[2])[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    problems = []
+    loaded = {r[0] for r in rows}
+    for lazy in LAZY_MODULES:
+        if lazy in loaded:
+            problems.append(f"{lazy} が起動時に読み込まれています（使うところで import してください）")
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        problems.append(f"合計 {total_ms:.0f} ms が上限 {args.budget_ms:.0f} ms を超えています")
+
+    # 参考: 後から読み込むライブラリの時間（最初のAI呼び出し・Excel作成・表の表示で1回だけかかる）
+    for lazy in LAZY_MODULES:
+        try:
+            cost = next(r[2] for r in import_times(modules + [lazy]) if r[0] == lazy and r[3] == 0)
+            print(f"  （後から読み込み） {cost / 1000:8.1f} ms  {lazy}")
+        except (RuntimeError, StopIteration):
+            pass
+
+    for p in problems:
+        print("NG:", p)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+# 保育指導計画の Excel 作成関数群（app.py から import して使う）
+# プロセスプールの子プロセスからも呼べるよう、Streamlit に依存しないモジュールに分けている
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from copy import copy
+from io import BytesIO
+
+from openpyxl import Workbook
+from openpyxl.styles import Alignment, Border, Side, Font, PatternFill
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.worksheet.worksheet import Worksheet
+
+from plan_model import Plan, FISCAL_MONTHS
+from plan_layouts import (
+    STYLES, cell_range, plan_layout, layout_annual,
+    layout_monthly_weekly, layout_monthly_domain, layout_weekly_plan,
+)
+
+# --- 1. 定数 ---
+# TERMS（年間計画の期）と FISCAL_MONTHS（4月〜3月）は plan_model にある（画面側が openpyxl なしで使えるように）
+# 各書式のレイアウト記述とスタイルの中身は plan_layouts にある（画面の印刷イメージと共有するため）
+
+
+# --- 2. Excel用スタイル定義（全Excel関数で共有） ---
+# Font/Border/Alignment/PatternFill はセルごとに作らず、ここで1回だけ作って使い回す
+_THIN = Side(style='thin')
+BORDER_ALL = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+ALIGN_CENTER = Alignment(horizontal="center", vertical="center", wrap_text=True)
+ALIGN_LEFT = Alignment(horizontal="left", vertical="top", wrap_text=True)
+_ALIGNS = {"center": ALIGN_CENTER, "left": ALIGN_LEFT}
+_FILLS = {}
+
+
+def _excel_style(spec):
+    # plan_layouts.STYLES の1件 → (font, alignment, border, fill)
+    font = None
+    if spec.get("font"):
+        name, size, bold = spec["font"]
+        font = Font(name=name, size=size, bold=bold or None)
+    fill = None
+    if spec.get("fill"):
+        fill = _FILLS.setdefault(spec["fill"], PatternFill(patternType='solid', fgColor=spec["fill"]))
+    return (font, _ALIGNS.get(spec.get("align")), BORDER_ALL if spec.get("border") else None, fill)
+
+
+# スタイル名 → (font, alignment, border, fill)。None の項目はセルに設定しない
+EXCEL_STYLES = {name: _excel_style(spec) for name, spec in STYLES.items()}
+
+
+class ExcelStyler:
+    """
+    ワークブック1冊分のスタイル適用係。
+    スタイル名ごとに最初の1セルだけ Font 等を登録し、2セル目以降は
+    登録済みのスタイル番号（StyleArray）をコピーするだけで済ませる。
+    """
+    def __init__(self):
+        self._arrays = {}
+
+    def __call__(self, cell, name):
+        arr = self._arrays.get(name)
+        if arr is not None:
+            cell._style = copy(arr)
+            return cell
+        font, align, border, fill = EXCEL_STYLES[name]
+        if font is not None: cell.font = font
+        if align is not None: cell.alignment = align
+        if border is not None: cell.border = border
+        if fill is not None: cell.fill = fill
+        self._arrays[name] = copy(cell._style)
+        return cell
+
+# --- 3. Excel作成関数群 ---
+
+def create_annual_excel(age, config, orientation, write_only=False):
+    return layout_to_excel([layout_annual(age, config, orientation)], write_only)
+
+
+# --- Excelレイアウト共通処理 ---
+# 各書式は plan_layouts で「レイアウト記述（dict）」を作るだけにして、Workbookへの書き出しは
+# layout_to_excel() にまとめる。通常モードと書き込み専用（write_only）モードで同じ見た目になる。
+def _layout_cells(layout):
+    # 結合セルの2マス目以降にも先頭セルと同じスタイル（罫線）を付ける。
+    # こうしないと結合範囲の右端・下端の罫線が消える。
+    cells = dict(layout['cells'])
+    for ref in layout['merges']:
+        min_row, min_col, max_row, max_col = cell_range(ref)
+        anchor = cells.get((min_row, min_col))
+        for r in range(min_row, max_row + 1):
+            for c in range(min_col, max_col + 1):
+                if (r, c) == (min_row, min_col):
+                    continue
+                cells[(r, c)] = (None, anchor[1]) if anchor else (None, None)
+    return sorted(cells.items())
+
+
+def _setup_sheet(ws, layout):
+    # write_only のシートには PAPERSIZE_A4 などの定数がないので Worksheet から取る
+    ws.page_setup.paperSize = Worksheet.PAPERSIZE_A4
+    ws.page_setup.orientation = Worksheet.ORIENTATION_LANDSCAPE if layout['landscape'] else Worksheet.ORIENTATION_PORTRAIT
+    ws.page_setup.fitToWidth = 1
+    ws.page_setup.fitToHeight = 1
+    if layout.get('fit_to_page'):
+        ws.sheet_properties.pageSetUpPr.fitToPage = True
+    if layout['margins']:
+        ws.page_margins.left, ws.page_margins.right = layout['margins']
+    for col, width in layout['widths'].items():
+        ws.column_dimensions[col].width = width
+    for row, height in layout['heights'].items():
+        ws.row_dimensions[row].height = height
+
+
+def _write_layout(ws, layout, style):
+    _setup_sheet(ws, layout)
+    for ref in layout['merges']:
+        ws.merge_cells(ref)
+    for (r, c), (value, name) in _layout_cells(layout):
+        cell = ws.cell(row=r, column=c)
+        if value is not None:
+            cell.value = value
+        if name is not None:
+            style(cell, name)
+
+
+def _stream_layout(ws, layout, style):
+    # write_only のシートは上から1行ずつ append するしかないので、行ごとにまとめて流す
+    _setup_sheet(ws, layout)
+    for ref in layout['merges']:
+        ws.merged_cells.add(ref)
+    rows = {}
+    for (r, c), (value, name) in _layout_cells(layout):
+        rows.setdefault(r, []).append((c, value, name))
+    for r in range(1, max(rows, default=0) + 1):
+        line = []
+        for c, value, name in rows.get(r, []):
+            line.extend([None] * (c - 1 - len(line)))
+            cell = WriteOnlyCell(ws, value=value)
+            if name is not None:
+                style(cell, name)
+            line.append(cell)
+        ws.append(line)
+
+
+def layout_to_excel(layouts, write_only=False):
+    """
+    レイアウト記述のリスト（1要素 = 1シート）から xlsx のバイト列を作る。
+    write_only=True だとセルを保持せずに書き出すので、一括出力でもメモリが増えない。
+    """
+    wb = Workbook(write_only=write_only)
+    style = ExcelStyler()
+    for i, layout in enumerate(layouts):
+        if write_only:
+            ws = wb.create_sheet(layout['title'])
+            _stream_layout(ws, layout, style)
+        else:
+            ws = wb.active if i == 0 else wb.create_sheet()
+            ws.title = layout['title']
+            _write_layout(ws, layout, style)
+    output = BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+# 1. 週案形式（A4縦）の月案
+def create_monthly_excel_weekly(age, config, write_only=False):
+    return layout_to_excel([layout_monthly_weekly(age, config)], write_only)
+
+# 2. 領域別形式（A4横）の月案
+def create_monthly_excel_domain(age, config, write_only=False):
+    return layout_to_excel([layout_monthly_domain(age, config)], write_only)
+
+
+# 3. 領域別形式を1年分（4月〜3月の12シート）まとめたExcelを作る関数
+def create_yearly_excel_domain(age, plans, write_only=False):
+    # plans: {"4月": {"target_goal": ..., "yogo_life_aim": ...}, ...}（データのない月は空欄のシート）
+    # スタイルと列幅の設定は1冊の中で12シートに使い回されるので、12回別々に作るより速く小さい
+    layouts = []
+    for month in FISCAL_MONTHS:
+        lay = layout_monthly_domain(age, {'month': month, 'values': plans.get(month, {})})
+        lay['title'] = month
+        layouts.append(lay)
+    return layout_to_excel(layouts, write_only)
+
+# 4. 週案（A4縦・月〜土）
+def create_weekly_excel(age, config, orient="P", write_only=False):
+    """
+    添付の週案フォーマット（A4縦）に合わせてExcelを作成する関数（orient="L" なら A4横）
+    """
+    return layout_to_excel([layout_weekly_plan(age, config, landscape=orient == "L")], write_only)
+
+
+def create_plan_excel(plan, write_only=False):
+    # plan_model.Plan（入力欄だけを持つ）から、書類の種類に合った Excel を作る
+    return layout_to_excel([plan_layout(plan)], write_only)
+
+# --- 4. 一括出力（全年齢 × 全月を1つのZIPに） ---
+def collect_batch_jobs(ages, monthly_data, annual_configs=None):
+    """
+    保存済みの計画データから、一括出力する Excel の一覧（ジョブ）を作る。
+    monthly_data: {年齢: {月: 入力内容}} / annual_configs: {年齢: create_annual_excel の config}
+    ジョブは (ZIP内のファイル名, 種類, 年齢, config) のタプル。
+    """
+    annual_configs = annual_configs or {}
+    jobs = []
+    for age in ages:
+        months = monthly_data.get(age, {})
+        for i, month in enumerate(FISCAL_MONTHS, 1):
+            vals = months.get(month, {})
+            # 子プロセスに送るのは各書式の欄だけ（月のデータには両方の書式の欄が入っている）
+            weekly_conf = Plan.from_state("月案_週構成", age, month, vals).to_config()
+            domain_conf = Plan.from_state("月案_領域別", age, month, vals).to_config()
+            jobs.append((f"{age}/{i:02d}_{month}_週構成.xlsx", "weekly", age, weekly_conf))
+            jobs.append((f"{age}/{i:02d}_{month}_領域別.xlsx", "domain", age, domain_conf))
+        if age in annual_configs:
+            jobs.append((f"{age}/年間計画.xlsx", "annual", age, annual_configs[age]))
+    return jobs
+
+
+def render_batch_job(job):
+    # プロセスプールの子プロセスで動く。戻り値（バイト列）だけが親プロセスに送られる
+    name, kind, age, config = job
+    if kind == "weekly":
+        data = create_monthly_excel_weekly(age, config, write_only=True)
+    elif kind == "domain":
+        data = create_monthly_excel_domain(age, config, write_only=True)
+    else:
+        data = create_annual_excel(age, config, config.get('orientation', "横"), write_only=True)
+    return name, data
+
+
+def export_batch_zip(jobs, out, max_workers=None, progress=None):
+    """
+    jobs をプロセスプールで並列に Excel 化し、できあがった順に ZIP（out: ファイル or BytesIO）へ書き込む。
+    同時に抱えるのは実行中のジョブ分（max_workers の2倍まで）だけなので、全ファイルを一度にメモリに持たない。
+    progress(完了数, 全体数) を1ファイルごとに呼ぶ。
+    Streamlit のサーバーからは直接呼ばず、run_batch_export()（別プロセスで動かす）を使うこと。
+    """
+    total = len(jobs)
+    max_workers = max_workers or min(4, os.cpu_count() or 1)
+    # 子プロセスは spawn で作る。スレッドがたくさん動いているプロセス（Streamlit のサーバー）で fork すると、
+    # fork した瞬間にほかのスレッドが持っていたロックのせいで子プロセスが止まることがある
+    ctx = multiprocessing.get_context("spawn")
+    done_count = 0
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zf, \
+            ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx) as pool:
+        pending = set()
+        queue = iter(jobs)
+        while True:
+            for job in queue:
+                pending.add(pool.submit(render_batch_job, job))
+                if len(pending) >= max_workers * 2:
+                    break
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                name, data = fut.result()
+                zf.writestr(name, data)
+                done_count += 1
+                if progress:
+                    progress(done_count, total)
+    return total
+
+
+def run_batch_export(jobs, path, max_workers=None, progress=None):
+    """
+    export_batch_zip を別の Python プロセス（python excel_builder.py）で動かし、ZIP を path に書く。
+    Streamlit のサーバーは __main__ を app.py に差し替えているので、そこから spawn すると子プロセスで
+    app.py（画面）がもう一度実行されてしまう。Streamlit と関係のないプロセスからプールを作ればその心配がない。
+    進み具合は子プロセスが1ファイルごとに「完了数 全体数」を1行ずつ出力するので、それを progress に渡す。
+    """
+    # stderr はファイルに書かせて最後に読む（パイプだと、子がたくさん書いたときに stdout を読む側と待ち合って止まる）
+    with tempfile.TemporaryFile() as err_file:
+        proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), path],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=err_file)
+        try:
+            proc.stdin.write(pickle.dumps((jobs, max_workers)))
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass  # 子プロセスが先に終わっている。理由は下で stderr から出す
+        for line in proc.stdout:
+            done, total = map(int, line.split())
+            if progress:
+                progress(done, total)
+        returncode = proc.wait()
+        err_file.seek(0)
+        err = err_file.read().decode("utf-8", "replace").strip()
+    if returncode != 0:
+        raise RuntimeError(f"一括出力に失敗しました: {err.splitlines()[-1] if err else returncode}")
+    return len(jobs)
+
+
+def _batch_main():
+    # run_batch_export から起動される。標準入力で (jobs, max_workers) を受け取り、ZIP を argv[1] に書く
+    jobs, max_workers = pickle.load(sys.stdin.buffer)
+
+    def report(done, total):
+        print(done, total, flush=True)
+    with open(sys.argv[1], "wb") as out:
+        export_batch_zip(jobs, out, max_workers, progress=report)
+
+
+if __name__ == "__main__":
+    _batch_main()
@@ -0,0 +1,79 @@
+# Gemini の応答キャッシュ（SQLite に保存）
+# 同じプロンプト・同じモデルへの問い合わせは API を呼ばずに保存済みの応答を返す。
+# 古いもの（TTL 切れ）は使わず、件数が上限を超えたら最後に使われたのが古い順に消す（LRU）。
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+
+def normalize_prompt(prompt):
+    # f文字列のインデントや空行の違いでキーが変わらないよう、行ごとに前後の空白を落として詰める
+    lines = [re.sub(r"\s+", " ", line).strip() for line in prompt.splitlines()]
+    return "\n".join(line for line in lines if line)
+
+
+def make_key(prompt, model_name):
+    text = f"{model_name}\n{normalize_prompt(prompt)}"
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    プロセス内の全セッションで共有する応答キャッシュ。
+    hits / misses はこのプロセスが起動してからの回数。
+    """
+    def __init__(self, path, ttl=7 * 24 * 3600, max_entries=1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, model TEXT, response TEXT, created REAL, last_used REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, prompt, model_name):
+        key = make_key(prompt, model_name)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, prompt, model_name, response):
+        key = make_key(prompt, model_name)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, model_name, response, now, now),
+            )
+            # TTL 切れを消してから、上限を超えた分を古い順（last_used）に消す
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": count}
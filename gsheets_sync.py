@@ -0,0 +1,92 @@
+# Google スプレッドシートとの計画の同期（st-gsheets-connection）
+# 園の計画の一覧をスプレッドシートで管理しているので、アプリの計画を読み込んだり書き出したりする。
+# シートは1行 = 1つの欄（年齢・書類・期間・欄・内容）。PlanStore と同じ形。
+# API の回数を抑えるため、読むときはシート全体を1回で読み（TTL の間は手元のコピーを使う）、
+# 書くときは内容が変わった行だけを batch_update 1回＋新しい行の append_rows 1回で送る（1セルずつは送らない）。
+import threading
+import time
+
+HEADER = ["年齢", "書類", "期間", "欄", "内容"]
+LAST_COL = chr(ord("A") + len(HEADER) - 1)
+
+
+def open_plan_worksheet(conn, worksheet="plans"):
+    """
+    st.connection("gsheets", type=GSheetsConnection) から gspread の Worksheet を取り出す。
+    st-gsheets-connection の read / update はシート全体の読み書きしかできないので、
+    範囲を指定して書くために中の gspread のシートを直接使う（サービスアカウントで接続したときだけ使える）。
+    """
+    client = conn.client
+    if not hasattr(client, "_select_worksheet"):
+        raise RuntimeError("スプレッドシートへの書き込みには、サービスアカウントでの接続設定が必要です。")
+    return client._select_worksheet(worksheet=worksheet)
+
+
+class SheetSync:
+    """
+    worksheet: gspread の Worksheet（get_all_values / batch_update / append_rows があればよい）
+    ttl: シートの内容を手元に持っておく秒数
+    """
+    def __init__(self, worksheet, ttl=300, clock=time.monotonic):
+        self.worksheet = worksheet
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._rows = None     # (年齢, 書類, 期間, 欄) → (シートの行番号, 内容)
+        self._last_row = 0    # データが入っている最後の行（ヘッダーは1行目）
+        self._loaded = None
+
+    def _load(self, force=False):
+        # シート全体を1回で読む。TTL の間は読み直さない
+        if not force and self._rows is not None and self._clock() - self._loaded < self.ttl:
+            return
+        values = self.worksheet.get_all_values()
+        rows = {}
+        for i, row in enumerate(values[1:], start=2):
+            row = (list(row) + [""] * len(HEADER))[:len(HEADER)]
+            if any(row[:4]):
+                rows[tuple(row[:4])] = (i, row[4])
+        self._rows = rows
+        self._last_row = len(values)
+        self._loaded = self._clock()
+
+    def pull(self, force=False):
+        # シートの計画を {(年齢, 書類, 期間): {欄: 内容}} で返す（値はすべて文字列）
+        with self._lock:
+            self._load(force)
+            plans = {}
+            for (age, doc_type, period, field), (_, value) in self._rows.items():
+                plans.setdefault((age, doc_type, period), {})[field] = value
+            return plans
+
+    def push(self, plans):
+        """
+        plans（pull と同じ形）をシートに書く。シートと同じ内容の行は送らない。
+        戻り値: (書き換えた行数, 追加した行数)
+        """
+        with self._lock:
+            self._load(force=True)  # 他の人が書いた分とずれないよう、書く前は必ず読み直す
+            updates = []
+            appends = []
+            for (age, doc_type, period), values in plans.items():
+                for field, value in values.items():
+                    key = (age, doc_type, period, field)
+                    text = "" if value is None else str(value)
+                    if key in self._rows:
+                        row, old = self._rows[key]
+                        if old != text:
+                            updates.append({"range": f"A{row}:{LAST_COL}{row}", "values": [list(key) + [text]]})
+                            self._rows[key] = (row, text)
+                    else:
+                        appends.append(list(key) + [text])
+            if updates:
+                self.worksheet.batch_update(updates)
+            if appends:
+                # 空のシートならヘッダーから書く
+                header = [HEADER] if self._last_row == 0 else []
+                self.worksheet.append_rows(header + appends)
+                self._last_row += len(header)
+                for row in appends:
+                    self._last_row += 1
+                    self._rows[tuple(row[:4])] = (self._last_row, row[4])
+            return len(updates), len(appends)
@@ -0,0 +1,76 @@
+# AI作成をバックグラウンドで動かすための仕組み
+# ボタンを押したら作成をスレッドに任せて、画面はすぐに操作できるようにする。
+# ジョブはサーバープロセスで1つの JobRunner に登録し、各セッションは自分のジョブID だけを覚えておく。
+# スレッドの中では st.* を使えないので、結果はジョブに入れておき、画面側（再実行のとき）で反映する。
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    """
+    1件のAI作成。status は "待機中" → "作成中" → "完了" / "失敗"。
+    progress: 画面に出す途中経過（スレッドの中から書き換える）
+    meta: 結果をどこに入れるかなど、画面側で使う情報
+    """
+    def __init__(self, label, meta=None):
+        self.id = uuid.uuid4().hex[:8]
+        self.label = label
+        self.meta = meta or {}
+        self.status = "待機中"
+        self.progress = ""
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in ("完了", "失敗")
+
+    def elapsed(self):
+        return (self.finished_at or time.time()) - self.created
+
+
+class JobRunner:
+    """
+    スレッドプールでジョブを動かす。終わったジョブは discard されるまで結果を持っておく
+    （取りに来ないまま keep 秒たったものは、次に submit したときに消す）。
+    """
+    def __init__(self, max_workers=4, keep=3600):
+        self.keep = keep
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, label, fn, *args, meta=None, **kwargs):
+        """fn(job, *args, **kwargs) をバックグラウンドで呼ぶ。戻り値が job.result になる"""
+        job = Job(label, meta)
+        with self._lock:
+            now = time.time()
+            for old in [j for j in self._jobs.values() if j.finished and now - j.finished_at > self.keep]:
+                del self._jobs[old.id]
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = "作成中"
+        try:
+            job.result = fn(job, *args, **kwargs)
+            status = "完了"
+        except Exception as e:
+            job.error = e
+            status = "失敗"
+        # finished_at を先に入れてから「終わった」ことにする（画面側がすぐに読みに来るため）
+        job.finished_at = time.time()
+        job.status = status
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def discard(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
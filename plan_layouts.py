@@ -0,0 +1,220 @@
+# 計画の書式（レイアウト記述）
+# Excel の書き出し（excel_builder.layout_to_excel）と画面の印刷イメージ（plan_preview.layout_html）が
+# 同じレイアウト記述を使うので、ダウンロードした Excel とプレビューの見た目がずれない。
+# openpyxl に依存しないので、画面側で読み込んでも起動は遅くならない。
+import re
+
+from plan_model import TERMS, WEEK_DAYS
+
+# --- スタイル定義（Excel とプレビューで共有） ---
+# スタイル名 → 書式。font: (フォント名, 大きさ, 太字) / align: "center"（中央）か "left"（左上） /
+# border: 細い罫線で囲む / fill: 背景色。ない項目は設定しない（Excel の標準のまま）
+_MEIRYO = "Meiryo UI"
+STYLES = {
+    # 年間指導計画
+    "annual_title": {"font": (None, 16, True)},
+    "annual_head": {"border": True, "fill": "F2F2F2"},
+    "annual_body": {"align": "left", "border": True},
+    "annual_border": {"border": True},
+    # 月案（週構成・A4縦）
+    "weekly_title": {"font": (_MEIRYO, 14, True), "align": "center"},
+    "weekly_section": {"font": (_MEIRYO, 11, True), "border": True, "fill": "E2EFDA"},
+    "weekly_head": {"font": (_MEIRYO, 11, True), "align": "center", "border": True, "fill": "D9E1F2"},
+    "weekly_label": {"font": (_MEIRYO, 11, True), "align": "center", "border": True},
+    "weekly_body": {"font": (_MEIRYO, 10, False), "align": "left", "border": True},
+    # 月案（領域別・A4横）
+    "domain_title": {"font": (_MEIRYO, 14, True)},
+    "domain_head": {"font": (_MEIRYO, 10, True), "align": "center", "border": True, "fill": "B4C6E7"},
+    "domain_sub": {"font": (_MEIRYO, 10, True), "align": "center", "border": True, "fill": "D9E1F2"},
+    "domain_body": {"font": (_MEIRYO, 9, False), "align": "left", "border": True},
+}
+
+
+# --- レイアウト記述 ---
+# 各書式は「レイアウト記述（dict）」を作るだけにして、書き出しは Excel / HTML の側でする。
+#   title: シート名 / landscape: A4横なら True / margins: (左, 右) or None
+#   widths: {列記号: 幅} / heights: {行: 高さ} / fit_to_page: 1ページに収めるなら True
+#   merges: ["A1:D1", ...] / cells: {(行, 列): (値, スタイル名)}
+def new_layout(title, landscape, widths, margins=None):
+    return {'title': title, 'landscape': landscape, 'margins': margins,
+            'widths': widths, 'heights': {}, 'merges': [], 'cells': {}}
+
+
+_REF_RE = re.compile(r"^([A-Z]+)(\d+):([A-Z]+)(\d+)$")
+
+
+def column_index(letters):
+    # "A" → 1, "AA" → 27
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n
+
+
+def cell_range(ref):
+    # "A3:D6" → (最小の行, 最小の列, 最大の行, 最大の列)
+    m = _REF_RE.match(ref)
+    if not m:
+        raise ValueError(f"セル範囲の形式ではありません: {ref}")
+    c1, r1, c2, r2 = m.groups()
+    return int(r1), column_index(c1), int(r2), column_index(c2)
+
+
+# 年間指導計画
+def layout_annual(age, config, orientation="横"):
+    # config: {'mid_items': ["ねらい", ...], 'values': {"年間目標": ..., "ねらい_1期(4-5月)": ...}}
+    lay = new_layout(f"年間指導計画({age})", orientation == "横", {})
+    lay['fit_to_page'] = True
+    cells = lay['cells']
+    vals = config.get('values', {})
+
+    lay['merges'].append('A1:C1')
+    cells[(1, 1)] = (f"年間指導計画 ({age})", "annual_title")
+
+    row = 3
+    for label in ["年間目標", "健康・安全"]:
+        lay['merges'] += [f"A{row}:A{row+1}", f"B{row}:E{row+1}"]
+        cells[(row, 1)] = (label, "annual_head")
+        cells[(row+1, 1)] = (None, "annual_border")
+        cells[(row, 2)] = (vals.get(label, ""), "annual_body")
+        row += 2
+
+    # 4期メイン
+    cells[(row, 1)] = ("項目 / 期", "annual_head")
+    for i, t_name in enumerate(TERMS, 2):
+        cells[(row, i)] = (t_name, "annual_head")
+    row += 1
+
+    for item in config.get('mid_items', []):
+        cells[(row, 1)] = (item, "annual_head")
+        for i, t_name in enumerate(TERMS, 2):
+            cells[(row, i)] = (vals.get(f"{item}_{t_name}", ""), "annual_body")
+        row += 1
+    return lay
+
+
+# 1. 週案形式（A4縦）の月案
+def layout_monthly_weekly(age, config):
+    lay = new_layout("月案_週構成", False, {'A': 6, 'B': 20, 'C': 30, 'D': 25})
+    cells = lay['cells']
+
+    month_str = config.get('month', '○月')
+    lay['merges'].append('A1:D1')
+    cells[(1, 1)] = (f"【{age}】 {month_str} 月案（週構成）", "weekly_title")
+
+    lay['merges'].append('A2:D2')
+    cells[(2, 1)] = ("■ 今月のねらい", "weekly_section")
+    lay['merges'].append('A3:D6')
+    cells[(3, 1)] = (config.get('monthly_aim', ''), "weekly_body")
+
+    headers = ["週", "週のねらい", "活動内容", "環境・配慮"]
+    for i, h in enumerate(headers, 1):
+        cells[(7, i)] = (h, "weekly_head")
+
+    current_row = 8
+    num_weeks = config.get('num_weeks', 5)
+    vals = config.get('values', {})
+
+    for w in range(1, num_weeks + 1):
+        lay['heights'][current_row] = 90 if num_weeks == 4 else 75
+        cells[(current_row, 1)] = (f"第{w}週", "weekly_label")
+
+        items = [f"week_aim_{w}", f"week_activity_{w}", f"week_care_{w}"]
+        for idx, key in enumerate(items, 2):
+            cells[(current_row, idx)] = (vals.get(key, ""), "weekly_body")
+        current_row += 1
+    return lay
+
+
+# 2. 領域別形式（A4横）の月案
+def layout_monthly_domain(age, config):
+    lay = new_layout("月案_領域別", True, {'A': 5, 'B': 8, 'C': 32, 'D': 32, 'E': 32, 'F': 32}, margins=(0.5, 0.5))
+    cells = lay['cells']
+    cols = [("aim", 3), ("env", 4), ("act", 5), ("care", 6)]
+
+    month_str = config.get('month', '○月')
+    lay['merges'].append('A1:F1')
+    cells[(1, 1)] = (f"{month_str}   月間指導計画（領域別）   {age}", "domain_title")
+
+    vals = config.get('values', {})
+
+    lay['merges'] += ['A2:A3', 'B2:F3']
+    cells[(2, 1)] = ("保育目標", "domain_head")
+    cells[(2, 2)] = (vals.get("target_goal", ""), "domain_body")
+
+    lay['merges'] += ['A4:A5', 'B4:F5']
+    cells[(4, 1)] = ("子どもの姿", "domain_head")
+    cells[(4, 2)] = (vals.get("child_status", ""), "domain_body")
+
+    headers = ["年間区別", "", "ねらい", "環境・構成", "予想される子どもの活動", "配慮事項"]
+    for i, h in enumerate(headers, 1):
+        cells[(6, i)] = (h, "domain_head")
+    lay['merges'].append('A6:B6')
+
+    current_row = 7
+
+    # 養護ブロック・教育ブロック（左端に縦結合の見出し）
+    blocks = [
+        ("養護", [("生命", "yogo_life"), ("情緒", "yogo_emo")]),
+        ("教育", [("健康", "edu_health"), ("人間関係", "edu_rel"), ("環境", "edu_env"), ("言葉", "edu_lang"), ("表現", "edu_exp")]),
+    ]
+    for block_label, rows in blocks:
+        start = current_row
+        for label_b, key_prefix in rows:
+            lay['heights'][current_row] = 60
+            cells[(current_row, 2)] = (label_b, "domain_sub")
+            for k, idx in cols:
+                cells[(current_row, idx)] = (vals.get(f"{key_prefix}_{k}", ""), "domain_body")
+            current_row += 1
+        lay['merges'].append(f"A{start}:A{current_row-1}")
+        cells[(start, 1)] = (block_label, "domain_head")
+
+    # その他ブロック
+    others = [("食育", "food"), ("健康・安全", "safety"), ("保護者支援", "parent")]
+    for label, key in others:
+        lay['heights'][current_row] = 50
+        cells[(current_row, 1)] = (label, "domain_head")
+        lay['merges'].append(f"A{current_row}:B{current_row}")
+        for k, idx in cols:
+            cells[(current_row, idx)] = (vals.get(f"{key}_{k}", ""), "domain_body")
+        current_row += 1
+    return lay
+
+
+# 3. 週案（A4縦・月〜土）
+def layout_weekly_plan(age, config, landscape=False):
+    # config: {'week_range': "2025/04/07〜", 'values': {"weekly_aim": ..., "activity_月": ..., "care_月": ..., "tool_月": ...}}
+    lay = new_layout("週案", landscape, {'A': 7, 'B': 32, 'C': 32, 'D': 20})
+    cells = lay['cells']
+    vals = config.get('values', {})
+
+    lay['merges'].append('A1:D1')
+    cells[(1, 1)] = (f"【{age}】 週案   {config.get('week_range', '')}", "weekly_title")
+
+    lay['merges'].append('A2:D2')
+    cells[(2, 1)] = ("■ 今週のねらい", "weekly_section")
+    lay['merges'].append('A3:D5')
+    cells[(3, 1)] = (vals.get("weekly_aim", ""), "weekly_body")
+
+    headers = ["曜日", "活動内容", "環境・配慮", "準備"]
+    for i, h in enumerate(headers, 1):
+        cells[(6, i)] = (h, "weekly_head")
+
+    current_row = 7
+    for day in WEEK_DAYS:
+        lay['heights'][current_row] = 95
+        cells[(current_row, 1)] = (day, "weekly_label")
+        for idx, key in enumerate(["activity", "care", "tool"], 2):
+            cells[(current_row, idx)] = (vals.get(f"{key}_{day}", ""), "weekly_body")
+        current_row += 1
+    return lay
+
+
+def plan_layout(plan):
+    # plan_model.Plan から、書類の種類に合ったレイアウト記述を作る
+    config = plan.to_config()
+    if plan.doc_type == "月案_週構成":
+        return layout_monthly_weekly(plan.age, config)
+    if plan.doc_type == "月案_領域別":
+        return layout_monthly_domain(plan.age, config)
+    return layout_weekly_plan(plan.age, config)
@@ -0,0 +1,63 @@
+# 計画のデータ（書類ごとの入力欄）
+# 画面の st.session_state には入力欄以外（ボタン、AIの設定、キャッシュなど）も入っているので、
+# Excel を作るときや保存・一括出力のときは、ここで決めた欄だけを取り出した Plan を使う。
+from dataclasses import dataclass, field
+from datetime import date
+
+TERMS = ["1期(4-5月)", "2期(6-8月)", "3期(9-12月)", "4期(1-3月)"]  # 年間計画の期
+FISCAL_MONTHS = [f"{m}月" for m in [4, 5, 6, 7, 8, 9, 10, 11, 12, 1, 2, 3]]  # 4月〜3月
+DOMAIN_COLUMNS = ["aim", "env", "act", "care"]  # ねらい・環境構成・予想される活動・配慮
+DOMAIN_ROWS = ["yogo_life", "yogo_emo", "edu_health", "edu_rel", "edu_env", "edu_lang", "edu_exp",
+               "food", "safety", "parent"]
+WEEK_DAYS = ["月", "火", "水", "木", "金", "土"]
+MAX_WEEKS = 5
+
+# 書類の種類 → 入力欄のキー（画面の入力欄の key と同じ）
+PLAN_FIELDS = {
+    "月案_週構成": ("num_weeks", "monthly_aim_area") + tuple(
+        f"{k}_{w}" for w in range(1, MAX_WEEKS + 1) for k in ["week_aim", "week_activity", "week_care"]),
+    "月案_領域別": ("target_goal", "child_status") + tuple(
+        f"{row}_{col}" for row in DOMAIN_ROWS for col in DOMAIN_COLUMNS),
+    "週案": ("final_aim_area",) + tuple(
+        f"{k}_{d}" for d in WEEK_DAYS for k in ["activity", "care", "tool"]),
+}
+
+
+def plan_defaults(doc_type):
+    # 画面の入力欄の初期値（週数だけは数値）
+    return {k: 4 if k == "num_weeks" else "" for k in PLAN_FIELDS[doc_type]}
+
+
+@dataclass(slots=True)
+class Plan:
+    """
+    1つの書類の入力内容。period は月案なら「4月」、週案なら週の開始日（2025-04-07 の形）。
+    values には PLAN_FIELDS の欄だけが入る。
+    """
+    doc_type: str
+    age: str
+    period: str
+    values: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_state(cls, doc_type, age, period, state):
+        # state（st.session_state や保存済みの dict）からこの書類の欄だけを取り出す
+        values = {}
+        for k in PLAN_FIELDS[doc_type]:
+            v = state.get(k)
+            if v is not None:
+                values[k] = v
+        return cls(doc_type, age, period, values)
+
+    def to_config(self):
+        # excel_builder の各関数に渡す config
+        vals = self.values
+        if self.doc_type == "月案_週構成":
+            return {'month': self.period, 'num_weeks': int(vals.get('num_weeks') or 5),
+                    'monthly_aim': vals.get('monthly_aim_area', ''), 'values': vals}
+        if self.doc_type == "月案_領域別":
+            return {'month': self.period, 'values': vals}
+        excel_values = {"weekly_aim": vals.get("final_aim_area", "")}
+        for k in PLAN_FIELDS["週案"][1:]:
+            excel_values[k] = vals.get(k, "")
+        return {'week_range': date.fromisoformat(self.period).strftime('%Y/%m/%d〜'), 'values': excel_values}
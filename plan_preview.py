@@ -0,0 +1,121 @@
+# 計画のプレビュー用 HTML
+# 画面のプレビューは pandas の DataFrame を使わず、入力内容から直接 HTML の表を作る（pandas を読み込まずに済む）。
+# 作った HTML は app.py 側で st.cache_data に入れ、入力内容が変わったときだけ作り直す。
+# layout_html は Excel と同じレイアウト記述（plan_layouts）から表を作るので、印刷イメージがダウンロードと一致する。
+from html import escape
+
+from plan_layouts import STYLES, cell_range, column_index
+
+TABLE_STYLE = "border-collapse:collapse;width:100%;table-layout:fixed;font-size:0.85rem"
+HEAD_STYLE = "border:1px solid #999;background:#F2F2F2;padding:4px;text-align:center;font-weight:bold"
+BODY_STYLE = "border:1px solid #999;padding:4px;vertical-align:top;text-align:left"
+
+
+def cell_text(value):
+    # セルの文字を HTML にする（改行はそのまま改行で見せる）
+    return escape("" if value is None else str(value)).replace("\n", "<br>")
+
+
+def grid_html(corner, columns, rows):
+    """
+    見出し付きの表。columns: 列の見出し / rows: [(行の見出し, [各列の値])]
+    例: 年間計画なら grid_html("項目 / 期", TERMS, [("ねらい", [1期の文, 2期の文, ...]), ...])
+    """
+    head = "".join(f'<th style="{HEAD_STYLE}">{cell_text(c)}</th>' for c in [corner] + list(columns))
+    body = []
+    for label, values in rows:
+        cells = "".join(f'<td style="{BODY_STYLE}">{cell_text(v)}</td>' for v in values)
+        body.append(f'<tr><th style="{HEAD_STYLE}">{cell_text(label)}</th>{cells}</tr>')
+    return f'<table style="{TABLE_STYLE}"><thead><tr>{head}</tr></thead><tbody>{"".join(body)}</tbody></table>'
+
+
+# --- Excel と同じレイアウトの印刷イメージ ---
+DEFAULT_WIDTH = 8.43    # Excel の標準の列幅（文字数）
+DEFAULT_HEIGHT = 15     # Excel の標準の行の高さ（pt）
+DEFAULT_FONT = ("Calibri", 11)
+SHEET_STYLE = "border-collapse:collapse;table-layout:fixed;width:100%;background:#fff;color:#000"
+_CELL_BASE = "padding:1px 3px;overflow:hidden;word-break:break-all"
+
+
+def column_px(width):
+    # Excel の列幅（標準フォントの文字数）→ 画面のピクセル数
+    return int(width * 7 + 5)
+
+
+def style_css(name):
+    # plan_layouts.STYLES の1件 → CSS の宣言
+    spec = STYLES.get(name, {}) if name else {}
+    font_name, size, bold = spec.get("font") or (None, None, False)
+    css = [f"font-family:'{font_name or DEFAULT_FONT[0]}',sans-serif", f"font-size:{size or DEFAULT_FONT[1]}pt"]
+    if bold:
+        css.append("font-weight:bold")
+    align = spec.get("align")
+    if align == "center":
+        css.append("text-align:center;vertical-align:middle;white-space:normal")
+    elif align == "left":
+        css.append("text-align:left;vertical-align:top;white-space:normal")
+    else:
+        # 配置を決めていないセルは Excel の標準（下寄せ・折り返さない）
+        css.append("text-align:left;vertical-align:bottom;white-space:nowrap")
+    if spec.get("border"):
+        css.append("border:1px solid #000")
+    if spec.get("fill"):
+        css.append(f"background:#{spec['fill']}")
+    return ";".join(css)
+
+
+# セルの書式は td ごとに書かず、スタイル名ごとのクラスにする（長い計画でも HTML が大きくならない）
+SHEET_CSS = (f".plan-sheet{{{SHEET_STYLE}}} .plan-sheet td{{{_CELL_BASE};{style_css(None)}}} "
+             + " ".join(f".plan-sheet td.{name}{{{style_css(name)}}}" for name in STYLES))
+
+
+def layout_html(layout):
+    """
+    レイアウト記述（plan_layouts の new_layout で作る dict）を HTML の表にする。
+    結合セルは rowspan / colspan、列幅は Excel の幅の比率、行の高さは pt でそのまま使う。
+    表は画面（印刷なら用紙）の幅に合わせて縮む（Excel の「横1ページに収める」と同じ）。
+    """
+    spans = {}
+    covered = set()
+    n_rows = max([r for r, _ in layout['cells']] + list(layout['heights']), default=0)
+    n_cols = max([c for _, c in layout['cells']] + [column_index(k) for k in layout['widths']], default=0)
+    for ref in layout['merges']:
+        r1, c1, r2, c2 = cell_range(ref)
+        spans[(r1, c1)] = (r2 - r1 + 1, c2 - c1 + 1)
+        covered.update((r, c) for r in range(r1, r2 + 1) for c in range(c1, c2 + 1))
+        n_rows, n_cols = max(n_rows, r2), max(n_cols, c2)
+
+    widths = {column_index(k): column_px(v) for k, v in layout['widths'].items()}
+    px = [widths.get(c, column_px(DEFAULT_WIDTH)) for c in range(1, n_cols + 1)]
+    total = sum(px) or 1
+    cols = "".join(f'<col style="width:{w / total:.2%}">' for w in px)
+
+    rows = []
+    for r in range(1, n_rows + 1):
+        tds = []
+        for c in range(1, n_cols + 1):
+            if (r, c) in covered and (r, c) not in spans:
+                continue
+            value, name = layout['cells'].get((r, c), (None, None))
+            attrs = f' class="{name}"' if name else ""
+            rowspan, colspan = spans.get((r, c), (1, 1))
+            if rowspan > 1:
+                attrs += f' rowspan="{rowspan}"'
+            if colspan > 1:
+                attrs += f' colspan="{colspan}"'
+            tds.append(f'<td{attrs}>{cell_text(value)}</td>')
+        height = layout['heights'].get(r, DEFAULT_HEIGHT)
+        rows.append(f'<tr style="height:{height}pt">{"".join(tds)}</tr>')
+    return (f'<style>{SHEET_CSS}</style><table class="plan-sheet" style="max-width:{total}px">'
+            f'<colgroup>{cols}</colgroup><tbody>{"".join(rows)}</tbody></table>')
+
+
+def print_page_html(layout):
+    # ブラウザで開いてそのまま印刷できる HTML（A4・向きと左右の余白は Excel の設定と同じ）
+    left, right = layout['margins'] or (0.7, 0.7)  # 余白の指定がなければ Excel の標準（インチ）
+    orientation = "landscape" if layout['landscape'] else "portrait"
+    return ('<!DOCTYPE html><html lang="ja"><head><meta charset="utf-8">'
+            f'<title>{escape(layout["title"])}</title>'
+            f'<style>@page {{ size: A4 {orientation}; margin: 0.75in {right}in 0.75in {left}in; }}'
+            ' body { margin: 0; }</style></head>'
+            f'<body>{layout_html(layout)}</body></html>')
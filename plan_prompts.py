@@ -0,0 +1,181 @@
+# AIへの指示文（プロンプト）と、AIの結果を画面の入力欄に入れるための対応表
+# st.* は使わない（バックグラウンドのスレッドからも呼ぶ）。
+# structured=True のときは JSON の形を response_schema で渡すので、出力形式の説明を省いて短くする
+
+
+# ストリーミング表示で使う見出し（JSONのキー → 画面の表記）
+FIELD_LABELS = {
+    "target_goal": "保育目標", "child_status": "子どもの姿",
+    "monthly_aim_sentence": "今月のねらい", "weekly_aim_sentence": "週のねらい",
+    "yogo": "養護", "life": "生命", "emo": "情緒",
+    "edu": "教育", "health": "健康", "rel": "人間関係", "env": "環境", "lang": "言葉", "exp": "表現",
+    "others": "その他", "food": "食育", "safety": "健康・安全", "parent": "保護者支援",
+    "aim": "ねらい", "act": "活動", "activity": "活動", "care": "配慮", "tool": "準備",
+}
+
+
+def monthly_weekly_prompt(age, month, keyword, num_weeks, structured=False):
+    shape = "" if structured else """
+    キー構造: 
+    {
+        "monthly_aim_sentence": "今月のねらい", 
+        "1":{"aim":"...", "activity":"...", "care":"..."}, 
+        ... 
+    }
+    """
+    return f"""
+    年齢:{age}, 月:{month}, キーワード:{keyword}, 週数:{num_weeks}
+    週ごとの月案(JSON)を作成せよ。
+    
+    【重要：絶対に空データ(null)にしないこと】
+    値がない場合でも空文字 "" を入れること。
+    {shape}"""
+
+
+def domain_plan_prompt(age, month, keyword, structured=False):
+    shape = "" if structured else """
+    出力形式(JSONのみ):
+    {
+        "target_goal": "全体の保育目標",
+        "child_status": "現在の子どもの姿", 
+        "yogo":{
+            "life":{"aim":"...", "env":"...", "act":"...", "care":"..."}, 
+            "emo":{"aim":"...", "env":"...", "act":"...", "care":"..."}
+        }, 
+        "edu":{
+            "health":{"aim":"...", "env":"...", "act":"...", "care":"..."}, 
+            "rel":{"aim":"...", "env":"...", "act":"...", "care":"..."}, 
+            "env":{"aim":"...", "env":"...", "act":"...", "care":"..."}, 
+            "lang":{"aim":"...", "env":"...", "act":"...", "care":"..."}, 
+            "exp":{"aim":"...", "env":"...", "act":"...", "care":"..."}
+        }, 
+        "others":{
+            "food":{"aim":"...", "env":"...", "act":"...", "care":"..."}, 
+            "safety":{"aim":"...", "env":"...", "act":"...", "care":"..."}, 
+            "parent":{"aim":"...", "env":"...", "act":"...", "care":"..."}
+        }
+    }
+    """
+    return f"""
+    あなたは日本の保育士です。月案（領域別）を作成してください。
+    年齢:{age}, 月:{month}, キーワード:{keyword}
+
+    【重要：絶対に空欄を作らないこと】
+    以下のJSON構造のすべての項目（aim, env, act, care）に具体的な内容を記述してください。
+    特に「教育5領域の活動内容(act)」や、「その他（食育・安全・保護者）の環境(env)・活動(act)」も省略せずに必ず埋めること。
+    ※保護者支援の活動(act)欄には、保護者の様子や参加内容を記述すること。
+    {shape}"""
+
+
+def weekly_plan_prompt(age, keyword, structured=False):
+    shape = "" if structured else """
+    【出力フォーマット】
+    {
+        "weekly_aim_sentence": "...",
+        "月": {"activity": "...", "care": "...", "tool": "..."},
+        "火": {"activity": "...", "care": "...", "tool": "..."},
+        "水": {"activity": "...", "care": "...", "tool": "..."},
+        "木": {"activity": "...", "care": "...", "tool": "..."},
+        "金": {"activity": "...", "care": "...", "tool": "..."},
+        "土": {"activity": "...", "care": "...", "tool": "..."}
+    }
+    """
+    return f"""
+    あなたはベテラン保育士です。以下の条件で週案を作成し、JSON形式のみを出力してください。
+    
+    【条件】
+    ・対象年齢: {age}
+    ・キーワード: {keyword}
+    
+    【重要：文体の統一】
+    ・すべての文章（ねらい、活動、配慮、準備）の語尾は、「〜する」「〜である」といった「常体（普通体）」で統一すること。
+    ・「〜ます」「〜です」といった敬語表現は一切使用しないこと（厳禁）。
+    
+    【指示】
+    1. 「weekly_aim_sentence」には、キーワードを元にした1〜2文の適切な「ねらい」を生成すること。
+    2. 月〜土の各項目も、キーワードに沿った内容にすること。
+    3. 【冬】などのタグ、余計な挨拶は一切含めない。
+    {shape}"""
+
+
+# --- 領域別の月案は「養護・教育・その他」に分けて同時に作る（app.py の generate_domain_parallel） ---
+# セクション名 → (プロンプトでの呼び方, [(JSONのキー, 画面の入力欄キーの頭)])
+DOMAIN_SECTIONS = {
+    "yogo": ("養護（生命・情緒）", [("life","yogo_life"),("emo","yogo_emo")]),
+    "edu": ("教育（5領域：健康・人間関係・環境・言葉・表現）", [("health","edu_health"),("rel","edu_rel"),("env","edu_env"),("lang","edu_lang"),("exp","edu_exp")]),
+    "others": ("その他（食育・健康安全・保護者支援）", [("food","food"),("safety","safety"),("parent","parent")]),
+}
+
+
+def domain_values(data):
+    """
+    AIの結果（JSON）を画面の入力欄のキー → 値 にする。
+    結果に入っている欄だけを返す（作れなかったセクションの欄を "" にして、入力済みの文章を消さないため）
+    """
+    values = {}
+    for key in ["target_goal", "child_status"]:
+        if data.get(key) is not None:
+            values[key] = str(data[key])
+    for cat, (_, p_map) in DOMAIN_SECTIONS.items():
+        section = data.get(cat)
+        if not isinstance(section, dict):
+            continue
+        for sub_k, sub_p in p_map:
+            item = section.get(sub_k)
+            if not isinstance(item, dict):
+                continue
+            for f in ["aim", "env", "act", "care"]:
+                if item.get(f) is not None:
+                    values[f"{sub_p}_{f}"] = str(item[f])
+    return values
+
+
+def domain_section_prompt(age, month, keyword, section, structured=False):
+    title, p_map = DOMAIN_SECTIONS[section]
+    inner = ", ".join(f'"{k}":{{"aim":"...", "env":"...", "act":"...", "care":"..."}}' for k, _ in p_map)
+    # 保育目標・子どもの姿は養護のリクエストで一緒に作る
+    head = '"target_goal": "全体の保育目標", "child_status": "現在の子どもの姿", ' if section == "yogo" else ""
+    note = "※保護者支援の活動(act)欄には、保護者の様子や参加内容を記述すること。" if section == "others" else ""
+    shape = "" if structured else f"""
+    出力形式(JSONのみ):
+    {{{head}"{section}":{{{inner}}}}}
+    """
+    return f"""
+    あなたは日本の保育士です。月案（領域別）のうち「{title}」の欄を作成してください。
+    年齢:{age}, 月:{month}, キーワード:{keyword}
+
+    【重要：絶対に空欄を作らないこと】
+    以下のJSON構造のすべての項目（aim, env, act, care）に具体的な内容を記述してください。
+    {note}
+    {shape}"""
+
+
+def aim_prompt(age, keywords, doc_type, examples=()):
+    # 書類タイプによって命令文を変える
+    if doc_type == "年間指導計画":
+        target_desc = "1年間を通した長期的な「年間目標」"
+    elif doc_type == "週案":
+        target_desc = "1週間（月〜土）の短期的な「週のねらい」"
+    else:
+        target_desc = "1ヶ月間の「月間ねらい」"
+
+    # キーワードに近い定型文を、文体の見本として付ける（aim_examples で選ぶ）
+    reference = ""
+    if examples:
+        lines = "\n".join(f"    ・{t}" for t in examples)
+        reference = f"""
+    【文体の参考（園の定型文）】
+    以下は文体・語尾・具体性の参考です。内容をそのまま写さず、キーワードに合わせて書くこと。
+{lines}
+    """
+
+    return f"""
+    あなたはベテラン保育士です。
+    以下の条件で、{doc_type}における{target_desc}の文章を1つ作成してください。
+    
+    【条件】
+    ・対象年齢: {age}
+    ・キーワード: {keywords}
+    ・文体: 保育の専門用語を用い、最後は「〜する。」などの言い切りで終える。
+    ・文字数: 100文字〜150文字程度
+    {reference}"""
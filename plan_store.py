@@ -0,0 +1,122 @@
+# 計画の保存先（SQLite）
+# 入力した計画は st.session_state だけだと再読み込みで消えてしまうので、欄ごとに SQLite に保存する。
+# 1行 = (保存先ID, 年齢, 書類の種類, 期間, 欄のキー) → 文章。期間は月案なら「4月」、週案なら週の開始日。
+# 入力のたびに書き込まないよう、Autosaver が変わった欄だけをためておき、少し間が空いたらまとめて書く。
+import atexit
+import os
+import sqlite3
+import threading
+import time
+
+
+class PlanStore:
+    """
+    プロセス内の全セッションで共有する計画の保存先。保存先ID（workspace）ごとに分かれている。
+    """
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # value は型を付けない（週数などの数値を数値のまま戻すため）
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS plan_fields ("
+            " workspace TEXT, age TEXT, doc_type TEXT, period TEXT, field TEXT, value, updated REAL,"
+            " PRIMARY KEY (workspace, age, doc_type, period, field))"
+        )
+        self._conn.commit()
+
+    def load(self, workspace, age, doc_type, period):
+        # 1つの計画の {欄のキー: 文章}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT field, value FROM plan_fields WHERE workspace = ? AND age = ? AND doc_type = ? AND period = ?",
+                (workspace, age, doc_type, period),
+            ).fetchall()
+        return dict(rows)
+
+    def load_all(self, workspace):
+        # 保存先IDの全部の計画を1回の問い合わせで読む。{(年齢, 書類の種類, 期間): {欄のキー: 文章}}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT age, doc_type, period, field, value FROM plan_fields WHERE workspace = ?", (workspace,)
+            ).fetchall()
+        plans = {}
+        for age, doc_type, period, field, value in rows:
+            plans.setdefault((age, doc_type, period), {})[field] = value
+        return plans
+
+    def save_many(self, items):
+        # items: [(workspace, age, doc_type, period, {欄のキー: 文章})] を1つのトランザクションで書く
+        now = time.time()
+        rows = [(ws, age, doc, period, field, value, now)
+                for ws, age, doc, period, values in items for field, value in values.items()]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO plan_fields VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+
+class Autosaver:
+    """
+    変わった欄だけを delay 秒ためてから PlanStore にまとめて書く（入力が続いている間は待つ）。
+    前回保存した内容を覚えていて、同じ内容なら何もしない。
+    """
+    def __init__(self, store, delay=2.0):
+        self.store = store
+        self.delay = delay
+        self.writes = 0
+        self._saved = {}     # (workspace, age, doc_type, period) → {欄のキー: 文章}（保存済みの内容）
+        self._pending = {}   # 同じキー → まだ書いていない欄
+        self._timer = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush)  # 終了するときにたまっている分を書く
+
+    def remember(self, workspace, plans):
+        # load_all で読んだ内容を「保存済み」として覚えておく（読んだだけで書き戻さないため）
+        with self._lock:
+            for (age, doc_type, period), values in plans.items():
+                self._saved.setdefault((workspace, age, doc_type, period), {}).update(values)
+
+    def schedule(self, workspace, age, doc_type, period, values):
+        key = (workspace, age, doc_type, period)
+        with self._lock:
+            # まだ書いていない欄は、書く予定の内容と比べる
+            current = dict(self._saved.get(key, {}), **self._pending.get(key, {}))
+            changed = {k: v for k, v in values.items() if v is not None and current.get(k) != v}
+            if not changed:
+                return False
+            self._pending.setdefault(key, {}).update(changed)
+            self._start_timer()
+        return True
+
+    def _start_timer(self):
+        # self._lock を持った状態で呼ぶ
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._timer = None
+        if not pending:
+            return
+        try:
+            self.store.save_many([key + (values,) for key, values in pending.items()])
+        except Exception:
+            # 書けなかった分を戻して、少し後にもう一度書く（その間に入力された新しい内容のほうを残す）
+            with self._lock:
+                for key, values in pending.items():
+                    self._pending[key] = dict(values, **self._pending.get(key, {}))
+                self._start_timer()
+            raise
+        with self._lock:
+            for key, values in pending.items():
+                self._saved.setdefault(key, {}).update(values)
+        self.writes += 1
@@ -0,0 +1,109 @@
+# Gemini API の呼び出し回数の制限（サーバープロセス全体で共有）
+# 朝に全員が一斉に「作成開始」を押すと、各セッションがばらばらに API を呼んで 429（回数オーバー）になる。
+# トークンバケットで1分あたりの回数を抑え、待ちきれない分は先着順の行列に並べる。
+# 429 や 5xx が返ってきたときは、少しずつ間隔を空けて（＋ランダムにずらして）やり直す。
+import collections
+import random
+import threading
+import time
+
+# やり直してよい HTTP ステータス（回数オーバー・サーバー側の一時的なエラー）
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class QueueFullError(RuntimeError):
+    # 行列が上限まで埋まっているとき（画面にはこのメッセージがそのまま出る）
+    pass
+
+
+class RateLimiter:
+    """
+    トークンバケット＋先着順の行列。
+    rate_per_min: 1分あたりに出せるリクエスト数 / burst: 一度にまとめて出せる数 / max_queue: 行列の長さの上限
+    """
+    def __init__(self, rate_per_min, burst=1, max_queue=20, clock=time.monotonic):
+        self.rate = rate_per_min / 60.0
+        self.burst = burst
+        self.max_queue = max_queue
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def waiting(self):
+        with self._cond:
+            return len(self._queue)
+
+    def acquire(self, on_wait=None):
+        """
+        自分の番が来てトークンが取れるまで待つ。待った秒数を返す。
+        on_wait: 待つことになったとき (前に並んでいる件数) で呼ぶ。番が来たら None で呼ぶ。
+        """
+        ticket = object()
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                raise QueueFullError("ただいまAIが混み合っています。少し時間をおいてからもう一度お試しください。")
+            self._queue.append(ticket)
+        start = self._clock()
+        shown = None
+        try:
+            while True:
+                with self._cond:
+                    self._refill()
+                    ahead = self._queue.index(ticket)
+                    if ahead == 0 and self._tokens >= 1:
+                        self._tokens -= 1
+                        break
+                    if ahead == shown:
+                        # 先頭ならトークンがたまるまで、そうでなければ前の人が抜けるまで待つ
+                        self._cond.wait((1 - self._tokens) / self.rate if ahead == 0 else None)
+                        continue
+                # 画面の更新はロックの外で行う
+                shown = ahead
+                if on_wait:
+                    on_wait(ahead)
+        finally:
+            with self._cond:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+        if shown is not None and on_wait:
+            on_wait(None)
+        return self._clock() - start
+
+
+def is_retryable(e):
+    # google.api_core の例外は HTTP ステータスを code に持っている
+    return getattr(e, "code", None) in RETRY_STATUS
+
+
+def retry_delay(attempt, base=1.0, cap=30.0):
+    # 指数バックオフ（1, 2, 4, 8 ... 秒）の範囲でランダムに待つ（全員が同時にやり直さないように）
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def call_with_retry(fn, limiter=None, on_wait=None, max_retries=4, on_retry=None, on_acquire=None, sleep=time.sleep):
+    """
+    limiter で順番を待ってから fn() を呼ぶ。429 / 5xx なら間隔を空けて max_retries 回までやり直す。
+    on_retry: やり直す前に (何回目か, 待つ秒数, 例外) で呼ぶ
+    on_acquire: 順番が来たときに (行列で待った秒数) で呼ぶ
+    """
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            waited = limiter.acquire(on_wait)
+            if on_acquire:
+                on_acquire(waited)
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == max_retries or not is_retryable(e):
+                raise
+            delay = retry_delay(attempt)
+            if on_retry:
+                on_retry(attempt + 1, delay, e)
+            sleep(delay)
@@ -0,0 +1,31 @@
+# 画面の再実行にかかった時間の記録
+# Streamlit は入力のたびに app.py を上から実行し直すので、1回の実行時間がそのまま画面の反応の遅さになる。
+# 画面（書類・書式）ごとに直近の時間を覚えておき、サイドバーに出して遅くなっていないか確かめられるようにする。
+import statistics
+import threading
+from collections import deque
+
+
+class RerunTimer:
+    """
+    プロセス内の全セッションで共有する。画面ごとに直近 keep 回の実行時間（秒）を持つ。
+    """
+    def __init__(self, keep=200):
+        self.keep = keep
+        self._times = {}
+        self._lock = threading.Lock()
+
+    def record(self, page, seconds):
+        with self._lock:
+            self._times.setdefault(page, deque(maxlen=self.keep)).append(seconds)
+
+    def stats(self):
+        # {画面: {"count": 回数, "last": 直近, "median": 中央値, "max": 最大}}（秒）
+        with self._lock:
+            snapshot = {page: list(times) for page, times in self._times.items()}
+        return {page: {"count": len(times), "last": times[-1], "median": statistics.median(times), "max": max(times)}
+                for page, times in snapshot.items()}
+
+    def clear(self):
+        with self._lock:
+            self._times.clear()
@@ -0,0 +1,88 @@
+# 定型文データの読み込み
+# 定型文は app.py に書かず data/teikei.json に置き、プロセスで1回だけ読み込む（再実行のたびに作り直さない）。
+# 園ごとの定型文は data/teikei_packs/ に同じ形式の JSON（パック）を置けば、標準の定型文の後ろに追加される。
+# ファイルを置き換えたり追加したりしたら、次の再実行で自動的に読み込み直す（更新日時を見ている）。
+import glob
+import json
+import os
+from functools import lru_cache
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+BASE_FILE = os.path.join(DATA_DIR, "teikei.json")
+PACK_DIR = os.path.join(DATA_DIR, "teikei_packs")
+FORMAT = 1  # ファイル形式の版（形式を変えたら上げる）
+
+
+def read_pack(path):
+    """
+    定型文ファイルを1つ読む。形式:
+    {"format": 1, "name": "...", "version": "...", "templates": {"0歳児": {"健康": ["文", ...], ...}, ...}}
+    """
+    with open(path, encoding="utf-8") as f:
+        pack = json.load(f)
+    if pack.get("format") != FORMAT:
+        raise ValueError(f"format が {FORMAT} ではありません")
+    templates = pack.get("templates")
+    if not isinstance(templates, dict):
+        raise ValueError("templates がありません")
+    for age, domains in templates.items():
+        if not isinstance(domains, dict):
+            raise ValueError(f"{age} の中身が {{領域: [文, ...]}} になっていません")
+        for domain, sentences in domains.items():
+            if not isinstance(sentences, list) or not all(isinstance(t, str) for t in sentences):
+                raise ValueError(f"{age} / {domain} が文のリストになっていません")
+    return pack
+
+
+def _files():
+    return [BASE_FILE] + sorted(glob.glob(os.path.join(PACK_DIR, "*.json")))
+
+
+def templates_version():
+    # 読み込むファイルと更新日時の組。変わったら読み込み直す（検索インデックスのキャッシュのキーにも使う）
+    return tuple((path, os.path.getmtime(path)) for path in _files())
+
+
+@lru_cache(maxsize=1)
+def _load(version):
+    data = {}
+    packs = []
+    errors = []
+    for path, _ in version:
+        try:
+            pack = read_pack(path)
+        except (OSError, ValueError) as e:
+            # 標準の定型文が読めないのはおかしいので止める。園のパックの間違いは飛ばして知らせる
+            if path == BASE_FILE:
+                raise
+            errors.append(f"{os.path.basename(path)}: {e}")
+            continue
+        packs.append((pack.get("name") or os.path.basename(path), pack.get("version", "")))
+        for age, domains in pack["templates"].items():
+            age_data = data.setdefault(age, {})
+            for domain, sentences in domains.items():
+                current = age_data.setdefault(domain, [])
+                current.extend(t for t in sentences if t not in current)
+    return data, packs, errors
+
+
+def all_templates():
+    # {年齢: {領域: [文, ...]}}（読み込んだ全パックをまとめたもの。書き換えないこと）
+    return _load(templates_version())[0]
+
+
+def loaded_packs():
+    # 読み込んだパックの [(名前, 版)] と、読めなかったパックのエラーの一覧
+    _, packs, errors = _load(templates_version())
+    return packs, errors
+
+
+def get_templates(age, domain=None):
+    """
+    定型文を返す。domain を指定すればその領域の文のリスト、省略すれば {領域: [文, ...]}。
+    返すのはコピーなので、呼び出し側で足したり並べ替えたりしてよい。
+    """
+    age_data = all_templates().get(age, {})
+    if domain is not None:
+        return list(age_data.get(domain, []))
+    return {d: list(sentences) for d, sentences in age_data.items()}
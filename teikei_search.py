@@ -0,0 +1,121 @@
+# 定型文（TEIKEI_DATA）の検索
+# 日本語は単語の区切りがないので、文字の 2-gram（2文字ずつ区切ったもの）で転置インデックスを作る。
+# 表記が少し違っても見つかるように、キーワードの 2-gram がどれだけ含まれるかで点数をつける。
+# 2-gram は珍しいものほど重くする（IDF）。「泥遊び」で「遊び」だけを含む文が出てこないように。
+# AIに参考として渡す文を選ぶときは、文字の 1〜3-gram の TF-IDF ベクトルの近さ（コサイン類似度）を使う。
+import heapq
+import math
+import re
+import unicodedata
+from collections import Counter, namedtuple
+
+TemplateHit = namedtuple("TemplateHit", ["score", "age", "domain", "text"])
+
+# 検索では区切りの記号は無視する
+_IGNORE_RE = re.compile(r"[\s、。，．・「」『』（）()！？!?〜ー～]+")
+
+
+def normalize(text):
+    # 全角/半角をそろえ、カタカナはひらがなにする（「ハイハイ」と「はいはい」を同じに扱う）
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = "".join(chr(ord(c) - 0x60) if "ァ" <= c <= "ヶ" else c for c in text)
+    return _IGNORE_RE.sub("", text)
+
+
+def ngrams(text, n=2):
+    if len(text) < n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def char_ngrams(text, sizes=(1, 2, 3)):
+    return [text[i:i + n] for n in sizes for i in range(len(text) - n + 1)]
+
+
+class TemplateIndex:
+    """
+    TEIKEI_DATA（{年齢: {領域: [文, ...]}}）の検索用インデックス。起動時に1回だけ作る。
+    """
+    def __init__(self, data):
+        self.docs = []       # [(年齢, 領域, 文)]
+        self._norm = []      # 正規化した文（部分一致の判定用）
+        self._bigrams = {}   # 2-gram → 文の番号の集合
+        self._chars = {}     # 1文字 → 文の番号の集合（1文字だけで検索したとき用）
+        for age, domains in data.items():
+            for domain, sentences in domains.items():
+                for text in sentences:
+                    doc_id = len(self.docs)
+                    self.docs.append((age, domain, text))
+                    norm = normalize(text)
+                    self._norm.append(norm)
+                    for g in ngrams(norm):
+                        self._bigrams.setdefault(g, set()).add(doc_id)
+                    for c in set(norm):
+                        self._chars.setdefault(c, set()).add(doc_id)
+        # TF-IDF: n-gram → [(文の番号, 重み)]（各文のベクトルは長さ1にそろえてある）
+        tfs = [Counter(char_ngrams(norm)) for norm in self._norm]
+        df = Counter(g for tf in tfs for g in tf)
+        n = len(tfs)
+        self._idf = {g: math.log((1 + n) / (1 + c)) + 1 for g, c in df.items()}
+        self._postings = {}
+        for doc_id, tf in enumerate(tfs):
+            for g, w in self._vectorize(tf).items():
+                self._postings.setdefault(g, []).append((doc_id, w))
+
+    def _vectorize(self, tf):
+        # 知らない n-gram は無視する（どの文とも近さに関係しないので）
+        vec = {g: (1 + math.log(c)) * self._idf[g] for g, c in tf.items() if g in self._idf}
+        length = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+        return {g: v / length for g, v in vec.items()}
+
+    def similar(self, text, k=3, age=None, age_bonus=0.1):
+        """
+        text に近い定型文を k 件返す（AIへの参考例用）。age を指定すると同じ年齢の文を少し優先する
+        （その年齢の定型文がなくても、ほかの年齢から近いものを返す）。
+        """
+        query = self._vectorize(Counter(char_ngrams(normalize(text))))
+        scores = {}
+        for g, qw in query.items():
+            for doc_id, w in self._postings.get(g, ()):
+                scores[doc_id] = scores.get(doc_id, 0.0) + qw * w
+        if age:
+            for doc_id in scores:
+                if self.docs[doc_id][0] == age:
+                    scores[doc_id] += age_bonus
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [TemplateHit(round(score, 3), *self.docs[doc_id]) for doc_id, score in best]
+
+    def _gram_weight(self, index, gram):
+        # 2-gram（1文字）の IDF。どの文にもない 2-gram がいちばん重い
+        return math.log((1 + len(self.docs)) / (1 + len(index.get(gram, ())))) + 1
+
+    def search(self, query, limit=10, age=None, domain=None, min_score=0.5):
+        """
+        query を含む（似ている）定型文を点数の高い順に返す。空白で区切ると複数のキーワードで探す。
+        点数 = キーワードの 2-gram のうち文に含まれる割合（IDF の重み付き。キーワードがそのまま含まれていれば +1）
+        どの文にもある「遊び」のような 2-gram だけが一致しても、重みが小さいので min_score に届かない。
+        """
+        terms = [normalize(t) for t in query.split()]
+        terms = [t for t in terms if t]
+        if not terms:
+            return []
+        scores = {}
+        for term in terms:
+            index = self._chars if len(term) == 1 else self._bigrams
+            weights = {g: self._gram_weight(index, g) for g in ngrams(term)}
+            total = sum(weights.values())
+            matched = {}
+            for g, w in weights.items():
+                for doc_id in index.get(g, ()):
+                    matched[doc_id] = matched.get(doc_id, 0.0) + w
+            for doc_id, w in matched.items():
+                score = w / total + (1.0 if term in self._norm[doc_id] else 0.0)
+                scores[doc_id] = scores.get(doc_id, 0.0) + score / len(terms)
+        hits = []
+        for doc_id, score in scores.items():
+            d_age, d_domain, text = self.docs[doc_id]
+            if score < min_score or (age and d_age != age) or (domain and d_domain != domain):
+                continue
+            hits.append(TemplateHit(round(score, 3), d_age, d_domain, text))
+        hits.sort(key=lambda h: (-h.score, len(h.text)))
+        return hits[:limit]
@@ -0,0 +1,57 @@
+# 壊れた AI 応答のコーパス（tests/data/bad_responses.json）で、応答の読み取りを確かめる
+import json
+import os
+
+import pytest
+
+from ai_response import JsonFieldStream, PlanParseError, extract_json, parse_plan, repair_json
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "bad_responses.json")
+with open(CORPUS, encoding="utf-8") as f:
+    RESPONSES = json.load(f)["responses"]
+
+
+@pytest.mark.parametrize("case", RESPONSES, ids=[r["name"] for r in RESPONSES])
+def test_parse_plan(case):
+    if case["parsed"] is None:
+        with pytest.raises(PlanParseError):
+            parse_plan(case["text"])
+    else:
+        assert parse_plan(case["text"]) == case["parsed"]
+
+
+@pytest.mark.parametrize("chunk", [1, 5, 40, 100000])
+@pytest.mark.parametrize("case", RESPONSES, ids=[r["name"] for r in RESPONSES])
+def test_stream(case, chunk):
+    # どこで区切って届いても、同じ欄が同じ順に出てくる
+    stream = JsonFieldStream()
+    fields = []
+    for i in range(0, len(case["text"]), chunk):
+        fields += stream.feed(case["text"][i:i + chunk])
+    assert [[list(path), value] for path, value in fields] == case["stream"]
+
+
+@pytest.mark.parametrize("broken, fixed", [
+    ('{“a”: “b”}', '{"a": "b"}'),
+    ('{"a": "b",}', '{"a": "b"}'),
+    ('{"a": [1, 2,],}', '{"a": [1, 2]}'),
+    # 抜けたカンマは次の値の直前に入れる
+    ('{"a": "b"\n "c": "d"}', '{"a": "b"\n ,"c": "d"}'),
+    ('{"a": {"x": "1"} "b": "2"}', '{"a": {"x": "1"} ,"b": "2"}'),
+    ('{"a": "http://x" // コメント\n}', '{"a": "http://x" \n}'),
+    ('{"a": True, "b": False, "c": None}', '{"a": true, "b": false, "c": null}'),
+    ('{"a": "途中', '{"a": "途中"}'),
+    ('{"a": "b\\', '{"a": "b"}'),
+    ('{"a": {"b": ["c"', '{"a": {"b": ["c"]}}'),
+])
+def test_repair_json(broken, fixed):
+    assert repair_json(broken) == fixed
+    json.loads(fixed)
+
+
+def test_extract_json_ignores_braces_in_strings():
+    text = '前置き {"a": "}{", "b": {"c": "d"}} 後ろ {"x": 1}'
+    assert extract_json(text) == '{"a": "}{", "b": {"c": "d"}}'
+    # 閉じていなければ残り全部
+    assert extract_json('x {"a": {"b": 1') == '{"a": {"b": 1'
+    assert extract_json("括弧なし") is None
@@ -0,0 +1,94 @@
+# スプレッドシート同期（gsheets_sync.SheetSync）を、手元の偽のシートで確かめる
+from gsheets_sync import HEADER, SheetSync
+
+
+class FakeWorksheet:
+    """gspread の Worksheet の代わり。値はメモリに持ち、呼ばれたメソッドを calls に記録する"""
+    def __init__(self, values=None):
+        self.values = [list(row) for row in (values or [])]
+        self.calls = []
+
+    def get_all_values(self):
+        self.calls.append("get_all_values")
+        return [list(row) for row in self.values]
+
+    def batch_update(self, data):
+        self.calls.append("batch_update")
+        for item in data:
+            row = int(item["range"].split(":")[0][1:])
+            self.values[row - 1] = list(item["values"][0])
+
+    def append_rows(self, rows):
+        self.calls.append("append_rows")
+        self.values.extend(list(row) for row in rows)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+APRIL = ("3歳児", "月案_領域別", "4月")
+WEEK = ("3歳児", "週案", "2026-04-06")
+
+
+def make_sync(values=None, ttl=60):
+    ws = FakeWorksheet(values)
+    clock = FakeClock()
+    return SheetSync(ws, ttl=ttl, clock=clock), ws, clock
+
+
+def test_first_push_writes_header_and_rows_in_one_append():
+    sync, ws, _ = make_sync()
+    assert sync.push({APRIL: {"edu_env_aim": "a", "num_weeks": 5}, WEEK: {"final_aim_area": "b"}}) == (0, 3)
+    assert ws.calls == ["get_all_values", "append_rows"]
+    assert ws.values[0] == HEADER
+    assert ["3歳児", "月案_領域別", "4月", "num_weeks", "5"] in ws.values
+
+
+def test_push_sends_one_batch_update_and_one_append():
+    sync, ws, _ = make_sync()
+    sync.push({APRIL: {"edu_env_aim": "a", "edu_env_act": "b"}})
+    ws.calls.clear()
+    updated, added = sync.push({
+        APRIL: {"edu_env_aim": "A", "edu_env_act": "B"},   # 2行を書き換え
+        WEEK: {"activity_月": "c", "care_月": "d"},          # 2行を追加
+    })
+    assert (updated, added) == (2, 2)
+    assert ws.calls == ["get_all_values", "batch_update", "append_rows"]
+    assert sync.pull(force=True) == {APRIL: {"edu_env_aim": "A", "edu_env_act": "B"},
+                                     WEEK: {"activity_月": "c", "care_月": "d"}}
+
+
+def test_push_without_changes_writes_nothing():
+    sync, ws, _ = make_sync()
+    plans = {APRIL: {"edu_env_aim": "a"}, WEEK: {"final_aim_area": "b"}}
+    sync.push(plans)
+    ws.calls.clear()
+    assert sync.push(plans) == (0, 0)
+    assert ws.calls == ["get_all_values"]  # 書く前に読み直すだけ
+
+
+def test_pull_uses_ttl_cache():
+    sync, ws, clock = make_sync([HEADER, ["3歳児", "月案_領域別", "4月", "edu_env_aim", "a"]], ttl=60)
+    assert sync.pull() == {APRIL: {"edu_env_aim": "a"}}
+    ws.values[1][4] = "他の人が直した"
+    clock.now = 59
+    assert sync.pull() == {APRIL: {"edu_env_aim": "a"}}  # TTL の間は読み直さない
+    assert ws.calls == ["get_all_values"]
+    clock.now = 61
+    assert sync.pull() == {APRIL: {"edu_env_aim": "他の人が直した"}}
+    assert sync.pull(force=True) == {APRIL: {"edu_env_aim": "他の人が直した"}}
+    assert ws.calls == ["get_all_values"] * 3
+
+
+def test_push_rereads_sheet_before_writing():
+    sync, ws, _ = make_sync([HEADER, ["3歳児", "月案_領域別", "4月", "edu_env_aim", "a"]])
+    sync.pull()
+    ws.values[1][4] = "他の人"
+    # 手元のコピーは古いが、書く前に読み直すので同じ内容なら書かない
+    assert sync.push({APRIL: {"edu_env_aim": "他の人"}}) == (0, 0)
+    assert "batch_update" not in ws.calls
@@ -0,0 +1,32 @@
+# 起動時の import に重いライブラリ（LAZY_MODULES）が入っていないことの確認
+# benchmarks/import_time.py と同じ方法（app.py の一番外側の import を -X importtime で読み込む）で調べる
+import importlib.util
+import os
+
+import pytest
+
+_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "import_time.py")
+_spec = importlib.util.spec_from_file_location("import_time", _PATH)
+import_time = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(import_time)
+
+
+@pytest.fixture(scope="module")
+def startup_loaded():
+    return {row[0] for row in import_time.import_times(import_time.startup_imports())}
+
+
+def test_startup_imports_reads_app():
+    modules = import_time.startup_imports()
+    assert "streamlit" in modules
+    assert not set(modules) & set(import_time.LAZY_MODULES)
+
+
+@pytest.mark.parametrize("lazy", import_time.LAZY_MODULES)
+def test_lazy_module_not_loaded_at_startup(startup_loaded, lazy):
+    assert lazy not in startup_loaded, f"{lazy} は使うところで import してください"
+
+
+def test_import_times_detects_loaded_module():
+    # 調べ方そのものが効いていること（読み込んだものは結果に出る）
+    assert "json" in {row[0] for row in import_time.import_times(["json"])}
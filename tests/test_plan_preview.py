@@ -0,0 +1,37 @@
+# 印刷イメージ（plan_preview.layout_html / print_page_html）。年間計画のレイアウトで確かめる
+import re
+
+from plan_layouts import layout_annual
+from plan_model import TERMS
+from plan_preview import layout_html, print_page_html
+
+CONFIG = {
+    "mid_items": ["ねらい", "行事"],
+    "values": {"年間目標": "目標<G>\n二行目", "ねらい_" + TERMS[1]: "水遊びを楽しむ"},
+}
+
+
+def test_annual_values_are_escaped():
+    html = layout_html(layout_annual("3歳児", CONFIG))
+    assert "目標&lt;G&gt;<br>二行目" in html
+    assert "水遊びを楽しむ" in html
+    for term in TERMS:
+        assert term in html
+
+
+def test_annual_merges_become_spans():
+    html = layout_html(layout_annual("3歳児", CONFIG))
+    # 年間目標の本文（B3:E4）は2行×4列、タイトル（A1:C1）は3列
+    assert re.search(r'<td class="annual_body" rowspan="2" colspan="4">目標', html)
+    assert '<td class="annual_title" colspan="3">' in html
+    # 結合で隠れるセルは出さない（4行目は3行目の rowspan に全部入る）
+    rows = re.findall(r"<tr[^>]*>(.*?)</tr>", html)
+    assert [row.count("<td") for row in rows[:4]] == [3, 5, 2, 0]
+
+
+def test_print_page_follows_orientation():
+    landscape = print_page_html(layout_annual("3歳児", CONFIG, "横"))
+    portrait = print_page_html(layout_annual("3歳児", CONFIG, "縦"))
+    assert "size: A4 landscape" in landscape
+    assert "size: A4 portrait" in portrait
+    assert "<title>年間指導計画(3歳児)</title>" in landscape
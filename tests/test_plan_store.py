@@ -0,0 +1,68 @@
+# 計画の保存先（plan_store.PlanStore / Autosaver）
+import sqlite3
+
+import pytest
+
+from plan_store import Autosaver, PlanStore
+
+KEY = ("ws1", "3歳児", "月案_領域別", "4月")
+
+
+class FlakyStore(PlanStore):
+    """save_many を fail 回だけ失敗させる（DB がロックされている・ディスクがいっぱい、の代わり）"""
+    def __init__(self, path, fail=0):
+        super().__init__(path)
+        self.fail = fail
+
+    def save_many(self, items):
+        if self.fail:
+            self.fail -= 1
+            raise sqlite3.OperationalError("database is locked")
+        super().save_many(items)
+
+
+@pytest.fixture
+def saver(tmp_path):
+    # タイマーでは書かせない（テストの中で flush を呼ぶ）
+    s = Autosaver(FlakyStore(str(tmp_path / "plans.db")), delay=60)
+    yield s
+    if s._timer is not None:
+        s._timer.cancel()
+
+
+def test_store_round_trip(tmp_path):
+    store = PlanStore(str(tmp_path / "plans.db"))
+    store.save_many([KEY + ({"edu_env_aim": "a", "num_weeks": 5},)])
+    assert store.load(*KEY) == {"edu_env_aim": "a", "num_weeks": 5}
+    assert store.load_all("ws1") == {KEY[1:]: {"edu_env_aim": "a", "num_weeks": 5}}
+    assert store.load_all("ws2") == {}
+
+
+def test_schedule_writes_only_changed_fields(saver):
+    assert saver.schedule(*KEY, {"edu_env_aim": "a", "edu_env_act": "b"})
+    saver.flush()
+    assert saver.store.load(*KEY) == {"edu_env_aim": "a", "edu_env_act": "b"}
+    assert not saver.schedule(*KEY, {"edu_env_aim": "a", "edu_env_act": "b"})
+    assert saver.schedule(*KEY, {"edu_env_aim": "a", "edu_env_act": "c"})
+    saver.flush()
+    assert saver.writes == 2
+
+
+def test_remembered_values_are_not_written_back(saver):
+    saver.remember("ws1", {KEY[1:]: {"edu_env_aim": "a"}})
+    assert not saver.schedule(*KEY, {"edu_env_aim": "a"})
+
+
+def test_failed_write_is_retried(saver):
+    saver.store.fail = 1
+    saver.schedule(*KEY, {"edu_env_aim": "a", "edu_env_act": "b"})
+    with pytest.raises(sqlite3.OperationalError):
+        saver.flush()
+    assert saver.store.load(*KEY) == {}
+    assert saver._timer is not None  # もう一度書く予定が入っている
+    # 同じ内容をもう一度入力しても「保存済み」とはみなさない。その間に変えた欄は新しいほうを書く
+    assert not saver.schedule(*KEY, {"edu_env_aim": "a"})
+    saver.schedule(*KEY, {"edu_env_act": "c"})
+    saver.flush()
+    assert saver.store.load(*KEY) == {"edu_env_aim": "a", "edu_env_act": "c"}
+    assert saver.writes == 1
@@ -0,0 +1,36 @@
+# 定型文の検索（teikei_search.TemplateIndex）
+from teikei_search import TemplateIndex
+
+DATA = {
+    "3歳児": {
+        "健康": ["戸外で活発に遊び、体を動かす", "泥遊びで感触を楽しむ", "手洗い・うがいを自分からする"],
+        "環境": ["砂場や水遊びで道具を使う", "友達とごっこ遊びを楽しむ", "散歩で草花に触れる"],
+        "表現": ["歌や手遊びを楽しむ", "ハイハイで移動する"],
+    },
+}
+
+
+def texts(hits):
+    return [h.text for h in hits]
+
+
+def test_generic_bigram_alone_is_not_a_hit():
+    index = TemplateIndex(DATA)
+    # 「遊び」だけを含む文は出てこない
+    assert texts(index.search("泥遊び")) == ["泥遊びで感触を楽しむ"]
+    assert texts(index.search("水遊び")) == ["砂場や水遊びで道具を使う"]
+    assert index.search("泥んこ遊び") == []
+
+
+def test_exact_and_kana_matches():
+    index = TemplateIndex(DATA)
+    assert texts(index.search("手洗い")) == ["手洗い・うがいを自分からする"]
+    assert texts(index.search("はいはい")) == ["ハイハイで移動する"]
+    assert len(index.search("遊び")) == 5
+
+
+def test_filters_and_multiple_terms():
+    index = TemplateIndex(DATA)
+    assert texts(index.search("散歩 草花")) == ["散歩で草花に触れる"]
+    assert index.search("泥遊び", domain="環境") == []
+    assert index.search("泥遊び", age="0歳児") == []